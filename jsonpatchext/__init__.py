@@ -9,8 +9,13 @@ from .jsonpatchext import (
 __all__ = [
     'apply_patch',
     'make_patch',
+    'register_comparator',
+    'register_mutator',
+    'load_plugins',
     'JsonPatchExt',
+    'PreparedPatch',
     'CheckOperation',
+    'CheckFailure',
     'MergeOperation',
     'EqualsComparator',
     '__author__',
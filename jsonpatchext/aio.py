@@ -0,0 +1,262 @@
+""" asyncio application of patches, with awaitable custom comparators and mutators
+
+Python 3 only. The 'custom' comparators and mutators of the operations may
+be coroutine functions, or return awaitables, which are awaited. Consecutive
+custom operations which don't read or write each other's paths are awaited
+concurrently, and when several of them fail, the first failure in patch order
+is raised, although the later ones were already called. The other operations
+are applied as by :meth:`JsonPatchExt.apply`.
+"""
+
+import asyncio
+import copy
+import inspect
+
+from jsonpatch import JsonPatchTestFailed, InvalidJsonPatch, JsonPatchConflict
+from jsonpointer import JsonPointerException
+
+from jsonpatchext.analysis import RegionSet, read_regions, written_regions
+from jsonpatchext.jsonpatchext import _apply_operations, _check, CheckOperation, MutateOperation
+from jsonpatchext.mutators import MutatorChain
+from jsonpatchext.wildcard import expand
+
+try:
+    from collections.abc import MutableMapping, MutableSequence
+except ImportError:
+    from collections import MutableMapping, MutableSequence
+
+
+async def apply_async(operations, obj, in_place=False):
+    """Applies prepared operations to an object, see :meth:`JsonPatchExt.apply_async`."""
+    if not any(_is_custom(operation) for operation in operations):
+        return _apply_operations(operations, obj, in_place, False, False)
+
+    if not in_place:
+        obj = copy.deepcopy(obj)
+    index = 0
+    while index < len(operations):
+        batch = _custom_batch(operations, index)
+        if not batch:
+            obj = operations[index].apply(obj)
+            index += 1
+            continue
+
+        results = await asyncio.gather(*[_apply_custom(operation, obj) for operation in batch],
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        for assignments in results:
+            for container, key, value in assignments:
+                container[key] = value
+        index += len(batch)
+    return obj
+
+
+async def check_async(operations, obj):
+    """Checks an object with prepared operations, see :meth:`JsonPatchExt.check_async`."""
+    custom = [operation for operation in operations if _is_custom(operation)]
+    # the synchronous checks first, they may fail before anything is awaited
+    if not _check([operation for operation in operations if not _is_custom(operation)], obj):
+        return False
+    results = await asyncio.gather(*[_test_custom(operation, obj) for operation in custom])
+    return all(results)
+
+
+async def gather(func, items, concurrency=16, return_exceptions=False):
+    """Awaits ``func(item)`` for many items, with at most `concurrency` at
+    once, returning the results in order.
+
+    Items are taken from the iterable, or asynchronous iterable, only when a
+    slot is free, so a slow consumer holds back the producer.
+
+    >>> from jsonpatchext import JsonPatchExt
+    >>> patch = JsonPatchExt([{'op': 'add', 'path': '/foo', 'value': 1}])
+    >>> asyncio.run(gather(patch.apply_async, [{}, {'bar': 2}], concurrency=2))
+    [{'foo': 1}, {'bar': 2, 'foo': 1}]
+
+    :param func: Coroutine function called with each item.
+
+    :param items: Iterable or asynchronous iterable.
+
+    :param concurrency: Maximum number of pending calls.
+    :type concurrency: int
+
+    :param return_exceptions: Whether to return the exceptions raised by
+                              `func` as results, instead of raising the first
+                              one and cancelling the pending calls.
+    :type return_exceptions: bool
+
+    :rtype: list
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be positive")
+    iterator = _enumerate(items)
+    lock = asyncio.Lock()
+    results = {}
+
+    async def worker():
+        while True:
+            async with lock:
+                try:
+                    index, item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+            try:
+                results[index] = await func(item)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[index] = e
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        raise
+    return [results[index] for index in range(len(results))]
+
+
+async def _enumerate(items):
+    index = 0
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield index, item
+            index += 1
+    else:
+        for item in items:
+            yield index, item
+            index += 1
+
+
+def _is_custom(operation):
+    if isinstance(operation, CheckOperation):
+        return operation.operation.get('cmp') == 'custom'
+    if isinstance(operation, MutateOperation):
+        mutator = operation._mutator
+        if isinstance(mutator, MutatorChain):
+            return any(function not in operation.mutators.values() for function, _ in mutator.steps)
+        return operation.operation.get('mut') == 'custom'
+    return False
+
+
+def _custom_batch(operations, index):
+    """Returns the custom operations from `index` which can be awaited
+    concurrently: none writes a path another one reads or writes."""
+    batch, read, written = [], RegionSet(), RegionSet()
+    for operation in operations[index:]:
+        if not _is_custom(operation):
+            break
+        reads, writes = read_regions(operation), written_regions(operation)
+        if any(written.overlaps(region) for region in reads + writes) or \
+                any(read.overlaps(region) for region in writes):
+            break
+        batch.append(operation)
+        for region in reads:
+            read.add(region)
+        for region in writes:
+            written.add(region)
+    return batch
+
+
+async def _await(result):
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+async def _apply_custom(operation, obj):
+    """Applies a custom operation, returning the (container, key, value)
+    assignments of a mutation instead of modifying the object."""
+    if isinstance(operation, CheckOperation):
+        await _apply_check(operation, obj)
+        return []
+    return await _mutate(operation, obj)
+
+
+async def _apply_check(operation, obj):
+    comparator, value = operation._comparator, operation._value
+    if not operation._wildcard:
+        try:
+            current = operation._resolve(obj)
+        except JsonPointerException as ex:
+            raise JsonPatchTestFailed(str(ex))
+        await _await(comparator(current, value))
+        return
+
+    values = [current for _, _, current in expand(obj, operation.pointer.parts)]
+    if operation._get_quantifier() == 'all':
+        for current in values:
+            await _await(comparator(current, value))
+    elif not any(await asyncio.gather(*[_passes(comparator, current, value) for current in values])):
+        raise JsonPatchTestFailed("None of the {0} values at {1} passed the check".format(
+            len(values), operation.location))
+
+
+async def _test_custom(operation, obj):
+    if operation._wildcard:
+        values = [current for _, _, current in expand(obj, operation.pointer.parts)]
+    else:
+        try:
+            values = [operation._resolve(obj)]
+        except JsonPointerException:
+            return False
+    passed = await asyncio.gather(*[_passes(operation._comparator, current, operation._value)
+                                    for current in values])
+    if operation._wildcard and operation._get_quantifier() == 'any':
+        return any(passed)
+    return all(passed)
+
+
+async def _passes(comparator, current, value):
+    try:
+        await _await(comparator(current, value))
+    except JsonPatchTestFailed:
+        return False
+    return True
+
+
+async def _mutate(operation, obj):
+    if operation._wildcard:
+        if operation.pointer.parts[-1] == "-":
+            raise InvalidJsonPatch("'path' with '-' can't be applied to 'mutation' operation")
+        targets = [(container, key, current) for container, key, current in expand(obj, operation.pointer.parts)]
+    else:
+        subobj, part = operation.pointer.to_last(obj)
+        if part == "-":
+            raise InvalidJsonPatch("'path' with '-' can't be applied to 'mutation' operation")
+        if isinstance(subobj, MutableSequence):
+            if part >= len(subobj) or part < 0:
+                raise JsonPatchConflict("can't replace outside of list")
+        elif not isinstance(subobj, MutableMapping):
+            if part is None:
+                raise TypeError("invalid document type {0}".format(type(subobj)))
+            raise JsonPatchConflict("unable to fully resolve json pointer {0}, part {1}".format(
+                operation.location, part))
+
+        if part is None:
+            targets = [(None, None, subobj)]
+        elif isinstance(subobj, MutableMapping) and part not in subobj:
+            targets = [(subobj, part, None)]
+        else:
+            targets = [(subobj, part, subobj[part])]
+
+    assignments = []
+    for container, key, current in targets:
+        try:
+            value = await _call_mutator(operation._mutator, current, operation._operand)
+        except Exception as e:
+            raise InvalidJsonPatch('Invalid mutation: {}'.format(str(e))) from e
+        if container is not None:
+            assignments.append((container, key, value))
+    return assignments
+
+
+async def _call_mutator(mutator, current, value):
+    if not isinstance(mutator, MutatorChain):
+        return await _await(mutator(current, value))
+    for function, step_value in mutator.steps:
+        current = await _await(function(current, value if step_value is MutatorChain.OPERATION_VALUE else step_value))
+    return current
@@ -0,0 +1,162 @@
+""" Path dependency analysis of JSON-Patch operations """
+
+from __future__ import unicode_literals
+
+from jsonpatch import InvalidJsonPatch
+from jsonpointer import JsonPointer
+
+from jsonpatchext.wildcard import static_prefix
+
+# Operations which only read the document.
+READ_OPERATIONS = frozenset(['check', 'test'])
+
+# Operations which only modify the value at their path.
+VALUE_OPERATIONS = frozenset(['mutate', 'merge'])
+
+# Operations which may insert or remove an array element, shifting its siblings.
+SHIFTING_OPERATIONS = frozenset(['add', 'remove', 'copy', 'move'])
+
+
+def written_regions(operation):
+    """Returns the pointer parts of the subtrees an operation may modify.
+
+    An operation which may insert into or remove from an array shifts the
+    following elements, so its region is the whole array. The region of a
+    wildcard path is the subtree before the first wildcard. Unknown operations
+    may modify anything, so their region is the whole document.
+
+    :param operation: Operation object.
+    :type operation: PatchOperation
+
+    :rtype: list of tuples
+    """
+    op = operation.operation.get('op')
+    if op in READ_OPERATIONS:
+        return []
+
+    parts = operation_parts(operation)
+    if op in VALUE_OPERATIONS:
+        return [parts]
+    if op == 'replace':
+        return [parts]
+    if op in SHIFTING_OPERATIONS:
+        regions = [_shifted(parts)]
+        if op == 'move':
+            regions.append(_shifted(tuple(_fromoperation_parts(operation))))
+        return regions
+    return [()]
+
+
+def read_regions(operation):
+    """Returns the pointer parts of the subtrees an operation reads.
+
+    :param operation: Operation object.
+    :type operation: PatchOperation
+
+    :rtype: list of tuples
+    """
+    op = operation.operation.get('op')
+    parts = operation_parts(operation)
+    if op in ('move', 'copy'):
+        return [parts, tuple(_fromoperation_parts(operation))]
+    return [parts]
+
+
+def operation_parts(operation):
+    """Returns the pointer parts of the path of an operation, up to the first
+    wildcard segment."""
+    parts = tuple(operation.pointer.parts)
+    if getattr(operation, '_wildcard', False):
+        return static_prefix(parts)
+    return parts
+
+
+def from_pointer(operation):
+    """Returns the pointer of the 'from' member of a 'move' or 'copy'
+    operation, built like the pointer of its 'path'.
+
+    :param operation: Operation object.
+    :type operation: PatchOperation
+
+    :raises InvalidJsonPatch: The 'from' member is missing or invalid.
+
+    :rtype: JsonPointer
+    """
+    try:
+        from_ptr = operation.operation['from']
+    except KeyError:
+        raise InvalidJsonPatch("The operation does not contain a 'from' member")
+
+    pointer_cls = getattr(operation, 'pointer_cls', JsonPointer)
+    if isinstance(from_ptr, pointer_cls):
+        return from_ptr
+    try:
+        return pointer_cls(from_ptr)
+    except TypeError:
+        raise InvalidJsonPatch("Invalid 'from'")
+
+
+def _fromoperation_parts(operation):
+    try:
+        return from_pointer(operation).parts
+    except Exception:
+        # invalid, the operation will fail when applied
+        return []
+
+
+def _shifted(parts):
+    if parts and (parts[-1] == '-' or parts[-1].isdigit()):
+        return parts[:-1]
+    return parts
+
+
+class RegionSet(object):
+    """A set of regions, answering whether a path overlaps any of them in
+    time proportional to the path length."""
+
+    def __init__(self):
+        self._regions = set()
+        self._prefixes = set()
+
+    def __bool__(self):
+        return bool(self._regions)
+
+    __nonzero__ = __bool__
+
+    def add(self, parts):
+        parts = tuple(parts)
+        self._regions.add(parts)
+        for length in range(len(parts) + 1):
+            self._prefixes.add(parts[:length])
+
+    def overlaps(self, parts):
+        """Whether `parts` is inside, or contains, any region of the set."""
+        parts = tuple(parts)
+        if parts in self._prefixes:
+            return True
+        for length in range(len(parts)):
+            if parts[:length] in self._regions:
+                return True
+        return False
+
+
+def hoisting_plan(operations):
+    """Finds the 'check' operations whose path can't be affected by the
+    operations before them, so they can be evaluated on the original document.
+
+    :param operations: Operation objects.
+    :type operations: Sequence
+
+    :return: The indexes of the hoistable checks, and the other operations.
+    :rtype: tuple
+    """
+    written = RegionSet()
+    hoisted, remaining = [], []
+    for index, operation in enumerate(operations):
+        if operation.operation.get('op') == 'check' and not written.overlaps(operation_parts(operation)):
+            hoisted.append(index)
+            continue
+        remaining.append(operation)
+        for region in written_regions(operation):
+            written.add(region)
+    return tuple(hoisted), tuple(remaining)
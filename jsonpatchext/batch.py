@@ -0,0 +1,210 @@
+""" Check many documents at once, with NumPy-vectorized comparators """
+
+from __future__ import unicode_literals
+
+from jsonpatch import InvalidJsonPatch
+from jsonpointer import JsonPointerException
+
+from jsonpatchext.comparators import EqualsComparator, NotEqualsComparator, RangeComparator, InComparator, \
+    InValueComparator, LengthComparator, IsAComparator
+from jsonpatchext.jsonpatchext import JsonPatchExt
+
+try:
+    import numpy
+except ImportError:
+    # vectorized comparators are optional
+    numpy = None
+
+text_type = type('')
+
+# Larger integers are not exactly representable in a float64 column.
+_MAX_EXACT_INTEGER = 2 ** 53
+
+
+def check_many(patch, docs):
+    """Checks many documents using a check-only patch.
+
+    Each check path is extracted into a column once, and when NumPy is
+    installed the 'equals', 'notequals', 'range', 'in', 'invalue', 'length'
+    and 'isa' comparators are evaluated as vectorized operations. Columns
+    which are not homogeneous, and the other comparators, are evaluated row by
+    row, so the results are the same as calling :meth:`JsonPatchExt.check` on
+    each document.
+
+    >>> from jsonpatchext import JsonPatchExt
+    >>> patch = JsonPatchExt([{'op': 'check', 'path': '/age', 'value': (18, 200), 'cmp': 'range'}])
+    >>> [bool(passed) for passed in check_many(patch, [{'age': 20}, {'age': 10}, {}])]
+    [True, False, False]
+
+    :param patch: Patch containing only 'check' operations.
+    :type patch: JsonPatchExt or PreparedPatch or list
+
+    :param docs: Document objects.
+    :type docs: Iterable
+
+    :return: Whether each document passed, as a NumPy boolean array if NumPy
+             is installed, otherwise as a list.
+    """
+    docs = list(docs)
+    mask = _full(len(docs), True)
+    for operation in _check_operations(patch):
+        mask = _and(mask, _evaluate(operation, docs, mask))
+    return mask
+
+
+def evaluate_many(patch, docs):
+    """Evaluates every check of the patch on many documents.
+
+    :param patch: Patch containing only 'check' operations.
+    :type patch: JsonPatchExt or PreparedPatch or list
+
+    :param docs: Document objects.
+    :type docs: Iterable
+
+    :return: A tuple of the documents mask, as returned by :func:`check_many`,
+             and a list with the mask of each check operation.
+    :rtype: tuple
+    """
+    docs = list(docs)
+    masks = [_evaluate(operation, docs, None) for operation in _check_operations(patch)]
+    mask = _full(len(docs), True)
+    for operation_mask in masks:
+        mask = _and(mask, operation_mask)
+    return mask, masks
+
+
+def _check_operations(patch):
+    if hasattr(patch, '_check_error'):
+        # a PreparedPatch
+        if patch._check_error is not None:
+            raise InvalidJsonPatch(patch._check_error)
+        return patch._check_ops
+
+    if not isinstance(patch, JsonPatchExt):
+        patch = JsonPatchExt(patch)
+    return [operation.prepare() for operation in patch._check_ops]
+
+
+def _evaluate(operation, docs, active):
+    """Evaluates a check operation on the documents, only on the active ones if
+    `active` is not None."""
+    if operation._wildcard:
+        mask = _full(len(docs), False)
+        for row, doc in enumerate(docs):
+            if active is None or active[row]:
+                mask[row] = operation.test(doc)
+        return mask
+
+    rows, values = [], []
+    for row, doc in enumerate(docs):
+        if active is not None and not active[row]:
+            continue
+        try:
+            subobj, part = operation.pointer.to_last(doc)
+            value = subobj if part is None else operation.pointer.walk(subobj, part)
+        except JsonPointerException:
+            continue
+        rows.append(row)
+        values.append(value)
+
+    passed = None
+    if numpy is not None and values:
+        passed = _vectorized(operation._comparator, operation._value, values)
+    if passed is None:
+        predicate, compare = operation._predicate, operation._value
+        passed = [predicate(value, compare) for value in values]
+
+    mask = _full(len(docs), False)
+    if numpy is not None:
+        mask[rows] = passed
+    else:
+        for row, row_passed in zip(rows, passed):
+            mask[row] = row_passed
+    return mask
+
+
+def _vectorized(comparator, compare, values):
+    """Evaluates a comparator over a column of values using NumPy, returns None
+    when it can't be vectorized."""
+    if comparator is IsAComparator:
+        results = {}
+        for cls in set(type(value) for value in values):
+            results[cls] = issubclass(cls, compare)
+        return numpy.fromiter((results[type(value)] for value in values), dtype=bool, count=len(values))
+
+    if comparator is LengthComparator:
+        if not all(hasattr(value, '__len__') for value in values):
+            return None
+        return numpy.fromiter((len(value) for value in values), dtype=numpy.int64, count=len(values)) == compare
+
+    column = _column(values)
+    if column is None:
+        return None
+    kind = column.dtype.kind
+
+    if comparator is EqualsComparator or comparator is NotEqualsComparator:
+        if not _same_kind(kind, compare):
+            return None
+        result = column == compare
+        return result if comparator is EqualsComparator else ~result
+
+    if comparator is RangeComparator:
+        if kind == 'U' or not isinstance(compare, (list, tuple)) or len(compare) != 2 or \
+                not all(_same_kind(kind, bound) for bound in compare):
+            return None
+        # same as the comparator, which lets NaN pass
+        return ~((column < compare[0]) | (column > compare[1]))
+
+    if comparator is InComparator:
+        if kind != 'U' or not isinstance(compare, text_type):
+            return None
+        return numpy.char.find(column, compare) >= 0
+
+    if comparator is InValueComparator:
+        if kind == 'U' or not isinstance(compare, (list, tuple, set, frozenset)) or \
+                not all(_same_kind(kind, item) and item == item for item in compare):
+            # Python's 'in' also matches NaN by identity
+            return None
+        return numpy.isin(column, list(compare))
+
+    return None
+
+
+def _column(values):
+    """Builds a NumPy array from homogeneous scalars, or returns None."""
+    if type(values[0]) is text_type:
+        # NumPy strings drop trailing NUL characters
+        if not all(type(value) is text_type and not value.endswith('\x00') for value in values):
+            return None
+    elif not all(_is_exact_number(value) for value in values):
+        return None
+
+    column = numpy.array(values)
+    if column.dtype.kind not in 'biufU':
+        return None
+    return column
+
+
+def _same_kind(kind, value):
+    if kind == 'U':
+        return type(value) is text_type and not value.endswith('\x00')
+    return _is_exact_number(value)
+
+
+def _is_exact_number(value):
+    cls = type(value)
+    if cls is int:
+        return -_MAX_EXACT_INTEGER <= value <= _MAX_EXACT_INTEGER
+    return cls is float or cls is bool
+
+
+def _full(size, value):
+    if numpy is not None:
+        return numpy.full(size, value, dtype=bool)
+    return [value] * size
+
+
+def _and(mask, other):
+    if numpy is not None:
+        return mask & other
+    return [a and b for a, b in zip(mask, other)]
@@ -0,0 +1,296 @@
+""" Benchmarks of patch application, checks and diffs
+
+Run with ``python -m jsonpatchext.bench``, the results are written as JSON.
+Use ``--help`` to see the document and patch sizes which can be configured.
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import copy
+import json
+import platform
+import random
+import sys
+
+import jsonpatch
+
+from jsonpatchext.instrumentation import timer
+from jsonpatchext.jsonpatchext import JsonPatchExt, make_patch, __version__
+
+COMPARATORS = ['equals', 'notequals', 'regex', 'startswith', 'endswith', 'length', 'isa', 'is', 'range', 'in',
+               'invalue', 'custom']
+
+MUTATORS = ['uppercase', 'lowercase', 'cast', 'regex', 'slice', 'init', 'custom']
+
+CORE_OPERATIONS = ['add', 'remove', 'replace', 'move', 'copy', 'test']
+
+ENGINES = ['jsonpatchext', 'prepared', 'codegen']
+
+TAGS = ['red', 'green', 'blue', 'cyan', 'magenta', 'yellow']
+
+
+def generate_record(rnd, index, depth, width):
+    """Generates a record, with a nested 'tree' of the given depth and width."""
+    return {
+        'id': index,
+        'name': 'name-{0}'.format(index),
+        'score': rnd.uniform(0, 100),
+        'active': rnd.random() < 0.5,
+        'tags': rnd.sample(TAGS, rnd.randint(1, 3)),
+        'meta': {'created': rnd.randint(0, 2 ** 31), 'note': None},
+        'tree': generate_tree(rnd, depth, width),
+    }
+
+
+def generate_tree(rnd, depth, width):
+    """Generates nested objects and arrays with scalar leaves."""
+    if depth <= 0:
+        return rnd.choice([rnd.randint(0, 1000), rnd.random(), 'leaf-{0}'.format(rnd.randint(0, 1000)), True, None])
+    if rnd.random() < 0.25:
+        return [generate_tree(rnd, depth - 1, width) for _ in range(width)]
+    return dict(('k{0}'.format(key), generate_tree(rnd, depth - 1, width)) for key in range(width))
+
+
+def generate_document(rnd, records, depth, width):
+    """Generates a document with `records` records."""
+    return {'records': [generate_record(rnd, index, depth, width) for index in range(records)]}
+
+
+def _record_path(index, *parts):
+    return '/'.join(['', 'records', str(index)] + list(parts))
+
+
+def _custom_comparator(current, compare):
+    if current != compare:
+        raise jsonpatch.JsonPatchTestFailed('{0} != {1}'.format(current, compare))
+
+
+def _custom_mutator(current, value):
+    return current[::-1]
+
+
+def check_operation(cmp, doc, index):
+    """Generates a passing 'check' operation using the comparator on a record."""
+    record = doc['records'][index]
+    path, value = {
+        'equals': ('name', record['name']),
+        'notequals': ('name', 'other'),
+        'regex': ('name', r'^name-\d+$'),
+        'startswith': ('name', 'name-'),
+        'endswith': ('name', str(index)),
+        'length': ('tags', len(record['tags'])),
+        'isa': ('id', int),
+        'is': ('meta/note', None),
+        'range': ('score', (0, 100)),
+        'in': ('tags', record['tags'][0]),
+        'invalue': ('id', list(range(0, len(doc['records']), 2)) + [index]),
+        'custom': ('id', index),
+    }[cmp]
+    operation = {'op': 'check', 'path': _record_path(index, *path.split('/')), 'value': value, 'cmp': cmp}
+    if cmp == 'custom':
+        operation['comparator'] = _custom_comparator
+    return operation
+
+
+def mutate_operation(mut, doc, index):
+    """Generates a 'mutate' operation using the mutator on a record."""
+    path, value = {
+        'uppercase': ('name', None),
+        'lowercase': ('name', None),
+        'cast': ('id', str),
+        'regex': ('name', ('name-', 'n-')),
+        'slice': ('name', (0, 4)),
+        'init': ('meta/note', 'note'),
+        'custom': ('name', None),
+    }[mut]
+    operation = {'op': 'mutate', 'path': _record_path(index, *path.split('/')), 'mut': mut}
+    if value is not None:
+        operation['value'] = value
+    if mut == 'custom':
+        operation['mutator'] = _custom_mutator
+    return operation
+
+
+def merge_operation(doc, index):
+    """Generates a 'merge' of an object, with a nested array to append to."""
+    return {'op': 'merge', 'path': _record_path(index, 'meta'),
+            'value': {'updated': index, 'history': [index], 'flags': {'merged': True}}}
+
+
+def core_operation(op, doc, index):
+    """Generates a valid RFC 6902 operation on a record. Operations that
+    remove values target the end of the records so the indexes stay valid."""
+    record = doc['records'][index]
+    if op == 'add':
+        return {'op': 'add', 'path': _record_path(index, 'extra'), 'value': {'index': index}}
+    if op == 'remove':
+        return {'op': 'remove', 'path': _record_path(index, 'meta', 'created')}
+    if op == 'replace':
+        return {'op': 'replace', 'path': _record_path(index, 'score'), 'value': -1}
+    if op == 'move':
+        return {'op': 'move', 'from': _record_path(index, 'meta', 'created'), 'path': _record_path(index, 'created')}
+    if op == 'copy':
+        return {'op': 'copy', 'from': _record_path(index, 'tags'), 'path': _record_path(index, 'tags_copy')}
+    return {'op': 'test', 'path': _record_path(index, 'name'), 'value': record['name']}
+
+
+def generate_patch(kind, name, doc, operations):
+    """Generates a patch of `operations` operations on distinct records."""
+    indexes = range(min(operations, len(doc['records'])))
+    if kind == 'check':
+        return [check_operation(name, doc, index) for index in indexes]
+    if kind == 'mutate':
+        return [mutate_operation(name, doc, index) for index in indexes]
+    if kind == 'merge':
+        return [merge_operation(doc, index) for index in indexes]
+    return [core_operation(name, doc, index) for index in indexes]
+
+
+def modify_document(rnd, doc, changes):
+    """Returns a copy of the document with `changes` random changes, to diff."""
+    doc = copy.deepcopy(doc)
+    records = doc['records']
+    for _ in range(changes):
+        record = rnd.choice(records)
+        change = rnd.randint(0, 3)
+        if change == 0:
+            record['score'] = rnd.uniform(0, 100)
+        elif change == 1:
+            record['tags'].append(rnd.choice(TAGS))
+        elif change == 2:
+            record.pop('meta', None)
+        else:
+            records.insert(rnd.randint(0, len(records)), generate_record(rnd, len(records), 1, 2))
+    return doc
+
+
+def measure(func, repeat, number):
+    """Returns the min and median seconds per call of `func`."""
+    times = []
+    for _ in range(repeat):
+        start = timer()
+        for _ in range(number):
+            func()
+        times.append((timer() - start) / number)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def _engines(patch):
+    ext = JsonPatchExt(patch)
+    yield 'jsonpatchext', ext
+    yield 'prepared', ext.compile()
+    yield 'codegen', ext.compile(engine='codegen')
+
+
+def scenarios(doc, options):
+    """Yields (group, name, engine, function) tuples of the benchmarks."""
+    rnd = random.Random(options.seed)
+    count = options.operations
+
+    for cmp in COMPARATORS:
+        patch = generate_patch('check', cmp, doc, count)
+        for engine, compiled in _engines(patch):
+            yield 'check', cmp, engine, _bind(compiled.check, doc)
+    for cmp in COMPARATORS:
+        patch = generate_patch('check', cmp, doc, count)
+        for engine, compiled in _engines(patch):
+            yield 'check-apply', cmp, engine, _bind(compiled.apply, doc)
+
+    for mut in MUTATORS:
+        patch = generate_patch('mutate', mut, doc, count)
+        for engine, compiled in _engines(patch):
+            yield 'mutate', mut, engine, _bind(compiled.apply, doc)
+
+    patch = generate_patch('merge', 'merge', doc, count)
+    for engine, compiled in _engines(patch):
+        yield 'merge', 'merge', engine, _bind(compiled.apply, doc)
+
+    for op in CORE_OPERATIONS:
+        patch = generate_patch('core', op, doc, count)
+        yield 'core', op, 'jsonpatch', _bind(jsonpatch.JsonPatch(patch).apply, doc)
+        for engine, compiled in _engines(patch):
+            yield 'core', op, engine, _bind(compiled.apply, doc)
+        yield 'core', op, 'copy-on-write', _bind(JsonPatchExt(patch).apply, doc, False, True)
+
+    modified = modify_document(rnd, doc, count)
+    yield 'diff', 'make_patch', 'jsonpatch', _bind(jsonpatch.make_patch, doc, modified)
+    yield 'diff', 'make_patch', 'jsonpatchext', _bind(make_patch, doc, modified)
+    # the target shares the unmodified subtrees with the source
+    shared = make_patch(doc, modified).apply(doc, copy_on_write=True)
+    yield 'diff', 'shared', 'jsonpatch', _bind(jsonpatch.make_patch, doc, shared)
+    yield 'diff', 'shared', 'jsonpatchext', _bind(make_patch, doc, shared)
+
+
+def _bind(func, *args):
+    return lambda: func(*args)
+
+
+def run(options):
+    """Runs the benchmarks, returning the results as a JSON-serializable dict."""
+    doc = generate_document(random.Random(options.seed), options.records, options.depth, options.width)
+    results = []
+    for group, name, engine, func in scenarios(doc, options):
+        label = '{0}/{1}/{2}'.format(group, name, engine)
+        if options.filter and not any(pattern in label for pattern in options.filter):
+            continue
+        best, median = measure(func, options.repeat, options.number)
+        results.append({
+            'group': group,
+            'name': name,
+            'engine': engine,
+            'min': best,
+            'median': median,
+        })
+        if options.verbose:
+            print('{0:<40} {1:>12.6f} {2:>12.6f}'.format(label, best, median), file=sys.stderr)
+
+    return {
+        'version': __version__,
+        'jsonpatch_version': getattr(jsonpatch, '__version__', None),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'options': {
+            'records': options.records,
+            'depth': options.depth,
+            'width': options.width,
+            'operations': options.operations,
+            'repeat': options.repeat,
+            'number': options.number,
+            'seed': options.seed,
+        },
+        'results': results,
+    }
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog='python -m jsonpatchext.bench', description=__doc__.split('\n')[0])
+    parser.add_argument('--records', type=int, default=1000, help='records in the document (default 1000)')
+    parser.add_argument('--depth', type=int, default=3, help='depth of the tree of each record (default 3)')
+    parser.add_argument('--width', type=int, default=3, help='width of the tree of each record (default 3)')
+    parser.add_argument('--operations', type=int, default=100, help='operations in each patch (default 100)')
+    parser.add_argument('--repeat', type=int, default=5, help='measurements of each benchmark (default 5)')
+    parser.add_argument('--number', type=int, default=3, help='calls in each measurement (default 3)')
+    parser.add_argument('--seed', type=int, default=6902, help='random seed (default 6902)')
+    parser.add_argument('--filter', action='append', help='only run benchmarks whose group/name/engine '
+                                                          'contains the text, may be repeated')
+    parser.add_argument('--output', '-o', help='file to write the JSON results to (default stdout)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='print each result to stderr')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(args)
+    results = run(options)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
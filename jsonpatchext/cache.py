@@ -0,0 +1,162 @@
+""" Bounded caches shared between patches """
+
+from __future__ import unicode_literals
+
+import collections
+import re
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+CacheStats = collections.namedtuple('CacheStats', 'hits misses evictions items bytes')
+
+
+class LRUCache(object):
+    """A thread-safe mapping keeping at most `maxsize` items, discarding the
+    least recently used ones first.
+
+    >>> cache = LRUCache(2)
+    >>> cache.put('a', 1)
+    >>> cache.put('b', 2)
+    >>> cache.get('a')
+    1
+    >>> cache.put('c', 3)
+    >>> cache.get('b') is None
+    True
+    """
+
+    def __init__(self, maxsize, maxbytes=None, sizeof=None):
+        """
+        :param maxsize: Maximum number of items.
+        :type maxsize: int
+
+        :param maxbytes: Maximum total size of the items, as measured by
+                         `sizeof`, or :const:`None` for no limit. An item
+                         larger than it is not kept.
+        :type maxbytes: int
+
+        :param sizeof: Returns the size of an item from its key and value.
+        :type sizeof: callable
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        if maxbytes is not None and sizeof is None:
+            raise ValueError("maxbytes requires sizeof")
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._hits = self._misses = self._evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Returns the value of `key`, marking it as the most recently used."""
+        with self._lock:
+            value = self._data.pop(key, _MISSING)
+            if value is _MISSING:
+                self._misses += 1
+                return default
+            self._hits += 1
+            self._data[key] = value
+            return value
+
+    def put(self, key, value):
+        """Sets the value of `key`, discarding the least recently used items
+        when the cache is full."""
+        size = self._sizeof(key, value) if self._sizeof is not None else 0
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self._bytes -= self._sizes.pop(key, 0)
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            self._data[key] = value
+            if self._sizeof is not None:
+                self._sizes[key] = size
+                self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                evicted, _ = self._data.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted, 0)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns the hits, misses and evictions since the cache was created,
+        and its current number of items and size.
+
+        :rtype: CacheStats
+        """
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._data), self._bytes)
+
+
+# Compiled regular expressions, shared by every comparator and mutator.
+pattern_cache = LRUCache(4096)
+
+
+def compile_pattern(pattern):
+    """Compiles a regular expression through :data:`pattern_cache`. Already
+    compiled patterns are returned as is.
+
+    :param pattern: Regular expression.
+    :type pattern: str or compiled pattern
+
+    :return: Compiled pattern.
+    """
+    if not isinstance(pattern, (type(''), bytes)):
+        return pattern
+    key = (type(pattern), pattern)
+    compiled = pattern_cache.get(key)
+    if compiled is None:
+        compiled = re.compile(pattern)
+        pattern_cache.put(key, compiled)
+    return compiled
+
+
+def _patch_size(key, patch):
+    return len(key[1])
+
+
+# Patches parsed from JSON text, by their text, see :func:`parse_patch`.
+patch_cache = LRUCache(1024, maxbytes=16 << 20, sizeof=_patch_size)
+
+
+def parse_patch(patch):
+    """Parses a JSON encoded patch through :data:`patch_cache`, as
+    :meth:`JsonPatchExt.from_string` followed by :meth:`JsonPatchExt.compile`.
+    The same instance is returned for the same text, and it is shared by its
+    callers, which is safe because the operations copy the values they insert
+    in a document. A patch parsed from text can't hold callables, so the cache
+    only depends on the text.
+
+    >>> text = '[{"op": "add", "path": "/a", "value": 1}]'
+    >>> parse_patch(text) is parse_patch(text)
+    True
+
+    :param patch: JSON encoded patch.
+    :type patch: str or bytes
+
+    :rtype: PreparedPatch
+    """
+    key = (type(patch), patch)
+    prepared = patch_cache.get(key)
+    if prepared is None:
+        from jsonpatchext.jsonpatchext import JsonPatchExt
+        prepared = JsonPatchExt.from_string(patch).compile()
+        patch_cache.put(key, prepared)
+    return prepared
@@ -0,0 +1,233 @@
+""" Command-line tool applying patches to JSON Lines
+
+Run with ``python -m jsonpatchext``. Records are read one per line from the
+input files or stdin and written in the same order as soon as they are
+processed. A record which fails is reported on stderr, as a JSON object with
+its input, line and error, and the next records are still processed.
+
+- ``apply``: applies the patch to each record, or with no ``--patch``, each
+  record is an object ``{"doc": ..., "patch": [...]}``.
+- ``check``: writes ``true`` or ``false`` for each record, checked like
+  ``apply``.
+- ``diff``: each record is a ``[src, dst]`` array, writes the patch from
+  `src` to `dst`.
+
+With ``--workers``, chunks of records are processed in a process pool. Each
+worker compiles the patch once, and at most two chunks per worker are in
+flight, so memory doesn't grow with the input.
+"""
+
+from __future__ import unicode_literals, print_function
+
+import argparse
+import collections
+import io
+import json
+import multiprocessing
+import sys
+
+from jsonpatch import InvalidJsonPatch
+
+from jsonpatchext.jsonpatchext import JsonPatchExt, make_patch
+
+COMMANDS = ['apply', 'check', 'diff']
+
+# Chunks submitted to the pool for each worker, ahead of the one being written.
+_CHUNKS_PER_WORKER = 2
+
+
+class RecordProcessor(object):
+    """Processes the records of a command.
+
+    :param command: One of :data:`COMMANDS`.
+    :type command: str
+
+    :param patch: The patch of every record, or None when each record has its own.
+    :type patch: list
+    """
+
+    def __init__(self, command, patch=None):
+        if command not in COMMANDS:
+            raise ValueError("Unknown command {0!r}".format(command))
+        self.command = command
+        self.patch = None if patch is None else _compile(command, patch)
+
+    def process(self, line):
+        """Returns the output line of an input line, raises if the record fails."""
+        record = json.loads(line)
+        if self.command == 'diff':
+            if not isinstance(record, list) or len(record) != 2:
+                raise ValueError("diff records must be [src, dst] arrays")
+            return json.dumps(make_patch(record[0], record[1]).patch)
+
+        if self.patch is None:
+            if not isinstance(record, dict) or 'doc' not in record or 'patch' not in record:
+                raise ValueError("records must be {\"doc\": ..., \"patch\": ...} objects without --patch")
+            patch, doc = _compile(self.command, record['patch']), record['doc']
+        else:
+            patch, doc = self.patch, record
+
+        if self.command == 'check':
+            return json.dumps(bool(patch.check(doc)))
+        # the document was just parsed, it is not shared
+        return json.dumps(patch.apply(doc, in_place=True))
+
+    def process_chunk(self, chunk):
+        """Processes (input, line number, line) records, returning
+        (input, line number, output, error) tuples."""
+        results = []
+        for source, number, line in chunk:
+            try:
+                results.append((source, number, self.process(line), None))
+            except Exception as e:
+                results.append((source, number, None, '{0}: {1}'.format(type(e).__name__, e)))
+        return results
+
+
+def _compile(command, patch):
+    patch = JsonPatchExt(patch)
+    if command == 'check':
+        for operation in patch.patch:
+            if operation.get('op') not in patch.check_operations:
+                raise InvalidJsonPatch("Unknown operation {0!r}".format(operation.get('op')))
+    return patch.compile()
+
+
+# The processor of each worker process, built once by _init_worker.
+_worker_processor = None
+
+
+def _init_worker(command, patch):
+    global _worker_processor
+    _worker_processor = RecordProcessor(command, patch)
+
+
+def _process_chunk(chunk):
+    return _worker_processor.process_chunk(chunk)
+
+
+def read_records(paths, stdin=None):
+    """Yields the (input, line number, line) of the non-blank lines of the
+    input files, '-' being stdin."""
+    for path in paths or ['-']:
+        if path == '-':
+            lines, close = stdin if stdin is not None else _stdin(), None
+        else:
+            lines = close = io.open(path, encoding='utf-8')
+        try:
+            for number, line in enumerate(lines, 1):
+                if line.strip():
+                    yield path, number, line
+        finally:
+            if close is not None:
+                close.close()
+
+
+def _stdin():
+    buffer = getattr(sys.stdin, 'buffer', None)
+    if buffer is None:
+        # Python 2
+        return sys.stdin
+    return io.TextIOWrapper(buffer, encoding='utf-8')
+
+
+def chunked(iterable, size):
+    """Yields lists of `size` items of the iterable."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ordered_map(pool, func, items, window):
+    """Like ``pool.imap``, but only takes the next items while less than
+    `window` results are pending, so the input is consumed as it is written."""
+    pending = collections.deque()
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def run(options, stdin=None, stdout=None, stderr=None):
+    """Runs a command, returns the exit status: 0 if every record succeeded,
+    1 if some failed, 2 for an invalid patch."""
+    stdout = stdout if stdout is not None else sys.stdout
+    stderr = stderr if stderr is not None else sys.stderr
+
+    patch = None
+    if options.command != 'diff' and options.patch is not None:
+        try:
+            with io.open(options.patch, encoding='utf-8') as f:
+                patch = json.load(f)
+            # fail now rather than on each record
+            RecordProcessor(options.command, patch)
+        except (IOError, ValueError, InvalidJsonPatch) as e:
+            print('Invalid patch {0}: {1}'.format(options.patch, e), file=stderr)
+            return 2
+
+    chunks = chunked(read_records(options.inputs, stdin), options.chunk_size)
+    if options.workers > 1:
+        pool = multiprocessing.Pool(options.workers, _init_worker, (options.command, patch))
+        try:
+            status = _write(ordered_map(pool, _process_chunk, chunks, options.workers * _CHUNKS_PER_WORKER),
+                            stdout, stderr)
+        finally:
+            pool.terminate()
+            pool.join()
+        return status
+
+    processor = RecordProcessor(options.command, patch)
+    return _write((processor.process_chunk(chunk) for chunk in chunks), stdout, stderr)
+
+
+def _write(results, stdout, stderr):
+    status = 0
+    for chunk in results:
+        for source, number, output, error in chunk:
+            if error is None:
+                stdout.write(output + '\n')
+            else:
+                status = 1
+                stderr.write(json.dumps({'input': source, 'line': number, 'error': error}) + '\n')
+        stdout.flush()
+    return status
+
+
+def parse_args(args=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('inputs', nargs='*', metavar='input', help="JSON Lines files, '-' for stdin (default stdin)")
+    common.add_argument('--workers', '-w', type=int, default=1, help='worker processes (default 1, no pool)')
+    common.add_argument('--chunk-size', type=int, default=256, help='records sent to a worker at once (default 256)')
+    common.add_argument('--output', '-o', help='file to write the records to (default stdout)')
+
+    parser = argparse.ArgumentParser(prog='python -m jsonpatchext', description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    for command, description in (('apply', 'apply a patch to each record'),
+                                  ('check', 'check each record with a check-only patch'),
+                                  ('diff', 'write the patch between the two documents of each record')):
+        subparser = commands.add_parser(command, parents=[common], help=description, description=description)
+        if command != 'diff':
+            subparser.add_argument('--patch', '-p', help='JSON file of the patch of every record, by default '
+                                                         'each record is {"doc": ..., "patch": ...}')
+    options = parser.parse_args(args)
+    if options.chunk_size < 1:
+        parser.error('--chunk-size must be positive')
+    if options.command == 'diff':
+        options.patch = None
+    return options
+
+
+def main(args=None):
+    options = parse_args(args)
+    if options.output:
+        with io.open(options.output, 'w', encoding='utf-8') as f:
+            return run(options, stdout=f)
+    return run(options)
@@ -0,0 +1,319 @@
+""" Compile JSON-Patches with extensions into specialized Python functions """
+
+from __future__ import unicode_literals
+
+import copy
+import functools
+import re
+
+from future.utils import raise_with_traceback
+from jsonpatch import JsonPatchTestFailed, InvalidJsonPatch
+
+from jsonpatchext.comparators import EqualsComparator, NotEqualsComparator, StartsWithComparator, \
+    EndsWithComparator, RangeComparator, check_not_awaitable
+from jsonpatchext.merge import InvalidMerge
+from jsonpatchext.mutators import UppercaseMutator, LowercaseMutator, InitMutator
+
+# Errors that can happen while walking the unrolled subscripts, in which case
+# the generic operation is applied instead, so it raises its own exception.
+_WALK_ERRORS = (KeyError, IndexError, TypeError)
+
+_RE_ARRAY_INDEX = re.compile('^(0|[1-9][0-9]*)$')
+
+# Comparators whose failing condition can be written as an expression of
+# the current value '{v}' and the compared value '{c}'.
+_INLINE_COMPARATORS = {
+    EqualsComparator: '{v} != {c}',
+    NotEqualsComparator: '{v} == {c}',
+    StartsWithComparator: 'not {v}.startswith({c})',
+    EndsWithComparator: 'not {v}.endswith({c})',
+    RangeComparator: '{v} < {c}[0] or {v} > {c}[1]',
+}
+
+# Mutators which can be written as an expression of the current value '{v}'
+# and the mutation value '{c}'.
+_INLINE_MUTATORS = {
+    UppercaseMutator: '{v}.upper()',
+    LowercaseMutator: '{v}.lower()',
+    InitMutator: '_deepcopy({c}) if {v} is None else {v}',
+}
+
+
+def compile_patch(patch):
+    """Compiles a patch into a :class:`GeneratedPatch`.
+
+    :param patch: Patch to compile.
+    :type patch: JsonPatchExt or PreparedPatch
+
+    :return: Compiled patch.
+    :rtype: GeneratedPatch
+    """
+    if not hasattr(patch, '_check_error'):
+        patch = patch.compile()
+    return GeneratedPatch(patch)
+
+
+class GeneratedPatch(object):
+    """A patch compiled into generated Python source.
+
+    Pointer walks are unrolled into direct subscripts and simple comparators
+    and mutators are inlined. Whenever the document does not have the shape
+    the unrolled code expects, the generic operation is applied instead, so
+    the results and the raised exceptions are the same as
+    :meth:`JsonPatchExt.apply` and :meth:`JsonPatchExt.check`.
+
+    >>> from jsonpatchext import JsonPatchExt
+    >>> patch = JsonPatchExt([
+    ...     {'op': 'check', 'path': '/foo/bar', 'value': 'baz', 'cmp': 'equals'},
+    ...     {'op': 'mutate', 'path': '/foo/bar', 'mut': 'uppercase'},
+    ... ]).compile(engine='codegen')
+    >>> patch.apply({'foo': {'bar': 'baz'}})
+    {'foo': {'bar': 'BAZ'}}
+    """
+
+    __slots__ = ('source', '_apply', '_apply_copy', '_check', '_check_error')
+
+    def __init__(self, prepared):
+        ops = prepared._ops
+        namespace = {
+            'JsonPatchTestFailed': JsonPatchTestFailed,
+            'InvalidMerge': InvalidMerge,
+            '_WALK_ERRORS': _WALK_ERRORS,
+            '_mutation_failed': _mutation_failed,
+            '_merge_failed': _merge_failed,
+            '_deepcopy': copy.deepcopy,
+            '_not_awaitable': check_not_awaitable,
+        }
+        for index, operation in enumerate(ops):
+            namespace['_op{0}'.format(index)] = operation
+
+        apply_source = _generate_apply(ops, namespace)
+        hoisted = prepared._plan[0]
+        if hoisted:
+            from jsonpatchext.jsonpatchext import _raise_first_failure
+            namespace['_hoisted_failed'] = functools.partial(_raise_first_failure, ops)
+            apply_source += '\n\n' + _generate_apply_copy(ops, hoisted, namespace)
+        check_source = _generate_check(prepared._check_ops, namespace)
+        source = apply_source + '\n\n' + check_source
+
+        exec(compile(source, '<jsonpatchext.codegen>', 'exec'), namespace)
+
+        object.__setattr__(self, 'source', source)
+        object.__setattr__(self, '_apply', namespace['apply_patch'])
+        object.__setattr__(self, '_apply_copy', namespace.get('apply_copy'))
+        object.__setattr__(self, '_check', namespace['check_patch'])
+        object.__setattr__(self, '_check_error', prepared._check_error)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GeneratedPatch is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("GeneratedPatch is immutable")
+
+    def apply(self, obj, in_place=False):
+        """Applies the patch to a given object.
+
+        :param obj: Document object.
+        :type obj: dict
+
+        :param in_place: Tweaks the way how patch would be applied - directly to
+                         specified `obj` or to its copy.
+        :type in_place: bool
+
+        :return: Modified `obj`.
+        """
+        if in_place:
+            return self._apply(obj)
+        if self._apply_copy is not None:
+            return self._apply_copy(obj)
+        return self._apply(copy.deepcopy(obj))
+
+    def check(self, obj):
+        """Checks the object using the patch.
+
+        :param obj: Document object.
+        :type obj: Mapping
+
+        :return: whether the check succedded
+        :rtype: bool
+        """
+        if self._check_error is not None:
+            raise InvalidJsonPatch(self._check_error)
+        return self._check(obj)
+
+
+def _mutation_failed(e):
+    raise_with_traceback(InvalidJsonPatch('Invalid mutation: {}'.format(str(e))))
+
+
+def _merge_failed(operation, e):
+    raise_with_traceback(InvalidJsonPatch('Invalid merge at "{}": {}'.format(
+        operation.location, str(e))))
+
+
+def _inlinable(operation):
+    parts = operation.pointer.parts
+    return parts and parts[-1] != '-' and not operation._wildcard and operation.operation.get('mut') != 'custom'
+
+
+def _walk(target, parts):
+    """Unrolls pointer parts into subscripts equivalent to ``JsonPointer.walk``
+    for lists and mappings, assigning the result to `target`."""
+    lines = ['        {0} = doc'.format(target)]
+    for part in parts:
+        if _RE_ARRAY_INDEX.match(part):
+            lines.append('        {0} = {0}[{1}] if {0}.__class__ is list else {0}[{2!r}]'.format(
+                target, int(part), part))
+        else:
+            lines.append('        {0} = {0}[{1!r}]'.format(target, part))
+    return lines
+
+
+def _generate_apply(ops, namespace):
+    lines = ['def apply_patch(doc):']
+    for index, operation in enumerate(ops):
+        lines.extend(_generate_apply_op(index, operation, namespace))
+    lines.append('    return doc')
+    return '\n'.join(lines)
+
+
+def _generate_apply_copy(ops, hoisted, namespace):
+    """Generates the application to a copy of the document, evaluating the
+    hoisted checks, the ascending indexes of `hoisted`, before copying it, as
+    :meth:`JsonPatchExt.apply`."""
+    lines = ['def apply_copy(doc):', '    try:']
+    # in patch order, the first failing check is raised
+    for index in hoisted:
+        lines.extend('    ' + line for line in _generate_apply_op(index, ops[index], namespace))
+    lines.extend([
+        '    except Exception:',
+        '        # the exception of a failing previous operation is raised first',
+        '        _hoisted_failed(doc)',
+        '        raise',
+        '    doc = _deepcopy(doc)',
+    ])
+    hoisted = frozenset(hoisted)
+    for index, operation in enumerate(ops):
+        if index not in hoisted:
+            lines.extend(_generate_apply_op(index, operation, namespace))
+    lines.append('    return doc')
+    return '\n'.join(lines)
+
+
+def _generate_apply_op(index, operation, namespace):
+    op = operation.operation['op']
+    if op == 'check':
+        return _generate_check_op(index, operation, namespace, failed=None)
+    if op == 'mutate' and _inlinable(operation):
+        return _generate_mutate_op(index, operation, namespace)
+    if op == 'merge' and _inlinable(operation):
+        return _generate_merge_op(index, operation, namespace)
+    return ['    doc = _op{0}.apply(doc)'.format(index)]
+
+
+def _generate_check(ops, namespace):
+    lines = ['def check_patch(doc):']
+    for index, operation in enumerate(ops):
+        lines.extend(_generate_check_op(index, operation, namespace, failed='return False', prefix='_chk'))
+    lines.append('    return True')
+    return '\n'.join(lines)
+
+
+def _generate_check_op(index, operation, namespace, failed, prefix='_op'):
+    """Generates a check operation. When `failed` is None a failing check raises
+    JsonPatchTestFailed, otherwise `failed` is the statement to run."""
+    name = '{0}{1}'.format(prefix, index)
+    namespace[name] = operation
+    cmp_name, value_name = name + '_cmp', name + '_val'
+    namespace[cmp_name] = operation._comparator
+    namespace[value_name] = operation._value
+
+    if operation._wildcard or operation.operation['cmp'] == 'custom':
+        # custom comparators are not inlined, they may return an awaitable
+        if failed is None:
+            return ['    {0}.apply(doc)'.format(name)]
+        return ['    if not {0}.test(doc):'.format(name), '        {0}'.format(failed)]
+
+    if failed is None:
+        fallback = ['        {0}.apply(doc)'.format(name)]
+        compare = ["        _not_awaitable({0}(_x, {1}), 'comparator')".format(cmp_name, value_name)]
+    else:
+        # only the boolean forms, no failure message is needed
+        pred_name = name + '_pred'
+        namespace[pred_name] = operation._predicate
+        fallback = [
+            '        if not {0}.test(doc):'.format(name),
+            '            {0}'.format(failed),
+        ]
+        compare = [
+            '        if not {0}(_x, {1}):'.format(pred_name, value_name),
+            '            {0}'.format(failed),
+        ]
+
+    lines = ['    try:']
+    lines.extend(_walk('_x', operation.pointer.parts))
+    lines.append('    except _WALK_ERRORS:')
+    lines.extend(fallback)
+    lines.append('    else:')
+
+    condition = _INLINE_COMPARATORS.get(operation._comparator)
+    if condition is not None:
+        lines.append('        if {0}:'.format(condition.format(v='_x', c=value_name)))
+        if failed is None:
+            # let the comparator build its failure message
+            lines.append('    ' + compare[0])
+        else:
+            lines.append('            {0}'.format(failed))
+    else:
+        lines.extend(compare)
+    return lines
+
+
+def _generate_mutate_op(index, operation, namespace):
+    name = '_op{0}'.format(index)
+    mut_name, value_name = name + '_mut', name + '_val'
+    namespace[mut_name] = operation._mutator
+    namespace[value_name] = operation._operand
+
+    key = operation.pointer.parts[-1]
+    expression = _INLINE_MUTATORS.get(operation._mutator)
+    if expression is None:
+        expression = "_not_awaitable({0}(_x, {1}), 'mutator')".format(mut_name, value_name)
+    else:
+        expression = expression.format(v='_x', c=value_name)
+
+    lines = ['    try:']
+    lines.extend(_walk('_p', operation.pointer.parts[:-1]))
+    return lines + [
+        '    except _WALK_ERRORS:',
+        '        _p = None',
+        '    if _p.__class__ is dict:',
+        '        _x = _p[{0!r}] if {0!r} in _p else None'.format(key),
+        '        try:',
+        '            _p[{0!r}] = {1}'.format(key, expression),
+        '        except Exception as e:',
+        '            _mutation_failed(e)',
+        '    else:',
+        '        doc = {0}.apply(doc)'.format(name),
+    ]
+
+
+def _generate_merge_op(index, operation, namespace):
+    name = '_op{0}'.format(index)
+    value_name = name + '_val'
+    namespace[value_name] = operation.operation['value']
+
+    key = operation.pointer.parts[-1]
+    lines = ['    try:']
+    lines.extend(_walk('_p', operation.pointer.parts[:-1]))
+    return lines + [
+        '    except _WALK_ERRORS:',
+        '        _p = None',
+        '    if _p.__class__ is dict and {0!r} in _p:'.format(key),
+        '        try:',
+        '            {0}.apply_merge(_p, {1!r}, {2})'.format(name, key, value_name),
+        '        except InvalidMerge as e:',
+        '            _merge_failed({0}, e)'.format(name),
+        '    else:',
+        '        doc = {0}.apply(doc)'.format(name),
+    ]
@@ -1,80 +1,272 @@
-import re
+from jsonpatch import JsonPatchTestFailed, InvalidJsonPatch
 
-from jsonpatch import JsonPatchTestFailed
+from jsonpatchext.cache import compile_pattern
+
+try:
+    from inspect import isawaitable
+except ImportError:
+    # Python < 3.5
+    def isawaitable(obj):
+        return False
+
+# Each comparator raises JsonPatchTestFailed with a descriptive message when the
+# check fails, and has a 'predicate' attribute: a function with the same
+# arguments returning whether the check passes, without building the message.
+#
+# Comparators may also have an 'operand' attribute, a function preprocessing
+# the compared value once when the operation is prepared. They accept both
+# the original and the preprocessed compared value.
+
+
+# The types of the results which are never awaitable.
+_PLAIN_RESULTS = frozenset([type(None), bool, int, float, type(''), bytes, dict, list, tuple])
+
+
+def check_not_awaitable(result, kind):
+    """Returns the result of a comparator or mutator, raising InvalidJsonPatch
+    if it is awaitable, as only :meth:`JsonPatchExt.check_async` and
+    :meth:`JsonPatchExt.apply_async` await them. A coroutine is closed, so it
+    is not reported as never awaited."""
+    if type(result) in _PLAIN_RESULTS or not isawaitable(result):
+        return result
+    close = getattr(result, 'close', None)
+    if close is not None:
+        close()
+    raise InvalidJsonPatch("The {0} returned an awaitable, use check_async or apply_async".format(kind))
+
+
+def comparator_predicate(comparator):
+    """Returns the boolean form of a comparator.
+
+    This is its 'predicate' attribute, or for comparators without one, like
+    most custom comparators, a function calling it and returning False if it
+    raises JsonPatchTestFailed.
+    """
+    predicate = getattr(comparator, 'predicate', None)
+    if predicate is not None:
+        return predicate
+
+    def predicate(current, compare):
+        try:
+            check_not_awaitable(comparator(current, compare), 'comparator')
+        except JsonPatchTestFailed:
+            return False
+        return True
+
+    return predicate
+
+
+def EqualsPredicate(current, compare):
+    """Whether the values are exactly equals."""
+    return not current != compare
 
 
 def EqualsComparator(current, compare):
     """Compare if the values are exactly equals."""
-    if current != compare:
+    if not EqualsPredicate(current, compare):
         msg = '{0} ({1}) is not equal to value {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
 
 
+EqualsComparator.predicate = EqualsPredicate
+
+
+def NotEqualsPredicate(current, compare):
+    """Whether the values are not equals."""
+    return not current == compare
+
+
 def NotEqualsComparator(current, compare):
     """Compare if the values are not equals."""
-    if current == compare:
+    if not NotEqualsPredicate(current, compare):
         msg = '{0} ({1}) is equal to value {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
 
 
+NotEqualsComparator.predicate = NotEqualsPredicate
+
+
+def RegExPredicate(current, compare):
+    """Whether a string matches a regex."""
+    return compile_pattern(compare).search(current) is not None
+
+
 def RegExComparator(current, compare):
     """Checks to see if a string matches a regex."""
-    if re.compile(compare).search(current) is None:
+    if not RegExPredicate(current, compare):
+        compare = getattr(compare, 'pattern', compare)
         msg = '{0} ({1}) does not match the regex {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
 
 
+RegExComparator.predicate = RegExPredicate
+RegExComparator.operand = compile_pattern
+
+
+def StartsWithPredicate(current, compare):
+    """Whether current starts with compare."""
+    return current.startswith(compare)
+
+
 def StartsWithComparator(current, compare):
     """Compare if current starts with compare."""
-    if not current.startswith(compare):
+    if not StartsWithPredicate(current, compare):
         msg = '{0} ({1}) does not starts with value {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
 
 
+StartsWithComparator.predicate = StartsWithPredicate
+
+
+def EndsWithPredicate(current, compare):
+    """Whether current ends with compare."""
+    return current.endswith(compare)
+
+
 def EndsWithComparator(current, compare):
     """Compare if current ends with compare."""
-    if not current.endswith(compare):
+    if not EndsWithPredicate(current, compare):
         msg = '{0} ({1}) does not ends with value {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
 
 
+EndsWithComparator.predicate = EndsWithPredicate
+
+
+def LengthPredicate(current, compare):
+    """Whether current len is equals the compare value."""
+    return not len(current) != compare
+
+
 def LengthComparator(current, compare):
     """Compare if current len is equals the compare value."""
-    if len(current) != compare:
+    if not LengthPredicate(current, compare):
         msg = '{0} ({1}) is not of the expected length {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
 
 
+LengthComparator.predicate = LengthPredicate
+
+
+def IsAPredicate(current, compare):
+    """Whether a value is an instance of something."""
+    return isinstance(current, compare)
+
+
 def IsAComparator(current, compare):
     """Test to see if a value is an instance of something."""
-    if not isinstance(current, compare):
+    if not IsAPredicate(current, compare):
         msg = '{0} ({1}) is not an instance of {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
 
 
+IsAComparator.predicate = IsAPredicate
+
+
+def IsPredicate(current, compare):
+    """Whether the values are identical."""
+    return current is compare
+
+
 def IsComparator(current, compare):
     """Checks for identity not equality."""
-    if not current is compare:
+    if not IsPredicate(current, compare):
         msg = '{0} ({1}) is not {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
 
 
+IsComparator.predicate = IsPredicate
+
+
+def RangePredicate(current, compare):
+    """Whether value is in between 2 ranges (compare must be a 2-value tuple/list)."""
+    return not (current < compare[0] or current > compare[1])
+
+
 def RangeComparator(current, compare):
     """Checks if value is in between 2 ranges (compare must be a 2-value tuple/list)."""
-    if current < compare[0] or current > compare[1]:
+    if not RangePredicate(current, compare):
         msg = '{0} ({1}) is between {2} and {3}'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare[0], compare[1]))
 
 
+RangeComparator.predicate = RangePredicate
+
+
+def RangeOperand(compare):
+    """Normalizes the range to a (lo, hi) tuple."""
+    if isinstance(compare, list) and len(compare) == 2:
+        return compare[0], compare[1]
+    return compare
+
+
+RangeComparator.operand = RangeOperand
+
+
+def InPredicate(current, compare):
+    """Whether a key is in a list or dict."""
+    return compare in current
+
+
 def InComparator(current, compare):
     """Test if a key is in a list or dict."""
-    if compare not in current:
+    if not InPredicate(current, compare):
         msg = '{0} ({1}) is not in {2} ({3})'
         raise JsonPatchTestFailed(msg.format(compare, type(compare), current, type(current)))
 
 
+InComparator.predicate = InPredicate
+
+
+def InValuePredicate(current, compare):
+    """Whether the value is in a list or dict."""
+    return current in compare
+
+
 def InValueComparator(current, compare):
     """Test if a key is in a list or dict."""
-    if current not in compare:
+    if not InValuePredicate(current, compare):
+        if isinstance(compare, ValueSet):
+            compare = compare.values
         msg = '{0} ({1}) is not in {2} ({3})'
         raise JsonPatchTestFailed(msg.format(current, type(current), compare, type(compare)))
+
+
+InValueComparator.predicate = InValuePredicate
+
+
+class ValueSet(frozenset):
+    """A frozenset of hashable values, with the membership semantics of the
+    original container for unhashable values."""
+
+    def __new__(cls, values):
+        self = super(ValueSet, cls).__new__(cls, values)
+        self.values = values
+        return self
+
+    def __contains__(self, value):
+        try:
+            return super(ValueSet, self).__contains__(value)
+        except TypeError:
+            return value in self.values
+
+    def __reduce__(self):
+        return ValueSet, (self.values,)
+
+    def __repr__(self):
+        return repr(self.values)
+
+    __str__ = __repr__
+
+
+def InValueOperand(compare):
+    """Converts a list or tuple of hashable values to a :class:`ValueSet`."""
+    if not isinstance(compare, (list, tuple)):
+        return compare
+    try:
+        return ValueSet(compare)
+    except TypeError:
+        return compare
+
+
+InValueComparator.operand = InValueOperand
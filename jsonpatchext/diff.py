@@ -0,0 +1,327 @@
+""" Structural diff of JSON documents
+
+Subtrees are compared through structural hashes, computed once per subtree
+and memoized, so identical regions are skipped without walking them again,
+and the same object in both documents is skipped without hashing it. Array
+elements are matched by hash, so elements moved inside an array become
+'move' operations, and the elements which don't match are diffed pairwise.
+"""
+
+from __future__ import unicode_literals
+
+import difflib
+
+try:
+    from collections.abc import MutableMapping, MutableSequence
+except ImportError:
+    from collections import MutableMapping, MutableSequence
+
+text_type = type('')
+
+# Type tags of the containers in the structural hashes.
+_DICT = 'dict'
+_LIST = 'list'
+
+_SCALARS = frozenset([text_type, bytes, int, float, bool, type(None)])
+
+
+def diff(src, dst, merge=False, moves=True):
+    """Returns the operations transforming `src` into `dst`.
+
+    >>> diff({'a': [1, 2, 3], 'b': {'c': 1}}, {'a': [2, 3, 1], 'b': {'c': 1, 'd': 2, 'e': 3}}, merge=True)
+    [{'op': 'move', 'from': '/a/0', 'path': '/a/2'}, {'op': 'merge', 'path': '/b', 'value': {'d': 2, 'e': 3}}]
+
+    :param src: Data source document object.
+
+    :param dst: Data target document object.
+
+    :param merge: Whether to use a single 'merge' operation for an object
+                  whose changes only add members or append to arrays, when
+                  it replaces more than one operation.
+    :type merge: bool
+
+    :param moves: Whether to detect the array elements moved inside an array.
+    :type moves: bool
+
+    :rtype: list
+    """
+    return _Differ(merge, moves).diff(src, dst)
+
+
+class StructuralHasher(object):
+    """Computes structural hashes of JSON values, memoized by object.
+
+    The hash of an object doesn't depend on the order of its members, and
+    1, 1.0 and True have different hashes, as they are different in JSON.
+    The hashed objects are kept alive, so they must not be modified while the
+    hasher is in use.
+    """
+
+    def __init__(self):
+        self._memo = {}
+
+    def __call__(self, value):
+        kind = _kind(value)
+        if kind is not _DICT and kind is not _LIST:
+            return _scalar_hash(value)
+        memo = self._memo
+        entry = memo.get(id(value))
+        if entry is not None:
+            return entry[0]
+
+        # iterative post-order, so deep values don't hit the recursion limit:
+        # a node is hashed once all of its children are
+        stack = [value]
+        while stack:
+            node = stack[-1]
+            if id(node) in memo:
+                stack.pop()
+                continue
+            is_dict = _kind(node) is _DICT
+            hashes = []
+            pending = False
+            for key, child in (node.items() if is_dict else enumerate(node)):
+                child_kind = _kind(child)
+                if child_kind is _DICT or child_kind is _LIST:
+                    entry = memo.get(id(child))
+                    if entry is None:
+                        stack.append(child)
+                        pending = True
+                    elif not pending:
+                        hashes.append((key, entry[0]))
+                elif not pending:
+                    hashes.append((key, _scalar_hash(child)))
+            if pending:
+                continue
+            if is_dict:
+                result = hash((_DICT, frozenset(hashes)))
+            else:
+                result = hash((_LIST, tuple(child_hash for _, child_hash in hashes)))
+            memo[id(node)] = (result, node)
+            stack.pop()
+        return memo[id(value)][0]
+
+
+class _Differ(object):
+
+    def __init__(self, merge, moves):
+        self.merge = merge
+        self.moves = moves
+        self.hash = StructuralHasher()
+        self.operations = []
+
+    def diff(self, src, dst):
+        self._diff_value('', src, dst)
+        return self.operations
+
+    def equal(self, a, b):
+        """JSON equality, the hashes are compared first as they also
+        compare the types, and a collision is caught by ==."""
+        if a is b:
+            return True
+        if _kind(a) != _kind(b):
+            return False
+        return self.hash(a) == self.hash(b) and a == b
+
+    def _diff_value(self, path, src, dst):
+        """Containers are walked rather than hashed, so the objects shared by
+        both documents are skipped in the walk."""
+        if src is dst:
+            return
+        kind = _kind(src)
+        if kind is _DICT and _kind(dst) is _DICT:
+            self._diff_dict(path, src, dst)
+        elif kind is _LIST and _kind(dst) is _LIST:
+            self._diff_list(path, src, dst)
+        elif kind != _kind(dst) or src != dst:
+            self.operations.append({'op': 'replace', 'path': path, 'value': dst})
+
+    def _diff_dict(self, path, src, dst):
+        if self.merge:
+            value = self._additive(src, dst)
+            if value is not None and _count_leaves(value) > 1:
+                self.operations.append({'op': 'merge', 'path': path, 'value': value})
+                return
+
+        removed = [key for key in src if key not in dst]
+        added = [key for key in dst if key not in src]
+        if removed and added:
+            # renamed members
+            by_hash = {}
+            for key in added:
+                by_hash.setdefault(self.hash(dst[key]), []).append(key)
+            for key in list(removed):
+                candidates = by_hash.get(self.hash(src[key]), [])
+                target = next((candidate for candidate in candidates if self.equal(src[key], dst[candidate])), None)
+                if target is not None:
+                    candidates.remove(target)
+                    removed.remove(key)
+                    added.remove(target)
+                    self.operations.append({'op': 'move', 'from': _join(path, key), 'path': _join(path, target)})
+
+        for key in removed:
+            self.operations.append({'op': 'remove', 'path': _join(path, key)})
+        for key in dst:
+            if key in src:
+                self._diff_value(_join(path, key), src[key], dst[key])
+        for key in added:
+            self.operations.append({'op': 'add', 'path': _join(path, key), 'value': dst[key]})
+
+    def _additive(self, src, dst):
+        """Returns the value merging into `src` gives `dst`, or None if
+        `dst` doesn't only add to `src`."""
+        if isinstance(src, MutableMapping) and isinstance(dst, MutableMapping):
+            if type(src) is not dict or type(dst) is not dict or any(key not in dst for key in src):
+                return None
+            value = {}
+            for key, item in dst.items():
+                if key not in src:
+                    value[key] = item
+                elif src[key] is not item:
+                    added = self._additive(src[key], item)
+                    if added is None:
+                        if not self.equal(src[key], item):
+                            return None
+                    elif added:
+                        # an empty object is unchanged
+                        value[key] = added
+            return value
+        if type(src) is list and type(dst) is list and len(dst) > len(src):
+            if all(self.equal(a, b) for a, b in zip(src, dst)):
+                return dst[len(src):]
+        return None
+
+    def _diff_list(self, path, src, dst):
+        # the common prefix and suffix, usually most of the array
+        start, src_end, dst_end = 0, len(src), len(dst)
+        while start < src_end and start < dst_end and self.equal(src[start], dst[start]):
+            start += 1
+        while src_end > start and dst_end > start and self.equal(src[src_end - 1], dst[dst_end - 1]):
+            src_end -= 1
+            dst_end -= 1
+
+        old, new = src[start:src_end], dst[start:dst_end]
+        final, moved = self._match(old, new)
+
+        # the source elements not kept, from the end so the indexes are stable
+        kept = set(token for token in final if token is not None)
+        current = list(range(len(old)))
+        for index in reversed(range(len(old))):
+            if index not in kept:
+                self.operations.append({'op': 'remove', 'path': _join(path, start + index)})
+                del current[index]
+
+        # the kept elements reordered, the new ones inserted
+        targets = dict((token, position) for position, token in enumerate(final) if token is not None)
+        pushed = set()
+        position = 0
+        while position < len(final):
+            token = final[position]
+            if position < len(current) and current[position] == token and token is not None:
+                self._diff_value(_join(path, start + position), old[token], new[position])
+                position += 1
+                continue
+
+            if token is None:
+                self.operations.append({'op': 'add', 'path': _join(path, start + position), 'value': new[position]})
+                current.insert(position, None)
+                position += 1
+                continue
+
+            blocking = current[position] if position < len(current) else None
+            if blocking in moved and blocking not in pushed and targets[blocking] > position:
+                # move the blocking element after the elements preceding it
+                before = sum(1 for other in current[position + 1:] if targets[other] < targets[blocking])
+                pushed.add(blocking)
+                del current[position]
+                current.insert(position + before, blocking)
+                if before:
+                    self.operations.append({'op': 'move', 'from': _join(path, start + position),
+                                            'path': _join(path, start + position + before)})
+                continue
+
+            index = current.index(token, position)
+            self.operations.append({'op': 'move', 'from': _join(path, start + index),
+                                    'path': _join(path, start + position)})
+            del current[index]
+            current.insert(position, token)
+
+    def _match(self, old, new):
+        """Returns, for each element of `new`, the index of the element of
+        `old` which becomes it, or None for the added ones, and the set of the
+        moved elements of `old`."""
+        final = [None] * len(new)
+        moved = set()
+        if not old or not new:
+            return final, moved
+        old_hashes = [self.hash(value) for value in old]
+        new_hashes = [self.hash(value) for value in new]
+
+        matched = set()
+        matcher = difflib.SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+        blocks = matcher.get_matching_blocks()
+        for block in blocks:
+            for offset in range(block.size):
+                i, j = block.a + offset, block.b + offset
+                if self.equal(old[i], new[j]):
+                    final[j] = i
+                    matched.add(i)
+
+        if self.moves:
+            by_hash = {}
+            for i, value in enumerate(old):
+                if i not in matched:
+                    by_hash.setdefault(old_hashes[i], []).append(i)
+            for j, value in enumerate(new):
+                if final[j] is None:
+                    candidates = by_hash.get(new_hashes[j], ())
+                    i = next((i for i in candidates if self.equal(old[i], value)), None)
+                    if i is not None:
+                        candidates.remove(i)
+                        final[j] = i
+                        matched.add(i)
+                        moved.add(i)
+
+        # the remaining elements between the same matching blocks are paired
+        # in order, and diffed
+        old_start = new_start = 0
+        for block in blocks:
+            unmatched = [i for i in range(old_start, block.a) if i not in matched]
+            for j in range(new_start, block.b):
+                if final[j] is None and unmatched:
+                    final[j] = unmatched.pop(0)
+            old_start, new_start = block.a + block.size, block.b + block.size
+        return final, moved
+
+
+def _kind(value):
+    cls = type(value)
+    if cls is dict:
+        return _DICT
+    if cls is list:
+        return _LIST
+    if cls in _SCALARS:
+        return cls
+    if isinstance(value, MutableMapping):
+        return _DICT
+    if isinstance(value, MutableSequence):
+        return _LIST
+    return type(value)
+
+
+def _scalar_hash(value):
+    try:
+        return hash((type(value), value))
+    except TypeError:
+        return hash((type(value), repr(value)))
+
+
+def _count_leaves(value):
+    """Counts the operations a merge value replaces."""
+    if isinstance(value, dict):
+        return sum(_count_leaves(item) if isinstance(item, dict) and item else 1 for item in value.values())
+    return 1
+
+
+def _join(path, key):
+    return '{0}/{1}'.format(path, text_type(key).replace('~', '~0').replace('/', '~1'))
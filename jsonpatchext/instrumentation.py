@@ -0,0 +1,327 @@
+""" Per-operation timing of patch application and checks """
+
+from __future__ import unicode_literals
+
+import copy
+import threading
+import time
+from collections import namedtuple
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class OperationEvent(namedtuple('OperationEvent', 'index op path wall resolve passed')):
+    """The timing of a single operation.
+
+    `wall` is the duration of the operation in seconds. `resolve` is the time
+    walking its pointer to the parent container takes, measured by an extra
+    walk before the operation, as the operations resolve their own pointers.
+    `passed` is False when a check failed or the operation raised.
+    """
+
+    __slots__ = ()
+
+    @property
+    def operation_time(self):
+        """The wall time not spent resolving the pointer."""
+        return max(self.wall - self.resolve, 0.0)
+
+
+class PatchEvent(namedtuple('PatchEvent', 'kind wall passed')):
+    """The timing of a whole 'apply' or 'check'."""
+
+    __slots__ = ()
+
+
+class PatchObserver(object):
+    """Receives the timing of patch operations, pass an instance as the
+    `observer` argument of :meth:`JsonPatchExt.apply` or :meth:`JsonPatchExt.check`.
+
+    Events are delivered synchronously, from the thread applying the patch.
+    """
+
+    def on_operation(self, event):
+        """Called after each operation.
+
+        :type event: OperationEvent
+        """
+
+    def on_patch(self, event):
+        """Called after the whole patch.
+
+        :type event: PatchEvent
+        """
+
+
+def observe_operations(operations, observer):
+    """Returns copies of the operations reporting their timing to the observer."""
+    return [_observed(index, operation, observer) for index, operation in enumerate(operations)]
+
+
+def observe_patch(kind, observer, func, *args):
+    """Calls `func`, reporting its timing to the observer."""
+    start = timer()
+    passed = False
+    try:
+        result = func(*args)
+        passed = kind != 'check' or bool(result)
+        return result
+    finally:
+        observer.on_patch(PatchEvent(kind, timer() - start, passed))
+
+
+def _observed(index, operation, observer):
+    op = operation.operation.get('op')
+    path = operation.location
+    apply, test = operation.apply, getattr(operation, 'test', None)
+
+    def observed_apply(obj):
+        resolve = _resolve_time(operation.pointer, obj)
+        start = timer()
+        passed = False
+        try:
+            obj = apply(obj)
+            passed = True
+            return obj
+        finally:
+            observer.on_operation(OperationEvent(index, op, path, timer() - start, resolve, passed))
+
+    def observed_test(obj):
+        resolve = _resolve_time(operation.pointer, obj)
+        start = timer()
+        passed = False
+        try:
+            passed = test(obj)
+            return passed
+        finally:
+            observer.on_operation(OperationEvent(index, op, path, timer() - start, resolve, bool(passed)))
+
+    observed = copy.copy(operation)
+    observed.apply = observed_apply
+    if test is not None:
+        observed.test = observed_test
+    return observed
+
+
+def _resolve_time(pointer, obj):
+    start = timer()
+    try:
+        pointer.to_last(obj)
+    except Exception:
+        # the operation reports the error
+        pass
+    return timer() - start
+
+
+class LatencyHistogram(object):
+    """A log-linear (HDR-style) histogram of durations.
+
+    Durations are recorded in nanoseconds, in buckets of width 1 up to
+    `sub_buckets`, and then in `sub_buckets / 2` buckets per power of two, so
+    percentiles have a relative error below ``2 / sub_buckets``.
+
+    :param sub_buckets: Power of two, the precision of the histogram.
+    :type sub_buckets: int
+    """
+
+    def __init__(self, sub_buckets=32):
+        if sub_buckets < 2 or sub_buckets & (sub_buckets - 1):
+            raise ValueError("sub_buckets must be a power of two")
+        self.sub_buckets = sub_buckets
+        self._shift = sub_buckets.bit_length() - 1
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Records a duration in seconds."""
+        index = self._index(int(seconds * 1e9))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """Returns the upper bound of the bucket holding the percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = max(percent / 100.0 * self.count, 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper(index) / 1e9, self.max)
+        return self.max
+
+    def count_below(self, nanoseconds):
+        """Returns the number of durations in the buckets ending at or below
+        `nanoseconds`, exact when it is a power of two."""
+        return sum(count for index, count in self.counts.items() if self._upper(index) <= nanoseconds)
+
+    def _index(self, value):
+        if value < self.sub_buckets:
+            return max(value, 0)
+        exponent = value.bit_length() - self._shift
+        half = self.sub_buckets // 2
+        return self.sub_buckets + (exponent - 1) * half + (value >> exponent) - half
+
+    def _upper(self, index):
+        if index < self.sub_buckets:
+            return index + 1
+        half = self.sub_buckets // 2
+        exponent, offset = divmod(index - self.sub_buckets, half)
+        return (half + offset + 1) << (exponent + 1)
+
+
+class _OperationStats(object):
+
+    def __init__(self):
+        self.wall = LatencyHistogram()
+        self.resolve = LatencyHistogram()
+        self.failed = 0
+
+
+# Bucket bounds of the Prometheus histograms, from about 1us to 17s.
+PROMETHEUS_BOUNDS = tuple(2 ** exponent for exponent in range(10, 35, 2))
+
+
+class MetricsObserver(PatchObserver):
+    """Aggregates operation timings into histograms and counters.
+
+    >>> from jsonpatchext import JsonPatchExt
+    >>> metrics = MetricsObserver()
+    >>> patch = JsonPatchExt([{'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'equals'}])
+    >>> patch.check({'foo': 'bar'}, observer=metrics)
+    True
+    >>> metrics.operations[('check',)].wall.count
+    1
+
+    :param by_index: Whether to aggregate each operation index separately,
+                     useful when always observing the same patch.
+    :type by_index: bool
+    """
+
+    def __init__(self, by_index=False):
+        self.by_index = by_index
+        self.operations = {}
+        self.patches = {}
+        self._lock = threading.Lock()
+
+    def on_operation(self, event):
+        key = (event.op, event.index) if self.by_index else (event.op,)
+        with self._lock:
+            stats = self.operations.get(key)
+            if stats is None:
+                stats = self.operations[key] = _OperationStats()
+            stats.wall.record(event.wall)
+            stats.resolve.record(event.resolve)
+            if not event.passed:
+                stats.failed += 1
+
+    def on_patch(self, event):
+        with self._lock:
+            stats = self.patches.get(event.kind)
+            if stats is None:
+                stats = self.patches[event.kind] = _OperationStats()
+            stats.wall.record(event.wall)
+            if not event.passed:
+                stats.failed += 1
+
+    def reset(self):
+        with self._lock:
+            self.operations.clear()
+            self.patches.clear()
+
+    def summary(self):
+        """Returns a text table of the counts and latency percentiles."""
+        header = ('operation', 'count', 'failed', 'p50', 'p90', 'p99', 'max', 'resolve p50')
+        rows = []
+        with self._lock:
+            for key in sorted(self.operations, key=_sort_key):
+                rows.append(self._row(' '.join(_text(part) for part in key), self.operations[key], True))
+            for kind in sorted(self.patches):
+                rows.append(self._row('[{0}]'.format(kind), self.patches[kind], False))
+
+        widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header))]
+        lines = []
+        for row in [header] + rows:
+            cells = [row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+            lines.append('  '.join(cells).rstrip())
+        return '\n'.join(lines)
+
+    def prometheus(self, prefix='jsonpatchext'):
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            operations = sorted(self.operations.items(), key=lambda item: _sort_key(item[0]))
+            for name, attribute, description in (
+                    ('operation_seconds', 'wall', 'Duration of patch operations.'),
+                    ('operation_resolve_seconds', 'resolve', 'Duration of the pointer resolution of patch operations.')):
+                lines.append('# HELP {0}_{1} {2}'.format(prefix, name, description))
+                lines.append('# TYPE {0}_{1} histogram'.format(prefix, name))
+                for key, stats in operations:
+                    _prometheus_histogram(lines, prefix + '_' + name, self._labels(key), getattr(stats, attribute))
+
+            lines.append('# HELP {0}_operation_failures_total Failed checks and operations.'.format(prefix))
+            lines.append('# TYPE {0}_operation_failures_total counter'.format(prefix))
+            for key, stats in operations:
+                lines.append('{0}_operation_failures_total{{{1}}} {2}'.format(prefix, self._labels(key), stats.failed))
+
+            lines.append('# HELP {0}_patch_seconds Duration of whole patches.'.format(prefix))
+            lines.append('# TYPE {0}_patch_seconds histogram'.format(prefix))
+            for kind in sorted(self.patches):
+                _prometheus_histogram(lines, prefix + '_patch_seconds', 'kind="{0}"'.format(kind),
+                                      self.patches[kind].wall)
+            lines.append('# HELP {0}_patch_failures_total Failed patches.'.format(prefix))
+            lines.append('# TYPE {0}_patch_failures_total counter'.format(prefix))
+            for kind in sorted(self.patches):
+                lines.append('{0}_patch_failures_total{{kind="{1}"}} {2}'.format(
+                    prefix, kind, self.patches[kind].failed))
+        return '\n'.join(lines) + '\n'
+
+    def _labels(self, key):
+        labels = 'op="{0}"'.format(_escape(_text(key[0])))
+        if self.by_index:
+            labels += ',index="{0}"'.format(key[1])
+        return labels
+
+    @staticmethod
+    def _row(name, stats, resolve):
+        wall = stats.wall
+        return (
+            name, str(wall.count), str(stats.failed),
+            format_duration(wall.percentile(50)), format_duration(wall.percentile(90)),
+            format_duration(wall.percentile(99)), format_duration(wall.max),
+            format_duration(stats.resolve.percentile(50)) if resolve else '',
+        )
+
+
+def _prometheus_histogram(lines, name, labels, histogram):
+    for bound in PROMETHEUS_BOUNDS:
+        lines.append('{0}_bucket{{{1},le="{2!r}"}} {3}'.format(
+            name, labels, bound / 1e9, histogram.count_below(bound)))
+    lines.append('{0}_bucket{{{1},le="+Inf"}} {2}'.format(name, labels, histogram.count))
+    lines.append('{0}_sum{{{1}}} {2!r}'.format(name, labels, histogram.sum))
+    lines.append('{0}_count{{{1}}} {2}'.format(name, labels, histogram.count))
+
+
+def format_duration(seconds):
+    """Formats a duration with a unit between nanoseconds and seconds."""
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{0:.3g}{1}'.format(seconds / scale, unit)
+    return '{0:.3g}ns'.format(seconds / 1e-9)
+
+
+def _sort_key(key):
+    return tuple(_text(part) if index == 0 else part for index, part in enumerate(key))
+
+
+def _text(value):
+    return '' if value is None else '{0}'.format(value)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -34,6 +34,7 @@
 
 from __future__ import unicode_literals
 
+import copy
 import sys
 try:
     from types import MappingProxyType
@@ -41,23 +42,28 @@ except ImportError:
     # Python < 3.3
     MappingProxyType = dict
 
-from deepmerge import Merger
-from deepmerge.exception import InvalidMerge
 from future.utils import raise_with_traceback
 from jsonpatch import PatchOperation, JsonPatchTestFailed, InvalidJsonPatch, \
-    JsonPatchConflict, JsonPatch
+    JsonPatchConflict, JsonPatch, AddOperation, RemoveOperation, ReplaceOperation, MoveOperation, \
+    CopyOperation, TestOperation
 from jsonpointer import JsonPointerException, JsonPointer
 
+from jsonpatchext.analysis import hoisting_plan, from_pointer
+from jsonpatchext.cache import parse_patch, patch_cache
+from jsonpatchext.lazy import RawJson, is_raw, loads as _lazy_loads, dumps as _lazy_dumps
+from jsonpatchext.merge import Merger, InvalidMerge, merge_type_conflict, merge_fallback, is_list_strategy
 from jsonpatchext.comparators import EqualsComparator, NotEqualsComparator, RegExComparator, StartsWithComparator, \
-    EndsWithComparator, LengthComparator, IsAComparator, IsComparator, RangeComparator, InComparator, InValueComparator
+    EndsWithComparator, LengthComparator, IsAComparator, IsComparator, RangeComparator, InComparator, InValueComparator, \
+    comparator_predicate, check_not_awaitable
 from jsonpatchext.mutators import UppercaseMutator, LowercaseMutator, CastMutator, RegExMutator, SliceMutator, \
-    InitMutator
+    InitMutator, MutatorChain
+from jsonpatchext.wildcard import uses_wildcards, static_prefix, expand
 
 try:
-    from collections.abc import MutableMapping, MutableSequence
+    from collections.abc import Mapping, MutableMapping, MutableSequence
 
 except ImportError:
-    from collections import MutableMapping, MutableSequence
+    from collections import Mapping, MutableMapping, MutableSequence
     str = unicode
 
 # Will be parsed by setup.py to determine package metadata
@@ -72,85 +78,203 @@ if sys.version_info >= (3, 0):
     basestring = (bytes, str)  # pylint: disable=C0103,W0622
 
 
-def apply_patch(doc, patch, in_place=False):
+def apply_patch(doc, patch, in_place=False, copy_on_write=False):
     """Apply list of patches to specified json document.
 
-    :param doc: Document object.
+    >>> apply_patch(b'{"foo": {"bar": 1}, "baz": [1, 2]}', [{'op': 'add', 'path': '/foo/qux', 'value': 2}])
+    b'{"foo": {"bar": 1, "qux": 2}, "baz": [1, 2]}'
+
+    :param doc: Document object, or JSON text as bytes or
+                :class:`jsonpatchext.lazy.RawJson`, only decoded where the
+                patch goes and returned encoded the same way.
     :type doc: dict
 
-    :param patch: JSON patch as list of dicts or raw JSON-encoded string.
+    :param patch: JSON patch as list of dicts or raw JSON-encoded string,
+                  parsed once for the same string, see
+                  :func:`jsonpatchext.cache.parse_patch`.
     :type patch: list or str
 
     :param in_place: While :const:`True` patch will modify target document.
                      By default patch will be applied to document copy.
     :type in_place: bool
 
+    :param copy_on_write: While :const:`True` and not `in_place`, only the
+                          containers along the modified paths are copied, and
+                          the result shares every untouched subtree with `doc`.
+    :type copy_on_write: bool
+
     :return: Patched document object.
     :rtype: dict
     """
 
     if isinstance(patch, basestring):
-        patch = JsonPatchExt.from_string(patch)
+        patch = parse_patch(patch)
     else:
         patch = JsonPatchExt(patch)
-    return patch.apply(doc, in_place)
+    return patch.apply(doc, in_place, copy_on_write=copy_on_write)
+
 
+def make_patch(src, dst, merge=False, moves=True):
+    """Generates patch by comparing two document objects.
 
-def make_patch(src, dst):
-    """Generates patch by comparing two document objects. Actually is
-    a proxy to :meth:`JsonPatch.from_diff` method.
+    Subtrees are compared by structural hashes, so the unchanged regions of
+    the documents are skipped, and the objects shared by both documents, as
+    with ``copy_on_write``, are skipped without being walked. See
+    :mod:`jsonpatchext.diff`.
+
+    >>> make_patch({'a': 1, 'b': [1, 2]}, {'a': 2, 'b': [2, 1]}).patch
+    [{'op': 'replace', 'path': '/a', 'value': 2}, {'op': 'move', 'from': '/b/1', 'path': '/b/0'}]
 
     :param src: Data source document object.
     :type src: dict
 
     :param dst: Data source document object.
     :type dst: dict
-    """
 
-    return JsonPatchExt.from_diff(src, dst)
+    :param merge: Whether to use a 'merge' operation for the objects whose
+                  changes only add members or append to arrays.
+    :type merge: bool
+
+    :param moves: Whether to detect the elements moved inside arrays.
+    :type moves: bool
+    """
+    from jsonpatchext.diff import diff
+    return JsonPatchExt(diff(src, dst, merge, moves))
+
+
+_COMPARATORS = {
+    'equals': EqualsComparator,
+    'notequals': NotEqualsComparator,
+    'regex': RegExComparator,
+    'startswith': StartsWithComparator,
+    'endswith': EndsWithComparator,
+    'length': LengthComparator,
+    'isa': IsAComparator,
+    'is': IsComparator,
+    'range': RangeComparator,
+    'in': InComparator,
+    'invalue': InValueComparator,
+    'custom': None,
+}
+
+_MUTATORS = {
+    'uppercase': UppercaseMutator,
+    'lowercase': LowercaseMutator,
+    'cast': CastMutator,
+    'regex': RegExMutator,
+    'slice': SliceMutator,
+    'init': InitMutator,
+    'custom': None,
+}
 
 
 class CheckOperation(PatchOperation):
-    """Check value by specified location using a comparator."""
+    """Check value by specified location using a comparator.
+
+    With a true 'wildcard' member the path may contain wildcards (see
+    :mod:`jsonpatchext.wildcard`), then the 'quantifier' member tells whether
+    'all' (the default) or 'any' of the matched values must pass the check.
+    """
+
+    # The comparators by name, shared by every operation, see register_comparator.
+    comparators = MappingProxyType(_COMPARATORS)
 
     def __init__(self, operation, pointer_cls=JsonPointer):
         super(CheckOperation, self).__init__(operation, pointer_cls)
 
-        self.comparators = {
-            'equals': EqualsComparator,
-            'notequals': NotEqualsComparator,
-            'regex': RegExComparator,
-            'startswith': StartsWithComparator,
-            'endswith': EndsWithComparator,
-            'length': LengthComparator,
-            'isa': IsAComparator,
-            'is': IsComparator,
-            'range': RangeComparator,
-            'in': InComparator,
-            'invalue': InValueComparator,
-            'custom': None,
-        }
+        self._comparator = None
+        self._predicate = None
+        self._value = None
+        self._wildcard = uses_wildcards(self.operation, self.pointer.parts)
+
+    def prepare(self):
+        """Validates the operation and resolves its value and comparator once,
+        so that :meth:`apply` only does the document work."""
+        value = self._get_value()
+        self._comparator = self._get_comparator()
+        self._predicate = comparator_predicate(self._comparator)
+        self._value = _prepare_operand(self._comparator, value)
+        self._get_quantifier()
+        return self
 
     def apply(self, obj):
+        if self._wildcard:
+            return self._apply_wildcard(obj)
+
         try:
-            subobj, part = self.pointer.to_last(obj)
-            if part is None:
-                val = subobj
-            else:
-                val = self.pointer.walk(subobj, part)
+            val = self._resolve(obj)
         except JsonPointerException as ex:
             raise JsonPatchTestFailed(str(ex))
 
+        if self._comparator is not None:
+            check_not_awaitable(self._comparator(val, self._value), 'comparator')
+        else:
+            value = self._get_value()
+            check_not_awaitable(self._get_comparator()(val, value), 'comparator')
+
+        return obj
+
+    def test(self, obj):
+        """Returns whether the check passes on the object, like :meth:`apply`
+        not raising JsonPatchTestFailed, but without building a failure message.
+
+        :param obj: Document object.
+        :type obj: Mapping
+
+        :rtype: bool
+        """
+        if self._wildcard:
+            values = [current for _, _, current in expand(obj, self.pointer.parts)]
+        else:
+            try:
+                values = [self._resolve(obj)]
+            except JsonPointerException:
+                return False
+
+        if self._predicate is not None:
+            predicate, value = self._predicate, self._value
+        else:
+            value = self._get_value()
+            predicate = comparator_predicate(self._get_comparator())
+        if self._wildcard and self._get_quantifier() == 'any':
+            return any(predicate(current, value) for current in values)
+        return all(predicate(current, value) for current in values)
+
+    def _apply_wildcard(self, obj):
+        values = [current for _, _, current in expand(obj, self.pointer.parts)]
+        if self._comparator is not None:
+            comparator, value = self._comparator, self._value
+        else:
+            value = self._get_value()
+            comparator = self._get_comparator()
+
+        if self._get_quantifier() == 'all':
+            for current in values:
+                check_not_awaitable(comparator(current, value), 'comparator')
+        elif not any(comparator_predicate(comparator)(current, value) for current in values):
+            raise JsonPatchTestFailed("None of the {0} values at {1} passed the check".format(
+                len(values), self.location))
+        return obj
+
+    def _get_quantifier(self):
+        quantifier = self.operation.get('quantifier', 'all')
+        if quantifier not in ('all', 'any'):
+            raise InvalidJsonPatch("Unknown quantifier {0!r}".format(quantifier))
+        return quantifier
+
+    def _resolve(self, obj):
+        subobj, part = self.pointer.to_last(obj)
+        if part is None:
+            return subobj
+        return self.pointer.walk(subobj, part)
+
+    def _get_value(self):
         try:
-            value = self.operation['value']
+            return self.operation['value']
         except KeyError as ex:
             raise InvalidJsonPatch(
                 "The operation does not contain a 'value' member")
 
-        self._get_comparator()(val, value)
-
-        return obj
-
     def _get_comparator(self):
         if 'cmp' not in self.operation:
             raise InvalidJsonPatch("Operation does not contain 'cmp' member")
@@ -172,22 +296,38 @@ class CheckOperation(PatchOperation):
 
 
 class MutateOperation(PatchOperation):
-    """Check value by specified location using a comparator."""
+    """Check value by specified location using a comparator.
+
+    The 'mut' member may be a list of mutators applied in sequence to the
+    value, each a mutator name, a ``(name, value)`` tuple or a
+    ``('custom', mutator)`` tuple. Steps without a value receive the 'value'
+    member of the operation.
+
+    With a true 'wildcard' member the path may contain wildcards, see
+    :mod:`jsonpatchext.wildcard`.
+    """
+
+    # The mutators by name, shared by every operation, see register_mutator.
+    mutators = MappingProxyType(_MUTATORS)
 
     def __init__(self, operation, pointer_cls=JsonPointer):
         super(MutateOperation, self).__init__(operation, pointer_cls)
 
-        self.mutators = {
-            'uppercase': UppercaseMutator,
-            'lowercase': LowercaseMutator,
-            'cast': CastMutator,
-            'regex': RegExMutator,
-            'slice': SliceMutator,
-            'init': InitMutator,
-            'custom': None,
-        }
+        self._mutator = None
+        self._operand = None
+        self._wildcard = uses_wildcards(self.operation, self.pointer.parts)
+
+    def prepare(self):
+        """Validates the operation and resolves its mutator once, so that
+        :meth:`apply` only does the document work."""
+        self._mutator = self._get_mutator()
+        self._operand = _prepare_operand(self._mutator, self.operation.get('value'))
+        return self
 
     def apply(self, obj):
+        if self._wildcard:
+            return self._apply_wildcard(obj)
+
         subobj, part = self.pointer.to_last(obj)
 
         if part == "-":
@@ -207,75 +347,217 @@ class MutateOperation(PatchOperation):
                 raise JsonPatchConflict("unable to fully resolve json pointer {0}, part {1}".format(self.location, part))
 
         try:
-            if part is not None:
-                subobj[part] = self._apply_mutators(subobj[part] if part in subobj else None)
-            else:
+            if part is None:
                 self._apply_mutators(subobj)
+            elif isinstance(subobj, MutableMapping) and part not in subobj:
+                subobj[part] = self._apply_mutators(None)
+            else:
+                subobj[part] = self._apply_mutators(subobj[part])
         except Exception as e:
             raise_with_traceback(InvalidJsonPatch('Invalid mutation: {}'.format(str(e))))
 
         return obj
 
+    def _apply_wildcard(self, obj):
+        if self.pointer.parts[-1] == "-":
+            raise InvalidJsonPatch("'path' with '-' can't be applied to 'mutation' operation")
+
+        for subobj, part, val in expand(obj, self.pointer.parts):
+            try:
+                subobj[part] = self._apply_mutators(val)
+            except Exception as e:
+                raise_with_traceback(InvalidJsonPatch('Invalid mutation: {}'.format(str(e))))
+        return obj
+
     def _apply_mutators(self, val):
+        if self._mutator is not None:
+            return check_not_awaitable(self._mutator(val, self._operand), 'mutator')
+        value = self.operation['value'] if 'value' in self.operation else None
+        return check_not_awaitable(self._get_mutator()(val, value), 'mutator')
+
+    def _get_mutator(self):
         if 'mut' not in self.operation:
             raise InvalidJsonPatch("Operation does not contain 'mut' member")
 
         mut = self.operation['mut']
 
+        if isinstance(mut, (list, tuple)):
+            return self._get_mutator_chain(mut)
+
         if not isinstance(mut, basestring):
-            raise InvalidJsonPatch("Mutator must be a string")
+            raise InvalidJsonPatch("Mutator must be a string or a list")
 
-        value = self.operation['value'] if 'value' in self.operation else None
+        return self._get_named_mutator(mut)
 
+    def _get_named_mutator(self, mut):
         if mut == 'custom':
             if 'mutator' not in self.operation:
                 raise InvalidJsonPatch("Operation does not contain 'mutator' member")
-            return self.operation['mutator'](val, value)
+            return self.operation['mutator']
 
         if mut not in self.mutators:
             raise InvalidJsonPatch("Unknown mutator {0!r}".format(mut))
 
-        return self.mutators[mut](val, value)
+        return self.mutators[mut]
+
+    def _get_mutator_chain(self, mut):
+        """Builds a :class:`MutatorChain` from a list of mutator names,
+        ``(name, value)`` and ``('custom', mutator)`` steps."""
+        if not mut:
+            raise InvalidJsonPatch("Mutator list is empty")
+
+        steps = []
+        for step in mut:
+            if isinstance(step, basestring):
+                steps.append((self._get_named_mutator(step), MutatorChain.OPERATION_VALUE))
+                continue
+
+            if not isinstance(step, (list, tuple)) or len(step) != 2 or not isinstance(step[0], basestring):
+                raise InvalidJsonPatch("Invalid mutator {0!r}".format(step))
+
+            name, value = step
+            if name == 'custom':
+                if not callable(value):
+                    raise InvalidJsonPatch("Custom mutator {0!r} is not callable".format(value))
+                steps.append((value, MutatorChain.OPERATION_VALUE))
+            else:
+                mutator = self._get_named_mutator(name)
+                steps.append((mutator, _prepare_operand(mutator, value)))
+        return MutatorChain(steps)
+
+
+COMPARATORS_ENTRY_POINT_GROUP = 'jsonpatchext.comparators'
+MUTATORS_ENTRY_POINT_GROUP = 'jsonpatchext.mutators'
+
+
+def register_comparator(name, comparator, replace=False):
+    """Registers a named comparator, usable by the 'check' operations of
+    every patch, including the patches decoded from strings.
+
+    >>> def IsEvenComparator(current, compare):
+    ...     if current % 2:
+    ...         raise JsonPatchTestFailed('{0} is odd'.format(current))
+    >>> comparators = CheckOperation.comparators
+    >>> register_comparator('even', IsEvenComparator)
+    >>> JsonPatchExt([{'op': 'check', 'path': '/a', 'value': None, 'cmp': 'even'}]).check({'a': 2})
+    True
+    >>> CheckOperation.comparators = comparators  # unregistered
+
+    The registry is copied, so the operations being prepared keep seeing the
+    previous one. The patches already prepared, like :class:`PreparedPatch`
+    instances, keep the comparators they were prepared with, and replacing a
+    comparator clears :data:`jsonpatchext.cache.patch_cache`, so patches
+    decoded from strings afterwards use the new one.
+
+    :param name: Name of the comparator, the 'cmp' member of the operations.
+    :type name: str
+
+    :param comparator: Comparator, see :mod:`jsonpatchext.comparators`.
+    :type comparator: callable
+
+    :param replace: Whether to replace a comparator registered with the same name.
+    :type replace: bool
+    """
+    CheckOperation.comparators = _register(CheckOperation.comparators, 'comparator', name, comparator, replace)
+
+
+def register_mutator(name, mutator, replace=False):
+    """Registers a named mutator, usable by the 'mutate' operations of every
+    patch, including the patches decoded from strings.
 
+    :param name: Name of the mutator, the 'mut' member of the operations.
+    :type name: str
 
-def merge_type_conflict(config, path, base, nxt):
-    if len(path) > 0:
-        raise InvalidMerge("Type conflict at '/{}': {}, {}".format(
-            '/'.join(path), type(base), type(nxt)
-        ))
-    raise InvalidMerge("Type conflict: {}, {}".format(
-        type(base), type(nxt)
-    ))
+    :param mutator: Mutator, see :mod:`jsonpatchext.mutators`.
+    :type mutator: callable
 
+    :param replace: Whether to replace a mutator registered with the same name.
+    :type replace: bool
 
-def merge_fallback(config, path, base, nxt):
-    if len(path) > 0:
-        raise InvalidMerge("Merge fallback at '/{}': {}, {}".format(
-            '/'.join(path), type(base), type(nxt)
-        ))
-    raise InvalidMerge("Merge fallback: {}, {}".format(
-        type(base), type(nxt)
-    ))
+    As for :func:`register_comparator`, the patches already prepared keep the
+    previous mutator.
+    """
+    MutateOperation.mutators = _register(MutateOperation.mutators, 'mutator', name, mutator, replace)
 
 
-MergeOperationMerger = Merger(
-    [
-        (list, "append"),
-        (dict, "merge")
-    ],
-    [merge_fallback], [merge_type_conflict]
-)
+def load_plugins():
+    """Registers the comparators and mutators declared by the installed
+    distributions as entry points, named as the comparator or mutator, in the
+    'jsonpatchext.comparators' and 'jsonpatchext.mutators' groups.
+
+    :return: The names of the comparators and of the mutators registered.
+    :rtype: tuple
+    """
+    registered = []
+    for group, register in ((COMPARATORS_ENTRY_POINT_GROUP, register_comparator),
+                            (MUTATORS_ENTRY_POINT_GROUP, register_mutator)):
+        names = []
+        for entry_point in _entry_points(group):
+            register(entry_point.name, entry_point.load())
+            names.append(entry_point.name)
+        registered.append(names)
+    return tuple(registered)
+
+
+def _register(registry, kind, name, function, replace):
+    if not isinstance(name, basestring) or name == 'custom':
+        raise ValueError("Invalid {0} name {1!r}".format(kind, name))
+    if not callable(function):
+        raise ValueError("The {0} {1!r} is not callable".format(kind, name))
+    previous = registry.get(name, function)
+    if not replace and previous is not function:
+        raise ValueError("A {0} named {1!r} is already registered".format(kind, name))
+    # a new mapping, the one being read is never modified
+    registry = dict(registry)
+    registry[name] = function
+    if previous is not function:
+        patch_cache.clear()
+    return MappingProxyType(registry)
+
+
+def _entry_points(group):
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return list(pkg_resources.iter_entry_points(group))
+    found = entry_points()
+    if hasattr(found, 'select'):
+        return list(found.select(group=group))
+    # Python < 3.10
+    return list(found.get(group, []))
+
+
+MergeOperationMerger = Merger(merge_fallback, merge_type_conflict)
 
 
 class MergeOperation(PatchOperation):
-    """Merges an object property or an array element with a new value, using package deepmerge."""
+    """Merges an object property or an array element with a new value, see :class:`jsonpatchext.merge.Merger`.
+
+    With a true 'wildcard' member the path may contain wildcards, see
+    :mod:`jsonpatchext.wildcard`.
+    """
+
+    def __init__(self, operation, pointer_cls=JsonPointer):
+        super(MergeOperation, self).__init__(operation, pointer_cls)
+
+        self._list_strategy = _MISSING
+        self._wildcard = uses_wildcards(self.operation, self.pointer.parts)
+
+    def prepare(self):
+        """Validates the operation once, so that :meth:`apply` only does the document work."""
+        self._get_value()
+        self._list_strategy = self._get_list_strategy()
+        return self
 
     def apply(self, obj):
-        try:
-            value = self.operation["value"]
-        except KeyError as ex:
-            raise InvalidJsonPatch(
-                "The operation does not contain a 'value' member")
+        value = self._get_value()
+
+        if self._wildcard:
+            return self._apply_wildcard(obj, value)
 
         subobj, part = self.pointer.to_last(obj)
 
@@ -304,11 +586,40 @@ class MergeOperation(PatchOperation):
 
         return obj
 
+    def _apply_wildcard(self, obj, value):
+        if self.pointer.parts[-1] == "-":
+            raise InvalidJsonPatch("'path' with '-' can't be applied to 'merge' operation")
+
+        for subobj, part, _ in expand(obj, self.pointer.parts):
+            try:
+                self.apply_merge(subobj, part, value)
+            except InvalidMerge as e:
+                raise_with_traceback(InvalidJsonPatch('Invalid merge at "{}": {}'.format(
+                    self.location, str(e))))
+        return obj
+
     def apply_merge(self, subobj, part, value):
+        list_strategy = self._list_strategy
+        if list_strategy is _MISSING:
+            list_strategy = self._get_list_strategy()
         if part is not None:
-            subobj[part] = MergeOperationMerger.merge(subobj[part], value)
+            subobj[part] = MergeOperationMerger.merge(subobj[part], value, copy_value=True,
+                                                      list_strategy=list_strategy)
         else:
-            MergeOperationMerger.merge(subobj, value)
+            MergeOperationMerger.merge(subobj, value, copy_value=True, list_strategy=list_strategy)
+
+    def _get_value(self):
+        try:
+            return self.operation["value"]
+        except KeyError as ex:
+            raise InvalidJsonPatch(
+                "The operation does not contain a 'value' member")
+
+    def _get_list_strategy(self):
+        list_strategy = self.operation.get('list')
+        if not is_list_strategy(list_strategy):
+            raise InvalidJsonPatch("Unknown list merge strategy {0!r}".format(list_strategy))
+        return list_strategy
 
 
 class JsonPatchExt(JsonPatch):
@@ -348,29 +659,264 @@ class JsonPatchExt(JsonPatch):
         )
     )
 
-    def __init__(self, patch):
-        super(JsonPatchExt, self).__init__(patch)
+    check_operations = MappingProxyType(
+        dict(
+            check=CheckOperation,
+        )
+    )
 
-        self.check_operations = {
-            'check': CheckOperation,
-        }
+    def apply(self, obj, in_place=False, copy_on_write=False, atomic=False, observer=None):
+        """Applies the patch to a given object.
 
-    def check(self, obj):
-        """Checks the object using the patch.
+        :param obj: Document object, or JSON text as bytes or
+                    :class:`jsonpatchext.lazy.RawJson`, only decoded where the
+                    patch goes, see :mod:`jsonpatchext.lazy`. The result is
+                    then encoded the same way.
+        :type obj: dict
+
+        :param in_place: Tweaks the way how patch would be applied - directly to
+                         specified `obj` or to its copy.
+        :type in_place: bool
+
+        :param copy_on_write: While :const:`True` and not `in_place`, instead of
+                              deep copying `obj` only the containers along the
+                              paths modified by the patch are shallow copied.
+                              The result shares every untouched subtree with
+                              `obj`, which is left unmodified.
+        :type copy_on_write: bool
+
+        :param atomic: While :const:`True` and `in_place`, the inverse of each
+                       operation is recorded, and if any operation fails the
+                       applied ones are rolled back before the exception is
+                       raised, leaving `obj` unmodified.
+        :type atomic: bool
+
+        :param observer: Receives the timing of each operation.
+        :type observer: jsonpatchext.instrumentation.PatchObserver
+
+        :return: Modified `obj`.
+        """
+        return _apply_operations(self._ops, obj, in_place, copy_on_write, atomic, observer=observer)
+
+    def apply_async(self, obj, in_place=False):
+        """Applies the patch to a given object, awaiting the custom
+        comparators and mutators which are coroutine functions, see
+        :mod:`jsonpatchext.aio`. Python 3 only.
+
+        :param obj: Document object.
+        :type obj: dict
+
+        :param in_place: Tweaks the way how patch would be applied - directly to
+                         specified `obj` or to its copy.
+        :type in_place: bool
+
+        :return: A coroutine returning the modified `obj`.
+        """
+        from jsonpatchext.aio import apply_async
+        return apply_async([_prepare_operation(operation) for operation in self._ops], obj, in_place)
+
+    def apply_parallel(self, obj, in_place=False, copy_on_write=False, workers=None, executor=None):
+        """Applies the patch to a given object, applying the operations on
+        each top-level member of the object in parallel, see
+        :mod:`jsonpatchext.parallel`. The patch is applied sequentially when
+        its operations can't be partitioned.
+
+        The members modified by the patch are replaced by modified copies,
+        even when `in_place`, and if any operation fails `obj` is left
+        unmodified. The members added by the patch may be in another order than
+        with :meth:`apply`.
+
+        >>> patch = JsonPatchExt([
+        ...     {'op': 'add', 'path': '/foo/bar', 'value': 1},
+        ...     {'op': 'mutate', 'path': '/baz', 'mut': 'uppercase'},
+        ... ])
+        >>> patch.apply_parallel({'foo': {}, 'baz': 'baz'}, workers=2)
+        {'foo': {'bar': 1}, 'baz': 'BAZ'}
 
         :param obj: Document object.
+        :type obj: dict
+
+        :param in_place: Whether to store the modified members in `obj`.
+        :type in_place: bool
+
+        :param copy_on_write: While :const:`True` and not `in_place`, the
+                              members not modified by the patch are shared with
+                              `obj` instead of deep copied.
+        :type copy_on_write: bool
+
+        :param workers: Maximum number of workers, by default the number of CPUs.
+        :type workers: int
+
+        :param executor: A :class:`concurrent.futures.Executor` to apply the
+                         partitions, by default a thread pool on free-threaded
+                         Python builds, otherwise a process pool if the
+                         operations can be pickled.
+
+        :return: Modified `obj`.
+        """
+        from jsonpatchext.parallel import apply_parallel
+        return apply_parallel([_prepare_operation(operation) for operation in self._ops], obj, in_place,
+                              copy_on_write, workers, executor)
+
+    def apply_stream(self, input, output, chunk_size=None):
+        """Applies the patch to a JSON document read from a binary file object,
+        or a :class:`mmap.mmap`, writing the result to a binary file object.
+
+        Only the values the operations apply to are decoded, the rest of the
+        document is copied byte for byte, so a document much bigger than the
+        memory can be patched. See :mod:`jsonpatchext.stream`.
+
+        >>> import io
+        >>> patch = JsonPatchExt([{'op': 'replace', 'path': '/foo/1', 'value': 'baz'}])
+        >>> output = io.BytesIO()
+        >>> patch.apply_stream(io.BytesIO(b'{"foo": [1, 2, 3], "bar": {"a": 1}}'), output)
+        >>> output.getvalue()
+        b'{"foo": [1, "baz", 3], "bar": {"a": 1}}'
+
+        :param input: Binary file object of the UTF-8 encoded document.
+
+        :param output: Binary file object receiving the modified document,
+                       incomplete if an exception is raised.
+
+        :param chunk_size: The number of bytes read at once.
+        :type chunk_size: int
+        """
+        from jsonpatchext.stream import apply_stream, DEFAULT_CHUNK_SIZE
+        apply_stream([_prepare_operation(operation) for operation in self._ops], input, output,
+                     chunk_size or DEFAULT_CHUNK_SIZE)
+
+    def apply_with_inverse(self, obj, in_place=False):
+        """Applies the patch to a given object, also returning the patch which
+        reverts it. The application is atomic, as with ``atomic=True``.
+
+        >>> patch = JsonPatchExt([{'op': 'replace', 'path': '/foo', 'value': 'baz'}])
+        >>> result, inverse = patch.apply_with_inverse({'foo': 'bar'})
+        >>> result, inverse.apply(result)
+        ({'foo': 'baz'}, {'foo': 'bar'})
+
+        :param obj: Document object.
+        :type obj: dict
+
+        :param in_place: Tweaks the way how patch would be applied - directly to
+                         specified `obj` or to its copy.
+        :type in_place: bool
+
+        :return: The modified `obj`, and the inverse patch.
+        :rtype: tuple
+        """
+        if not in_place:
+            obj = copy.deepcopy(obj)
+        log = _UndoLog()
+        obj = log.apply(self._ops, obj)
+        return obj, log.inverse_patch()
+
+    def check(self, obj, observer=None):
+        """Checks the object using the patch.
+
+        >>> from jsonpatchext.lazy import RawJson
+        >>> patch = JsonPatchExt([{'op': 'check', 'path': '/foo/bar', 'value': 1, 'cmp': 'equals'}])
+        >>> patch.check(RawJson('{"foo": {"bar": 1}, "baz": [1, 2, 3]}'))
+        True
+
+        :param obj: Document object, or JSON text as bytes or
+                    :class:`jsonpatchext.lazy.RawJson`, only decoded where the
+                    checks go.
         :type obj: Mapping
 
+        :param observer: Receives the timing of each check.
+        :type observer: jsonpatchext.instrumentation.PatchObserver
+
         :return: whether the check succedded
         :rtype: bool
         """
-        for operation in self._check_ops:
-            try:
-                operation.apply(obj)
-            except JsonPatchTestFailed:
-                return False
+        return _check(self._check_ops, obj, observer)
+
+    def check_async(self, obj):
+        """Checks the object using the patch, awaiting the custom comparators
+        which are coroutine functions, see :mod:`jsonpatchext.aio`. Python 3 only.
+
+        :param obj: Document object.
+        :type obj: Mapping
+
+        :return: A coroutine returning whether the check succeeded.
+        """
+        from jsonpatchext.aio import check_async
+        return check_async([_prepare_operation(operation) for operation in self._check_ops], obj)
+
+    def check_failures(self, obj):
+        """Checks the object using the patch, returning every failed check.
+
+        >>> patch = JsonPatchExt([
+        ...     {'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'equals'},
+        ...     {'op': 'check', 'path': '/baz', 'value': 1, 'cmp': 'equals'},
+        ... ])
+        >>> [failure.message for failure in patch.check_failures({'foo': 'qux', 'baz': 1})]
+        ["qux (<class 'str'>) is not equal to value bar (<class 'str'>)"]
+
+        :param obj: Document object.
+        :type obj: Mapping
+
+        :return: The failed checks, in patch order.
+        :rtype: list of CheckFailure
+        """
+        return _check_failures(self._check_ops, obj)
 
-        return True
+    def check_many(self, docs):
+        """Checks many documents using the patch, see :func:`jsonpatchext.batch.check_many`."""
+        from jsonpatchext.batch import check_many
+        return check_many(self, docs)
+
+    def evaluate_many(self, docs):
+        """Evaluates every check of the patch on many documents, see
+        :func:`jsonpatchext.batch.evaluate_many`."""
+        from jsonpatchext.batch import evaluate_many
+        return evaluate_many(self, docs)
+
+    def compile(self, engine='prepared'):
+        """Builds and validates every operation of the patch once.
+
+        With ``engine='codegen'`` the patch is further compiled into a
+        specialized Python function, see :class:`jsonpatchext.codegen.GeneratedPatch`.
+
+        >>> prepared = JsonPatchExt([
+        ...     {'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'equals'},
+        ...     {'op': 'mutate', 'path': '/foo', 'mut': 'uppercase'},
+        ... ]).compile()
+        >>> prepared.apply({'foo': 'bar'})
+        {'foo': 'BAR'}
+
+        :param engine: Either 'prepared' or 'codegen'.
+        :type engine: str
+
+        :return: An immutable prepared patch, which can be cached and shared.
+        :rtype: PreparedPatch or GeneratedPatch
+        """
+        if engine == 'prepared':
+            return PreparedPatch(self)
+        if engine == 'codegen':
+            from jsonpatchext.codegen import compile_patch
+            return compile_patch(PreparedPatch(self))
+        raise ValueError("Unknown engine {0!r}".format(engine))
+
+    def optimize(self):
+        """Returns an equivalent patch with redundant operations fused or
+        removed, see :func:`jsonpatchext.optimizer.optimize`.
+
+        >>> JsonPatchExt([
+        ...     {'op': 'add', 'path': '/foo', 'value': {'bar': 'bar'}},
+        ...     {'op': 'merge', 'path': '/foo', 'value': {'baz': 'baz'}},
+        ...     {'op': 'mutate', 'path': '/qux', 'mut': 'lowercase'},
+        ...     {'op': 'mutate', 'path': '/qux', 'mut': 'uppercase'},
+        ... ]).optimize().patch == [
+        ...     {'op': 'add', 'path': '/foo', 'value': {'bar': 'bar', 'baz': 'baz'}},
+        ...     {'op': 'mutate', 'path': '/qux', 'mut': [('lowercase', None), ('uppercase', None)]},
+        ... ]
+        True
+
+        :rtype: JsonPatchExt
+        """
+        from jsonpatchext.optimizer import optimize
+        return self.__class__(optimize(self), pointer_cls=self.pointer_cls)
 
     @property
     def _check_ops(self):
@@ -389,6 +935,684 @@ class JsonPatchExt(JsonPatch):
             raise InvalidJsonPatch("Unknown operation {0!r}".format(op))
 
         cls = self.check_operations[op]
-        return cls(operation)
+        return cls(operation, pointer_cls=self.pointer_cls)
+
+
+class PreparedPatch(object):
+    """A :class:`JsonPatchExt` with its operations built and validated once.
+
+    :meth:`JsonPatchExt.apply` and :meth:`JsonPatchExt.check` instantiate every
+    operation (parsing its pointer and resolving its comparator or mutator) on
+    each call. A prepared patch does it only once, and is immutable so it can
+    be cached and shared between threads.
+    """
+
+    __slots__ = ('_ops', '_check_ops', '_check_error', '_plan')
+
+    def __init__(self, patch):
+        ops = tuple(_prepare_operation(operation) for operation in patch._ops)
+
+        check_ops, check_error = [], None
+        for operation, instance in zip(patch.patch, ops):
+            if operation['op'] not in patch.check_operations:
+                check_error = "Unknown operation {0!r}".format(operation['op'])
+                break
+            check_ops.append(instance)
+
+        object.__setattr__(self, '_ops', ops)
+        object.__setattr__(self, '_check_ops', tuple(check_ops))
+        object.__setattr__(self, '_check_error', check_error)
+        object.__setattr__(self, '_plan', hoisting_plan(ops))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PreparedPatch is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("PreparedPatch is immutable")
+
+    def __len__(self):
+        return len(self._ops)
+
+    def __iter__(self):
+        return (operation.operation for operation in self._ops)
+
+    def apply(self, obj, in_place=False, copy_on_write=False, atomic=False, observer=None):
+        """Applies the patch to a given object.
+
+        :param obj: Document object, or JSON text as bytes or
+                    :class:`jsonpatchext.lazy.RawJson`, only decoded where the
+                    patch goes, see :mod:`jsonpatchext.lazy`. The result is
+                    then encoded the same way.
+        :type obj: dict
+
+        :param in_place: Tweaks the way how patch would be applied - directly to
+                         specified `obj` or to its copy.
+        :type in_place: bool
+
+        :param copy_on_write: While :const:`True` and not `in_place`, instead of
+                              deep copying `obj` only the containers along the
+                              paths modified by the patch are shallow copied.
+                              The result shares every untouched subtree with
+                              `obj`, which is left unmodified.
+        :type copy_on_write: bool
+
+        :param atomic: While :const:`True` and `in_place`, the inverse of each
+                       operation is recorded, and if any operation fails the
+                       applied ones are rolled back before the exception is
+                       raised, leaving `obj` unmodified.
+        :type atomic: bool
+
+        :param observer: Receives the timing of each operation.
+        :type observer: jsonpatchext.instrumentation.PatchObserver
+
+        :return: Modified `obj`.
+        """
+        return _apply_operations(self._ops, obj, in_place, copy_on_write, atomic, self._plan, observer)
+
+    def apply_async(self, obj, in_place=False):
+        """Applies the patch to a given object, see :meth:`JsonPatchExt.apply_async`."""
+        from jsonpatchext.aio import apply_async
+        return apply_async(self._ops, obj, in_place)
+
+    def apply_parallel(self, obj, in_place=False, copy_on_write=False, workers=None, executor=None):
+        """Applies the patch to a given object in parallel, see :meth:`JsonPatchExt.apply_parallel`."""
+        from jsonpatchext.parallel import apply_parallel
+        return apply_parallel(self._ops, obj, in_place, copy_on_write, workers, executor)
+
+    def apply_stream(self, input, output, chunk_size=None):
+        """Applies the patch to a streamed JSON document, see :meth:`JsonPatchExt.apply_stream`."""
+        from jsonpatchext.stream import apply_stream, DEFAULT_CHUNK_SIZE
+        apply_stream(self._ops, input, output, chunk_size or DEFAULT_CHUNK_SIZE)
+
+    def apply_with_inverse(self, obj, in_place=False):
+        """Applies the patch to a given object, also returning the patch which
+        reverts it. The application is atomic, as with ``atomic=True``.
+
+        >>> patch = JsonPatchExt([{'op': 'replace', 'path': '/foo', 'value': 'baz'}])
+        >>> result, inverse = patch.apply_with_inverse({'foo': 'bar'})
+        >>> result, inverse.apply(result)
+        ({'foo': 'baz'}, {'foo': 'bar'})
+
+        :param obj: Document object.
+        :type obj: dict
+
+        :param in_place: Tweaks the way how patch would be applied - directly to
+                         specified `obj` or to its copy.
+        :type in_place: bool
+
+        :return: The modified `obj`, and the inverse patch.
+        :rtype: tuple
+        """
+        if not in_place:
+            obj = copy.deepcopy(obj)
+        log = _UndoLog()
+        obj = log.apply(self._ops, obj)
+        return obj, log.inverse_patch()
+
+    def check(self, obj, observer=None):
+        """Checks the object using the patch.
+
+        :param obj: Document object, or JSON text as bytes or
+                    :class:`jsonpatchext.lazy.RawJson`, only decoded where the
+                    checks go.
+        :type obj: Mapping
+
+        :param observer: Receives the timing of each check.
+        :type observer: jsonpatchext.instrumentation.PatchObserver
+
+        :return: whether the check succedded
+        :rtype: bool
+        """
+        if self._check_error is not None:
+            raise InvalidJsonPatch(self._check_error)
+        return _check(self._check_ops, obj, observer)
+
+    def check_async(self, obj):
+        """Checks the object using the patch, see :meth:`JsonPatchExt.check_async`."""
+        if self._check_error is not None:
+            raise InvalidJsonPatch(self._check_error)
+        from jsonpatchext.aio import check_async
+        return check_async(self._check_ops, obj)
+
+    def check_failures(self, obj):
+        """Checks the object using the patch, returning every failed check.
+
+        :param obj: Document object.
+        :type obj: Mapping
+
+        :return: The failed checks, in patch order.
+        :rtype: list of CheckFailure
+        """
+        if self._check_error is not None:
+            raise InvalidJsonPatch(self._check_error)
+        return _check_failures(self._check_ops, obj)
+
+    def check_many(self, docs):
+        """Checks many documents using the patch, see :func:`jsonpatchext.batch.check_many`."""
+        from jsonpatchext.batch import check_many
+        return check_many(self, docs)
+
+    def evaluate_many(self, docs):
+        """Evaluates every check of the patch on many documents, see
+        :func:`jsonpatchext.batch.evaluate_many`."""
+        from jsonpatchext.batch import evaluate_many
+        return evaluate_many(self, docs)
+
+
+class CheckFailure(object):
+    """A failed 'check' operation.
+
+    Checking only evaluates the comparators predicates, the failure message
+    is built from the document when :attr:`message` is first read, so the
+    document should not be modified before that.
+    """
+
+    __slots__ = ('index', '_check', '_obj', '_message')
+
+    def __init__(self, index, check, obj):
+        self.index = index
+        self._check = check
+        self._obj = obj
+        self._message = None
+
+    def __repr__(self):
+        return '<CheckFailure {0} {1!r}>'.format(self.index, self.operation)
+
+    @property
+    def operation(self):
+        """The failed operation."""
+        return self._check.operation
+
+    @property
+    def message(self):
+        """The message of the JsonPatchTestFailed the check raises."""
+        if self._message is None:
+            try:
+                self._check.apply(self._obj)
+            except JsonPatchTestFailed as ex:
+                self._message = str(ex)
+            else:
+                # a custom comparator disagreeing with its predicate
+                self._message = ''
+        return self._message
+
+
+def _check(operations, obj, observer=None):
+    if observer is not None:
+        from jsonpatchext.instrumentation import observe_operations, observe_patch
+        return observe_patch('check', observer, _check, observe_operations(operations, observer), obj)
+    if is_raw(obj):
+        obj = _lazy_loads(obj, operations)
+
+    for operation in operations:
+        if not operation.test(obj):
+            return False
+    return True
+
+
+def _check_failures(operations, obj):
+    if is_raw(obj):
+        obj = _lazy_loads(obj, operations)
+    return [CheckFailure(index, operation, obj)
+            for index, operation in enumerate(operations) if not operation.test(obj)]
+
+
+def _apply_operations(operations, obj, in_place, copy_on_write, atomic, plan=None, observer=None):
+    if observer is not None:
+        from jsonpatchext.instrumentation import observe_operations, observe_patch
+        return observe_patch('apply', observer, _apply_operations, observe_operations(operations, observer),
+                             obj, in_place, copy_on_write, atomic)
+    if is_raw(obj):
+        # the decoded parts of the document are not shared with it
+        result = _lazy_dumps(_apply_operations(operations, _lazy_loads(obj, operations), True, False, False))
+        return RawJson(result) if isinstance(obj, RawJson) else result
+
+    if in_place:
+        if atomic:
+            return _UndoLog().apply(operations, obj)
+    else:
+        operations = _apply_hoisted(operations, obj, plan)
+        if copy_on_write:
+            return _CopyOnWrite().apply(operations, obj)
+        obj = copy.deepcopy(obj)
+
+    for operation in operations:
+        obj = operation.apply(obj)
+
+    return obj
+
+
+def _apply_hoisted(operations, obj, plan):
+    """Evaluates the checks which can't be affected by previous operations,
+    so that rejected documents are never copied, and returns the other
+    operations."""
+    hoisted, remaining = plan if plan is not None else hoisting_plan(operations)
+    if not hoisted:
+        return operations
+    for index in hoisted:
+        try:
+            operations[index].apply(obj)
+        except Exception:
+            # Sequential application would have raised the exception of any
+            # failing previous operation first.
+            _raise_first_failure(operations[:index], obj)
+            raise
+    return remaining
+
+
+def _raise_first_failure(operations, obj):
+    """Applies the operations to a copy-on-write view of the document, so that
+    the exception of the first failing one is raised."""
+    _CopyOnWrite().apply(operations, obj)
+
+
+# Mutators which return a new value instead of modifying the current one.
+# InitMutator returns the current value when it is not None, which later
+# operations may modify.
+_PURE_MUTATORS = frozenset([UppercaseMutator, LowercaseMutator, RegExMutator, SliceMutator])
+
+
+def _is_pure_mutator(mutator):
+    if isinstance(mutator, MutatorChain):
+        return all(_is_pure_mutator(step) for step, _ in mutator.steps)
+    return mutator in _PURE_MUTATORS
+
+
+class _CopyOnWrite(object):
+    """Applies operations sharing every untouched subtree with the document.
+
+    Before each operation, the containers it writes to are replaced by shallow
+    copies, unless they were already copied by a previous operation.
+    """
+
+    def __init__(self):
+        self._private = set()
+
+    def apply(self, operations, obj):
+        for operation in operations:
+            obj = self._prepare(operation, obj)
+            obj = operation.apply(obj)
+        return obj
+
+    def _prepare(self, operation, obj):
+        """Copies the containers written by the operation, returns the new root."""
+        if isinstance(operation, (CheckOperation, TestOperation)):
+            return obj
+
+        parts = operation.pointer.parts
+
+        if isinstance(operation, MoveOperation):
+            from_parts = from_pointer(operation).parts
+            obj = self._unshare(obj, from_parts[:-1])
+            for target_parts in _move_target_parents(obj, from_parts, parts):
+                obj = self._unshare(obj, target_parts)
+            return obj
+
+        if isinstance(operation, (MergeOperation, MutateOperation)) and operation._wildcard:
+            # the values matched by the wildcards are modified in place
+            return self._copy_target(obj, static_prefix(parts))
+
+        if isinstance(operation, MergeOperation):
+            if isinstance(operation.operation.get('list'), dict):
+                # keyed list merges modify the items of the lists in place
+                return self._copy_target(obj, parts)
+            obj = self._unshare(obj, parts)
+            target = _resolve_existing(obj, parts)
+            if isinstance(target, MutableMapping) and isinstance(operation.operation.get('value'), Mapping):
+                self._unshare_merge(target, operation.operation['value'])
+            return obj
+
+        if isinstance(operation, MutateOperation):
+            try:
+                pure = _is_pure_mutator(operation._get_mutator())
+            except InvalidJsonPatch:
+                pure = False
+            if pure:
+                return self._unshare(obj, parts[:-1])
+            # the mutator may modify the current value in place
+            return self._copy_target(obj, parts)
+
+        if isinstance(operation, (AddOperation, RemoveOperation, ReplaceOperation, CopyOperation)):
+            return self._unshare(obj, parts[:-1])
+
+        # unknown operation, can't tell what it modifies
+        obj = copy.deepcopy(obj)
+        self._private.clear()
+        return obj
+
+    def _copy_target(self, obj, parts):
+        """Deep copies the value at `parts`, for operations modifying it in place."""
+        if not parts:
+            return copy.deepcopy(obj)
+        obj = self._unshare(obj, parts[:-1])
+        parent = _resolve_existing(obj, parts[:-1])
+        key = _existing_key(parent, parts[-1])
+        if key is not _MISSING:
+            parent[key] = copy.deepcopy(parent[key])
+        return obj
+
+    def _own(self, container):
+        if id(container) in self._private:
+            return container
+        container = copy.copy(container)
+        self._private.add(id(container))
+        return container
+
+    def _unshare(self, obj, parts):
+        """Makes the root and every existing container along `parts` private."""
+        if not isinstance(obj, (MutableMapping, MutableSequence)):
+            return obj
+
+        obj = current = self._own(obj)
+        for part in parts:
+            key = _existing_key(current, part)
+            if key is _MISSING:
+                break
+            child = current[key]
+            if not isinstance(child, (MutableMapping, MutableSequence)):
+                break
+            owned = self._own(child)
+            if owned is not child:
+                current[key] = owned
+            current = owned
+        return obj
+
+    def _unshare_merge(self, base, value):
+        """Makes private the dicts a merge of `value` into `base` will recurse into."""
+        for key, item in value.items():
+            if isinstance(item, Mapping) and key in base and isinstance(base[key], MutableMapping):
+                base[key] = owned = self._own(base[key])
+                self._unshare_merge(owned, item)
+
+
+class _UndoLog(object):
+    """Applies operations in place recording their inverse operations, so that
+    they can be rolled back on failure or returned as an inverse patch.
+
+    Only the values replaced or removed by the operations are kept, except for
+    'merge' and impure 'mutate' operations, which modify the value in place and
+    so keep a copy of it.
+    """
+
+    def __init__(self):
+        # (inverse operation, original value restored in place or None)
+        self.entries = []
+
+    def apply(self, operations, obj):
+        for operation in operations:
+            pending = self._record(operation, obj)
+            try:
+                result = operation.apply(obj)
+            except Exception:
+                obj = self._rollback_failed(operation, pending, obj)
+                self.rollback(obj)
+                raise
+            if isinstance(operation, MoveOperation):
+                pending = self._record_move(operation, pending, result)
+            self.entries.extend(pending)
+            obj = result
+        return obj
+
+    def inverse_patch(self):
+        return JsonPatchExt([inverse for inverse, _ in reversed(self.entries)])
+
+    def rollback(self, obj):
+        """Reverts every recorded operation, returns the original root."""
+        for inverse, original in reversed(self.entries):
+            obj = _apply_inverse(inverse, original, obj)
+        del self.entries[:]
+        return obj
+
+    def _rollback_failed(self, operation, pending, obj):
+        """Reverts whatever a failed operation may have done before raising."""
+        if isinstance(operation, MoveOperation):
+            if pending:
+                from_ptr, value, _, _, size = pending
+                # the source was removed when its container shrank, the values
+                # of the siblings may be the same object
+                if len(_resolve_existing(obj, from_ptr.parts[:-1])) < size:
+                    obj = _add_value(obj, from_ptr, value)
+            return obj
+
+        # Other operations fail before modifying the document, but 'merge' and
+        # 'mutate' may have partially modified the snapshotted value.
+        for inverse, original in reversed(pending):
+            if original is not None:
+                obj = _apply_inverse(inverse, original, obj)
+        return obj
+
+    def _record(self, operation, obj):
+        """Returns the inverse of the operation, computed before applying it."""
+        if isinstance(operation, (CheckOperation, TestOperation)):
+            return []
+
+        parts = operation.pointer.parts
+        path = operation.location
+
+        if isinstance(operation, MoveOperation):
+            try:
+                from_ptr = from_pointer(operation)
+            except InvalidJsonPatch:
+                return []
+            if not from_ptr.parts:
+                return []
+            parent = _resolve_existing(obj, from_ptr.parts[:-1])
+            key = _existing_key(parent, from_ptr.parts[-1])
+            if key is _MISSING:
+                return []
+            if len(parts) < len(from_ptr.parts) and list(parts) == from_ptr.parts[:len(parts)]:
+                # moved into an ancestor, which is replaced, or shifted when in an array
+                inserted = bool(parts) and isinstance(_resolve_existing(obj, parts[:-1]), MutableSequence)
+                ancestor = _MISSING if inserted else _resolve_existing(obj, parts)
+                return from_ptr, parent[key], _MISSING, ancestor, len(parent)
+            # the value the move will overwrite, if any
+            target = _resolve_existing(obj, _move_target_parents(obj, from_ptr.parts, parts)[-1])
+            target_key = _existing_key(target, parts[-1]) if isinstance(target, MutableMapping) else _MISSING
+            overwritten = _MISSING if target_key is _MISSING else target[target_key]
+            return from_ptr, parent[key], overwritten, None, len(parent)
+
+        if isinstance(operation, (MergeOperation, MutateOperation)) and operation._wildcard:
+            # snapshot the subtree holding the values matched by the wildcards
+            parts = static_prefix(parts)
+            if parts:
+                parent = _resolve_existing(obj, parts[:-1])
+                key = _existing_key(parent, parts[-1])
+                if key is _MISSING:
+                    return []
+                path = JsonPointer.from_parts(parts).path
+                return [({'op': 'replace', 'path': path, 'value': copy.deepcopy(parent[key])}, parent[key])]
+
+        if not parts:
+            if isinstance(operation, (MergeOperation, MutateOperation)):
+                # these modify the root in place
+                return [({'op': 'replace', 'path': '', 'value': copy.deepcopy(obj)}, obj)]
+            if isinstance(operation, (AddOperation, ReplaceOperation, CopyOperation)):
+                return [({'op': 'replace', 'path': '', 'value': obj}, None)]
+            return []
+
+        parent = _resolve_existing(obj, parts[:-1])
+        key = _existing_key(parent, parts[-1])
+
+        if isinstance(operation, RemoveOperation):
+            if key is _MISSING:
+                return []
+            return [({'op': 'add', 'path': path, 'value': parent[key]}, None)]
+
+        if isinstance(operation, (AddOperation, CopyOperation)):
+            if isinstance(parent, MutableSequence):
+                if parts[-1] == '-':
+                    path = '{0}/{1}'.format(operation.pointer.path.rsplit('/', 1)[0], len(parent))
+                return [({'op': 'remove', 'path': path}, None)]
+            if key is _MISSING:
+                return [({'op': 'remove', 'path': path}, None)]
+            return [({'op': 'replace', 'path': path, 'value': parent[key]}, None)]
+
+        if isinstance(operation, ReplaceOperation):
+            if key is _MISSING:
+                return []
+            return [({'op': 'replace', 'path': path, 'value': parent[key]}, None)]
+
+        if isinstance(operation, MutateOperation):
+            if key is _MISSING:
+                return [({'op': 'remove', 'path': path}, None)]
+            try:
+                pure = _is_pure_mutator(operation._get_mutator())
+            except InvalidJsonPatch:
+                pure = False
+            if pure:
+                return [({'op': 'replace', 'path': path, 'value': parent[key]}, None)]
+            return [({'op': 'replace', 'path': path, 'value': copy.deepcopy(parent[key])}, parent[key])]
+
+        if isinstance(operation, MergeOperation):
+            if key is _MISSING:
+                return []
+            return [({'op': 'replace', 'path': path, 'value': copy.deepcopy(parent[key])}, parent[key])]
+
+        # unknown operation, can't tell what it modifies
+        return [({'op': 'replace', 'path': '', 'value': copy.deepcopy(obj)}, obj)]
+
+    def _record_move(self, operation, pending, obj):
+        if not pending:
+            return []
+        from_ptr, value, overwritten, ancestor = pending[:4]
+        if operation.pointer == from_ptr:
+            return []
+        path = operation.location
+        if ancestor is not None:
+            # moving back would move the ancestor into its own child
+            if ancestor is _MISSING:
+                restore = ({'op': 'remove', 'path': path}, None)
+            else:
+                restore = ({'op': 'replace', 'path': path, 'value': ancestor}, None)
+            return [({'op': 'add', 'path': from_ptr.path, 'value': value}, None), restore]
+        if operation.pointer.parts[-1] == '-':
+            parent = _resolve_existing(obj, operation.pointer.parts[:-1])
+            if isinstance(parent, MutableSequence):
+                path = '{0}/{1}'.format(path.rsplit('/', 1)[0], len(parent) - 1)
+        entries = []
+        if overwritten is not _MISSING:
+            entries.append(({'op': 'add', 'path': path, 'value': overwritten}, None))
+        entries.append(({'op': 'move', 'from': path, 'path': from_ptr.path}, None))
+        return entries
+
+
+def _restore(original, snapshot):
+    if isinstance(original, MutableMapping) and isinstance(snapshot, Mapping):
+        original.clear()
+        original.update(snapshot)
+        return original
+    if isinstance(original, MutableSequence) and isinstance(snapshot, list):
+        original[:] = snapshot
+        return original
+    return snapshot
+
+
+def _apply_inverse(inverse, original, obj):
+    """Applies an inverse operation. When `original` is not None, the operation
+    is a 'replace' whose value is a snapshot of `original`, which is restored
+    in place and put back at the path."""
+    op, pointer = inverse['op'], JsonPointer(inverse['path'])
+
+    if op == 'replace':
+        value = inverse['value']
+        if original is not None:
+            value = _restore(original, value)
+        if not pointer.parts:
+            return value
+        subobj, part = pointer.to_last(obj)
+        if isinstance(subobj, MutableMapping) and part not in subobj:
+            raise JsonPatchConflict("can't replace a non-existent object '{0}'".format(part))
+        subobj[part] = value
+        return obj
+
+    if op == 'add':
+        return _add_value(obj, pointer, inverse['value'])
+
+    return JsonPatchExt.operations[op](inverse).apply(obj)
+
+
+_MISSING = object()
+
+
+def _existing_key(container, part):
+    """Returns the key or index of an existing item of the container, or _MISSING."""
+    if isinstance(container, MutableMapping):
+        return part if part in container else _MISSING
+    if isinstance(container, MutableSequence):
+        if part.isdigit() and int(part) < len(container):
+            return int(part)
+    return _MISSING
+
+
+def _add_value(obj, pointer, value):
+    """Adds the value at the pointer as the 'add' operation, without copying
+    it, returns the new root."""
+    subobj, part = pointer.to_last(obj)
+    if part is None:
+        return value
+
+    if isinstance(subobj, MutableSequence):
+        if part == '-':
+            subobj.append(value)
+        elif part > len(subobj) or part < 0:
+            raise JsonPatchConflict("can't insert outside of list")
+        else:
+            subobj.insert(part, value)
+    elif isinstance(subobj, MutableMapping):
+        subobj[part] = value
+    else:
+        raise JsonPatchConflict("unable to fully resolve json pointer {0}, part {1}".format(pointer.path, part))
+    return obj
+
+
+def _resolve_existing(obj, parts):
+    for part in parts:
+        key = _existing_key(obj, part)
+        if key is _MISSING:
+            return None
+        obj = obj[key]
+    return obj
+
+
+def _move_target_parents(obj, from_parts, to_parts):
+    """Returns the parts of the containers a move will add to.
+
+    The move removes the value before adding it, so when both paths go through
+    the same array, the target index is shifted with respect to `obj`.
+    """
+    target = to_parts[:-1]
+    depth = len(from_parts) - 1
+    if depth < 0 or len(target) <= depth or target[:depth] != from_parts[:depth]:
+        return [target]
+
+    if not isinstance(_resolve_existing(obj, from_parts[:-1]), MutableSequence) or \
+            not target[depth].isdigit() or not from_parts[depth].isdigit():
+        return [target]
+
+    if int(target[depth]) < int(from_parts[depth]):
+        return [target]
+    shifted = list(target)
+    shifted[depth] = str(int(target[depth]) + 1)
+    return [target, shifted]
+
+
+def _prepare_operand(function, value):
+    """Preprocesses the value of a comparator or mutator having an 'operand'
+    attribute. An invalid value is left as is, so it fails when the operation
+    is applied, as when not prepared."""
+    operand = getattr(function, 'operand', None)
+    if operand is None:
+        return value
+    try:
+        return operand(value)
+    except Exception:
+        return value
+
+
+def _prepare_operation(operation):
+    prepare = getattr(operation, 'prepare', None)
+    if prepare is not None:
+        return prepare()
+    return operation
 
 
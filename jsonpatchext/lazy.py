@@ -0,0 +1,310 @@
+""" Lazy decoding of JSON documents given as text
+
+A document passed as UTF-8 bytes, or wrapped in :class:`RawJson`, is only
+decoded where the operations of a patch go: the containers along their
+paths are decoded one level deep, into dicts and lists whose other members
+stay undecoded :class:`RawJson` slices of the document, and the values the
+operations read are decoded. The untouched slices are written back byte for
+byte, so checking or patching a few members of a large document costs about
+the size of those members, plus a scan of the containers along their paths.
+
+The slices which are not decoded are only checked to be balanced, an invalid
+document may not raise an error.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import re
+import sys
+
+from jsonpatchext.analysis import operation_parts, from_pointer
+
+text_type = type('')
+
+# The operations reading the value at their path, and at their 'from' path.
+_READ_PATH = frozenset(['check', 'test', 'mutate', 'merge'])
+_READ_FROM = frozenset(['move', 'copy'])
+# The operations which may shift the elements of an array.
+_SHIFTING = frozenset(['add', 'remove', 'move', 'copy'])
+
+_DECODE = object()
+_MISSING = object()
+
+_WHITESPACE = re.compile(br'[ \t\n\r]*')
+_STRING = re.compile(br'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_CONTAINER_CHARS = re.compile(br'[^"\[\]{}]*')
+_SCALAR_CHARS = re.compile(br'[^,\]}\s]*')
+
+
+class RawJson(object):
+    """An undecoded JSON value, a slice of UTF-8 encoded JSON text.
+
+    A document wrapped in it is decoded lazily by :meth:`JsonPatchExt.apply`
+    and :meth:`JsonPatchExt.check`, and the result of :meth:`JsonPatchExt.apply`
+    is also a :class:`RawJson`.
+
+    >>> RawJson('{"a": [1, 2]}').decode()
+    {'a': [1, 2]}
+
+    :param data: JSON text, as str or UTF-8 bytes.
+    """
+
+    __slots__ = ('data', 'start', 'end')
+
+    def __init__(self, data, start=0, end=None):
+        if isinstance(data, text_type):
+            data = data.encode('utf-8')
+        self.data = data
+        self.start = start
+        self.end = len(data) if end is None else end
+
+    @property
+    def raw(self):
+        """The JSON text, as UTF-8 bytes."""
+        return bytes(self.data[self.start:self.end])
+
+    def decode(self):
+        """Returns the decoded value."""
+        return json.loads(self.raw.decode('utf-8'))
+
+    def __eq__(self, other):
+        if isinstance(other, RawJson):
+            other = other.decode()
+        return self.decode() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # immutable
+        return self
+
+    def __repr__(self):
+        raw = self.raw
+        return 'RawJson({0!r})'.format(raw if len(raw) <= 40 else raw[:37] + b'...')
+
+
+def is_raw(obj):
+    """Returns whether a document is JSON text to decode lazily."""
+    return isinstance(obj, (RawJson, bytearray)) or (sys.version_info >= (3, 0) and isinstance(obj, bytes))
+
+
+def loads(obj, operations):
+    """Decodes a document where the operations go.
+
+    :param obj: JSON document as bytes or :class:`RawJson`.
+
+    :param operations: Operation objects.
+    :type operations: Sequence
+
+    :return: The document, with :class:`RawJson` values where it was not decoded.
+    """
+    if not isinstance(obj, RawJson):
+        obj = RawJson(obj)
+    start = _skip_whitespace(obj.data, obj.start)
+    end = _skip_value(obj.data, start)
+    if _skip_whitespace(obj.data, end) != obj.end:
+        raise ValueError('Extra data at offset {0}'.format(end))
+    plan, shifting = _plan(operations)
+    return _decode(obj.data, start, end, plan, shifting)
+
+
+def dumps(value):
+    """Encodes a document, writing its :class:`RawJson` values as they are.
+
+    :rtype: bytes
+    """
+    chunks = []
+    _dump(value, chunks)
+    return b''.join(chunks)
+
+
+def _plan(operations):
+    """Returns the tree of the paths to decode: a node is the dict of the
+    nodes of the members to decode, or _DECODE to decode the whole value.
+    Also returns whether the operations may shift array elements, then an
+    element can't be told by its index in the document."""
+    root, shifting = {}, False
+    for operation in operations:
+        name = operation.operation.get('op')
+        parts = tuple(operation_parts(operation))
+        root = _add(root, parts, name in _READ_PATH)
+        if name in _SHIFTING and parts and _is_index(parts[-1]):
+            shifting = True
+        if name in _READ_FROM:
+            try:
+                from_parts = from_pointer(operation).parts
+            except Exception:
+                # invalid, the operation will fail when applied
+                continue
+            # decoded, as it may be read at its new path
+            root = _add(root, tuple(from_parts), True)
+            if name == 'move' and from_parts and _is_index(from_parts[-1]):
+                shifting = True
+    return root, shifting
+
+
+def _is_index(part):
+    return part == '-' or part.isdigit()
+
+
+def _merge(node, other):
+    if node is _DECODE or other is _DECODE:
+        return _DECODE
+    merged = dict(node)
+    for key, child in other.items():
+        merged[key] = _merge(merged[key], child) if key in merged else child
+    return merged
+
+
+def _add(node, parts, read):
+    """Adds a path to a node, to decode the value when it is read, otherwise
+    only its container, like for the value removed or replaced."""
+    if node is _DECODE:
+        return node
+    if len(parts) <= (0 if read else 1):
+        return _DECODE if read else node
+    node[parts[0]] = _add(node.get(parts[0], {}), parts[1:], read)
+    return node
+
+
+def _decode(data, start, end, node, shifting):
+    if node is _DECODE:
+        return json.loads(bytes(data[start:end]).decode('utf-8'))
+    first = data[start:start + 1]
+    if first == b'{':
+        value = {}
+        for key, value_start, value_end in _members(data, start):
+            child = node.get(key, _MISSING)
+            value[key] = RawJson(data, value_start, value_end) if child is _MISSING else \
+                _decode(data, value_start, value_end, child, shifting)
+        return value
+    if first == b'[':
+        value = []
+        if shifting and node:
+            # any element may be at the indexes of the paths
+            merged = {}
+            for child in node.values():
+                merged = _merge(merged, child)
+            for value_start, value_end in _elements(data, start):
+                value.append(_decode(data, value_start, value_end, merged, shifting))
+            return value
+        for index, (value_start, value_end) in enumerate(_elements(data, start)):
+            child = node.get('{0}'.format(index), _MISSING)
+            value.append(RawJson(data, value_start, value_end) if child is _MISSING else
+                         _decode(data, value_start, value_end, child, shifting))
+        return value
+    # the operations fail as on the decoded document
+    return json.loads(bytes(data[start:end]).decode('utf-8'))
+
+
+def _dump(value, chunks):
+    if isinstance(value, RawJson):
+        chunks.append(value.raw)
+    elif isinstance(value, dict):
+        chunks.append(b'{')
+        for index, (key, item) in enumerate(value.items()):
+            chunks.append(b', ' if index else b'')
+            chunks.append(json.dumps(key).encode('ascii') + b': ')
+            _dump(item, chunks)
+        chunks.append(b'}')
+    elif isinstance(value, list):
+        chunks.append(b'[')
+        for index, item in enumerate(value):
+            chunks.append(b', ' if index else b'')
+            _dump(item, chunks)
+        chunks.append(b']')
+    else:
+        chunks.append(json.dumps(value).encode('ascii'))
+
+
+def _members(data, start):
+    """Yields the name, and value start and end offsets, of the members of
+    the object at `start`."""
+    pos = _skip_whitespace(data, start + 1)
+    if data[pos:pos + 1] == b'}':
+        return
+    while True:
+        match = _STRING.match(data, pos)
+        if match is None:
+            _fail('Expected a member name', pos)
+        key = json.loads(match.group().decode('utf-8'))
+        pos = _skip_whitespace(data, match.end())
+        if data[pos:pos + 1] != b':':
+            _fail("Expected ':'", pos)
+        value_start = _skip_whitespace(data, pos + 1)
+        value_end = _skip_value(data, value_start)
+        yield key, value_start, value_end
+        pos = _skip_whitespace(data, value_end)
+        separator = data[pos:pos + 1]
+        if separator == b'}':
+            return
+        if separator != b',':
+            _fail("Expected ',' or '}'", pos)
+        pos = _skip_whitespace(data, pos + 1)
+
+
+def _elements(data, start):
+    """Yields the start and end offsets of the elements of the array at `start`."""
+    pos = _skip_whitespace(data, start + 1)
+    if data[pos:pos + 1] == b']':
+        return
+    while True:
+        value_end = _skip_value(data, pos)
+        yield pos, value_end
+        pos = _skip_whitespace(data, value_end)
+        separator = data[pos:pos + 1]
+        if separator == b']':
+            return
+        if separator != b',':
+            _fail("Expected ',' or ']'", pos)
+        pos = _skip_whitespace(data, pos + 1)
+
+
+def _skip_whitespace(data, pos):
+    return _WHITESPACE.match(data, pos).end()
+
+
+def _skip_value(data, pos):
+    """Returns the end offset of the value at `pos`."""
+    first = data[pos:pos + 1]
+    if first == b'"':
+        match = _STRING.match(data, pos)
+        if match is None:
+            _fail('Unterminated string', pos)
+        return match.end()
+    if first not in (b'{', b'['):
+        end = _SCALAR_CHARS.match(data, pos).end()
+        if end == pos:
+            _fail('Expected a value', pos)
+        return end
+
+    depth = 0
+    while True:
+        char = data[pos:pos + 1]
+        if char == b'"':
+            match = _STRING.match(data, pos)
+            if match is None:
+                _fail('Unterminated string', pos)
+            pos = match.end()
+        elif char in (b'{', b'['):
+            depth += 1
+            pos += 1
+        elif char in (b'}', b']'):
+            depth -= 1
+            pos += 1
+            if not depth:
+                return pos
+        elif not char:
+            _fail('Unterminated container', pos)
+        pos = _CONTAINER_CHARS.match(data, pos).end()
+
+
+def _fail(message, pos):
+    raise ValueError('{0} at offset {1}'.format(message, pos))
@@ -0,0 +1,248 @@
+""" Iterative deep merge of JSON values """
+
+from __future__ import unicode_literals
+
+import copy
+
+try:
+    from deepmerge.exception import InvalidMerge as _BaseInvalidMerge
+except ImportError:
+    # deepmerge is optional, its exception is only extended so that existing
+    # handlers keep catching merge errors
+    _BaseInvalidMerge = Exception
+
+
+class InvalidMerge(_BaseInvalidMerge):
+    """Raised when two values can't be merged."""
+
+    def __init__(self, msg):
+        Exception.__init__(self, msg)
+
+
+def merge_type_conflict(config, path, base, nxt):
+    if len(path) > 0:
+        raise InvalidMerge("Type conflict at '/{}': {}, {}".format(
+            '/'.join(path), type(base), type(nxt)
+        ))
+    raise InvalidMerge("Type conflict: {}, {}".format(
+        type(base), type(nxt)
+    ))
+
+
+def merge_fallback(config, path, base, nxt):
+    if len(path) > 0:
+        raise InvalidMerge("Merge fallback at '/{}': {}, {}".format(
+            '/'.join(path), type(base), type(nxt)
+        ))
+    raise InvalidMerge("Merge fallback: {}, {}".format(
+        type(base), type(nxt)
+    ))
+
+
+# Returned by Merger._merge_value for dicts, which are merged by the caller.
+_MERGE_DICT = object()
+
+
+# List merge strategies, besides keyed merges given as {'by': key}.
+LIST_STRATEGIES = frozenset(['append', 'unique', 'replace'])
+
+
+def is_list_strategy(strategy):
+    """Whether `strategy` is a valid list merge strategy."""
+    if isinstance(strategy, dict):
+        return len(strategy) == 1 and 'by' in strategy and _hashable(strategy['by'])
+    return strategy is None or (_hashable(strategy) and strategy in LIST_STRATEGIES)
+
+
+class Merger(object):
+    """Deep merges values, appending lists and merging dicts.
+
+    This has the semantics of a deepmerge ``Merger([(list, "append"), (dict,
+    "merge")], [fallback], [type_conflict])``: the values must be instances
+    of each other's types, lists are appended into a new list, the keys of
+    dicts are merged into the base dict, and other values are passed to the
+    fallback. Dicts are merged iteratively, so deep values don't hit the
+    recursion limit, and the path of each level is only built for errors.
+
+    Lists can also be merged with other strategies:
+
+    - ``'append'``: the default, appends the items of the next list.
+    - ``'unique'``: appends the items of the next list not in the base list.
+    - ``'replace'``: uses the next list.
+    - ``{'by': key}``: items of the next list which are dicts with the same
+      `key` value as an item of the base list are merged into it, the others
+      are appended. Inside merged items, values which can't be merged
+      replace the base values instead of raising.
+
+    >>> Merger().merge([{'id': 1, 'a': 1}], [{'id': 1, 'a': 2, 'b': 3}, {'id': 2}], list_strategy={'by': 'id'})
+    [{'id': 1, 'a': 2, 'b': 3}, {'id': 2}]
+
+    :param fallback: Called with the merger, the path as a list of keys, the
+                     base and the next value, for values which are neither
+                     lists nor dicts. Returns the merged value or raises
+                     :class:`InvalidMerge`.
+
+    :param type_conflict: Called like `fallback`, for values of incompatible types.
+    """
+
+    def __init__(self, fallback=merge_fallback, type_conflict=merge_type_conflict):
+        self.fallback = fallback
+        self.type_conflict = type_conflict
+
+    def merge(self, base, nxt, copy_value=False, list_strategy=None):
+        """Merges `nxt` into `base`.
+
+        :param base: Value to merge into, dicts are modified in place.
+
+        :param nxt: Value to merge.
+
+        :param copy_value: Whether to deep copy the parts of `nxt` added to
+                           `base`. By default they are shared, so `nxt` must
+                           not be modified later.
+        :type copy_value: bool
+
+        :param list_strategy: How to merge lists, at any depth.
+        :type list_strategy: str or dict
+
+        :return: The merged value.
+        """
+        if not is_list_strategy(list_strategy):
+            raise ValueError("Unknown list merge strategy {0!r}".format(list_strategy))
+        if list_strategy == 'append':
+            list_strategy = None
+        return self._merge(None, base, nxt, copy_value, list_strategy, False)
+
+    def _merge(self, path, base, nxt, copy_value, list_strategy, override):
+        if type(base) is dict and type(nxt) is dict:
+            result = _MERGE_DICT
+        else:
+            result = self._merge_value(path, base, nxt, copy_value, list_strategy, override)
+        if result is not _MERGE_DICT:
+            return result
+
+        # depth first, like the recursive merge, so errors are the same
+        stack = [(base, iter(nxt.items()), None, path)]
+        while stack:
+            base, items, parent, path = stack[-1]
+            for key, value in items:
+                if key not in base:
+                    base[key] = copy.deepcopy(value) if copy_value else value
+                    continue
+
+                current = base[key]
+                if type(current) is dict and type(value) is dict:
+                    result = _MERGE_DICT
+                else:
+                    result = self._merge_value((path, key), current, value, copy_value, list_strategy, override)
+                if result is _MERGE_DICT:
+                    stack.append((current, iter(value.items()), base, (path, key)))
+                    break
+                base[key] = result
+            else:
+                stack.pop()
+                if parent is not None:
+                    parent[path[1]] = base
+        return base
+
+    def _merge_value(self, path, base, nxt, copy_value, list_strategy, override):
+        """Merges values which are not both exactly dicts, returns _MERGE_DICT
+        when they must be merged as dicts. With `override`, values which can't
+        be merged are replaced by `nxt`."""
+        if type(nxt) is list and type(base) is list:
+            return self._merge_lists(path, base, nxt, copy_value, list_strategy)
+        if not (isinstance(base, type(nxt)) or isinstance(nxt, type(base))):
+            if override:
+                return copy.deepcopy(nxt) if copy_value else nxt
+            return self.type_conflict(self, _path_list(path), base, nxt)
+        if isinstance(nxt, list):
+            return self._merge_lists(path, base, nxt, copy_value, list_strategy)
+        if isinstance(nxt, dict):
+            return _MERGE_DICT
+        if override:
+            return copy.deepcopy(nxt) if copy_value else nxt
+        return self.fallback(self, _path_list(path), base, nxt)
+
+    def _merge_lists(self, path, base, nxt, copy_value, list_strategy):
+        if copy_value:
+            nxt = copy.deepcopy(nxt)
+        if list_strategy is None:
+            return base + nxt
+        if list_strategy == 'replace':
+            return nxt
+        if list_strategy == 'unique':
+            return _append_unique(base, nxt)
+        return self._merge_keyed(path, base, nxt, list_strategy['by'], list_strategy)
+
+    def _merge_keyed(self, path, base, nxt, by, list_strategy):
+        result = list(base)
+        index = {}
+        for position, item in enumerate(result):
+            key = _item_key(item, by)
+            if key is not _NO_KEY and key not in index:
+                index[key] = position
+
+        for item in nxt:
+            key = _item_key(item, by)
+            position = index.get(key) if key is not _NO_KEY else None
+            if position is None:
+                if key is not _NO_KEY:
+                    index[key] = len(result)
+                result.append(item)
+            else:
+                # the next list was already copied
+                result[position] = self._merge((path, str(position)), result[position], item, False, list_strategy,
+                                               True)
+        return result
+
+
+# Key of list items which can't be matched by key.
+_NO_KEY = object()
+
+
+def _item_key(item, by):
+    if not isinstance(item, dict) or by not in item:
+        return _NO_KEY
+    key = item[by]
+    if not _hashable(key):
+        return _NO_KEY
+    # 1 and True are different keys
+    return type(key), key
+
+
+def _append_unique(base, nxt):
+    result = list(base)
+    seen, unhashable = set(), []
+    for item in result:
+        if _hashable(item):
+            seen.add(item)
+        else:
+            unhashable.append(item)
+    for item in nxt:
+        if _hashable(item):
+            if item in seen:
+                continue
+            seen.add(item)
+        else:
+            if item in unhashable:
+                continue
+            unhashable.append(item)
+        result.append(item)
+    return result
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _path_list(path):
+    """Converts a linked (parent, key) path to a list of keys."""
+    keys = []
+    while path is not None:
+        path, key = path
+        keys.append(key)
+    keys.reverse()
+    return keys
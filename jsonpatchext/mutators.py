@@ -1,4 +1,11 @@
-import re
+import copy
+
+from jsonpatchext.cache import compile_pattern
+from jsonpatchext.comparators import check_not_awaitable
+
+# Mutators may have an 'operand' attribute, a function preprocessing the
+# mutation value once when the operation is prepared. They accept both the
+# original and the preprocessed value.
 
 
 def UppercaseMutator(current, value):
@@ -18,18 +25,36 @@ def CastMutator(current, value):
 
 def RegExMutator(current, value):
     """RegEx replace value. Value must be a tuple (pattern, repl)"""
-    return re.sub(value[0], value[1], current)
+    return compile_pattern(value[0]).sub(value[1], current)
+
+
+def RegExOperand(value):
+    """Compiles the pattern of the (pattern, repl) tuple."""
+    return compile_pattern(value[0]), value[1]
+
+
+RegExMutator.operand = RegExOperand
 
 
 def SliceMutator(current, value):
     """Returns a slice of the current value. Value must be a tuple (start, stop) or (start, stop, step)"""
-    return current[slice(value[0], value[1], value[2] if len(value) > 2 else None)]
+    if value.__class__ is not slice:
+        value = SliceOperand(value)
+    return current[value]
+
+
+def SliceOperand(value):
+    """Converts the (start, stop) or (start, stop, step) tuple to a slice."""
+    return slice(value[0], value[1], value[2] if len(value) > 2 else None)
+
+
+SliceMutator.operand = SliceOperand
 
 
 def InitMutator(current, value):
-    """Initialize the value if it is None"""
+    """Initialize the value if it is None, to a copy of the mutation value"""
     if current is None:
-        return value
+        return copy.deepcopy(value)
     return current
 
 
@@ -49,3 +74,39 @@ def InitItemMutator(*item):
             cur[plast] = value() if callable(value) else value
         return current
     return m
+
+
+class _OperationValue(object):
+    """The type of :data:`OPERATION_VALUE`, whose instance stays the same
+    object when pickled, like to a process pool, or copied."""
+
+    def __repr__(self):
+        return 'OPERATION_VALUE'
+
+    def __reduce__(self):
+        return 'OPERATION_VALUE'
+
+
+# Marks the steps of a MutatorChain using the value of the operation.
+OPERATION_VALUE = _OperationValue()
+
+
+class MutatorChain(object):
+    """Applies mutators in sequence, each to the result of the previous one.
+
+    :param steps: (mutator, value) tuples, where value may be
+                  :attr:`OPERATION_VALUE` to use the value the chain is
+                  called with.
+    :type steps: list
+    """
+
+    OPERATION_VALUE = OPERATION_VALUE
+
+    def __init__(self, steps):
+        self.steps = tuple(steps)
+
+    def __call__(self, current, value):
+        for mutator, step_value in self.steps:
+            current = check_not_awaitable(
+                mutator(current, value if step_value is self.OPERATION_VALUE else step_value), 'mutator')
+        return current
@@ -0,0 +1,291 @@
+""" Rewriting of JSON-Patches into equivalent smaller patches """
+
+from __future__ import unicode_literals
+
+import copy
+
+from jsonpointer import JsonPointer
+
+from jsonpatchext.analysis import read_regions, written_regions, operation_parts, from_pointer
+
+_MISSING = object()
+
+# The path of the folded value in the wrapper document.
+_FOLD_KEY = 'v'
+
+# Operations whose value can be rewritten.
+_VALUE_WRITES = frozenset(['add', 'replace'])
+
+# Operations which can be evaluated on a known value.
+_FOLDABLE = frozenset(['add', 'remove', 'replace', 'move', 'copy', 'test', 'check', 'merge', 'mutate'])
+
+
+def optimize(patch):
+    """Rewrites a patch into an equivalent patch with fewer operations.
+
+    The operations are scanned once, keeping the candidates to rewrite indexed
+    by path, and each candidate is only paired with the first later operation
+    which reads or writes its path, so the rewrites don't depend on the
+    operations in between:
+
+    - an 'add' or 'replace' followed by an 'add' or 'replace' of the same
+      value keeps only the last value, and a 'replace' followed by a 'remove'
+      of the same value is removed.
+    - operations inside the value of an 'add' or 'replace' (including merges,
+      array inserts and checks) are evaluated once on the value, and removed
+      when they succeed.
+    - consecutive 'mutate' operations on the same path become a single
+      mutator chain.
+    - a 'check' or 'test' identical to a previous one is removed.
+
+    When the original patch applies to a document, the optimized patch gives
+    the same result, and it fails when the original fails, maybe with another
+    error. Custom comparators and mutators are not evaluated by the optimizer,
+    but they may be chained.
+
+    :param patch: The patch to optimize.
+    :type patch: JsonPatchExt
+
+    :return: The operations of the optimized patch.
+    :rtype: list
+    """
+    operations = list(patch.patch)
+    while True:
+        optimized = _Optimizer(patch).run()
+        if len(optimized) == len(operations):
+            return optimized
+        operations = optimized
+        patch = patch.__class__(operations, pointer_cls=patch.pointer_cls)
+
+
+class _Pending(object):
+    """An operation which may still be rewritten with a later one."""
+
+    __slots__ = ('index', 'parts', 'writes')
+
+    def __init__(self, index, parts, writes):
+        self.index = index
+        self.parts = parts
+        self.writes = writes
+
+
+class _Optimizer(object):
+
+    def __init__(self, patch):
+        self.patch = patch
+        self.operations = list(patch.patch)
+        self.instances = list(patch._ops)
+        self.pending = {}
+        # pending indexes by path, and by every prefix of their path
+        self.by_path = {}
+        self.by_prefix = {}
+
+    def run(self):
+        for index, instance in enumerate(self.instances):
+            if self._is_duplicate(index):
+                self.operations[index] = None
+                continue
+            for pending in self._touched(instance):
+                if self.operations[index] is None:
+                    break
+                self._rewrite(pending, index)
+            if self.operations[index] is not None:
+                self._add_pending(index)
+        return [operation for operation in self.operations if operation is not None]
+
+    def _is_duplicate(self, index):
+        """Whether the operation is a check identical to a pending one."""
+        operation = self.operations[index]
+        if operation.get('op') not in ('check', 'test'):
+            return False
+        for pending_index in self.by_path.get(operation_parts(self.instances[index]), ()):
+            if not self.pending[pending_index].writes and _identical(self.operations[pending_index], operation):
+                return True
+        return False
+
+    def _touched(self, instance):
+        """Returns the pending operations the instance reads or writes, latest first."""
+        touched = {}
+        for region in written_regions(instance):
+            for pending in self._overlapping(region):
+                touched[pending.index] = pending
+        for region in read_regions(instance):
+            for pending in self._overlapping(region):
+                if pending.writes:
+                    touched[pending.index] = pending
+        return [touched[index] for index in sorted(touched, reverse=True)]
+
+    def _overlapping(self, region):
+        region = tuple(region)
+        indexes = set(self.by_prefix.get(region, ()))
+        for length in range(len(region)):
+            indexes.update(self.by_path.get(region[:length], ()))
+        return [self.pending[index] for index in indexes]
+
+    def _add_pending(self, index):
+        operation, instance = self.operations[index], self.instances[index]
+        op = operation.get('op')
+        parts = tuple(instance.pointer.parts)
+        if op in ('check', 'test'):
+            pending = _Pending(index, operation_parts(instance), False)
+        elif op in _VALUE_WRITES and 'value' in operation and not (parts and parts[-1] == '-'):
+            pending = _Pending(index, parts, True)
+        elif op == 'mutate' and parts and not _is_wildcard(instance) and _is_valid(instance):
+            pending = _Pending(index, parts, True)
+        else:
+            return
+
+        self.pending[index] = pending
+        self.by_path.setdefault(pending.parts, set()).add(index)
+        for length in range(len(pending.parts) + 1):
+            self.by_prefix.setdefault(pending.parts[:length], set()).add(index)
+
+    def _remove_pending(self, pending):
+        del self.pending[pending.index]
+        self.by_path[pending.parts].discard(pending.index)
+        for length in range(len(pending.parts) + 1):
+            self.by_prefix[pending.parts[:length]].discard(pending.index)
+
+    def _rewrite(self, pending, index):
+        """Rewrites a pending operation with the first later operation
+        touching its path, which is never rewritten with an earlier one."""
+        self._remove_pending(pending)
+
+        op = self.operations[pending.index].get('op')
+        if op in _VALUE_WRITES:
+            self._rewrite_value(pending, index)
+        elif op == 'mutate':
+            self._rewrite_mutate(pending, index)
+
+    def _rewrite_value(self, pending, index):
+        first, second, instance = self.operations[pending.index], self.operations[index], self.instances[index]
+        op = second.get('op')
+        parts = tuple(instance.pointer.parts)
+
+        if parts == pending.parts and op in ('add', 'replace', 'remove'):
+            if op == 'remove':
+                if first['op'] == 'replace':
+                    self.operations[pending.index] = None
+            elif 'value' in second and (op == 'replace' or not _is_array_index(parts)):
+                # the value is overwritten
+                self.operations[pending.index] = dict(first, value=second['value'])
+                self._drop(index, pending)
+            return
+
+        if op not in _FOLDABLE or not self._inside(instance, pending.parts) or _is_custom(second):
+            return
+        value = _fold(self.patch, first['value'], second, instance, len(pending.parts))
+        if value is not _MISSING:
+            self.operations[pending.index] = dict(first, value=value)
+            self._drop(index, pending)
+
+    def _rewrite_mutate(self, pending, index):
+        first, second, instance = self.operations[pending.index], self.operations[index], self.instances[index]
+        if (second.get('op') != 'mutate' or tuple(instance.pointer.parts) != pending.parts or
+                _is_wildcard(instance) or not _is_valid(instance)):
+            return
+
+        steps, values = [], []
+        for operation in (first, second):
+            mut = operation['mut']
+            value = operation.get('value', _MISSING)
+            for step in (mut if isinstance(mut, (list, tuple)) else [mut]):
+                if isinstance(step, (list, tuple)):
+                    if step[0] == 'custom':
+                        values.append(value)
+                    steps.append(tuple(step))
+                elif step == 'custom':
+                    values.append(value)
+                    steps.append(('custom', operation['mutator']))
+                else:
+                    steps.append((step, None if value is _MISSING else value))
+
+        # custom steps are called with the value of the chain
+        if any(not _identical(value, values[0]) for value in values[1:]):
+            return
+        mutate = {'op': 'mutate', 'path': second['path'], 'mut': steps}
+        if values and values[0] is not _MISSING:
+            mutate['value'] = values[0]
+        self.operations[pending.index] = None
+        self.operations[index] = mutate
+
+    def _drop(self, index, pending):
+        """Drops the operation at `index`, leaving `pending` pending."""
+        self.operations[index] = None
+        self.pending[pending.index] = pending
+        self.by_path[pending.parts].add(pending.index)
+        for length in range(len(pending.parts) + 1):
+            self.by_prefix[pending.parts[:length]].add(pending.index)
+
+    @staticmethod
+    def _inside(instance, parts):
+        """Whether the operation only reads and writes inside the value at `parts`."""
+        length = len(parts)
+        if operation_parts(instance)[:length] != parts:
+            return False
+        if instance.operation.get('op') in ('move', 'copy'):
+            # inserting at the value itself is not inside it
+            from_parts = tuple(from_pointer(instance).parts)
+            path_parts = tuple(instance.pointer.parts)
+            return (len(from_parts) > length and from_parts[:length] == parts and
+                    len(path_parts) > length)
+        return True
+
+
+def _fold(patch, value, operation, instance, length):
+    """Applies the operation to a copy of `value`, the value at the first
+    `length` parts of its path. Returns _MISSING if it fails."""
+    rebased = dict(operation, path=_rebase(instance.pointer.parts, length))
+    if 'from' in operation:
+        rebased['from'] = _rebase(from_pointer(instance).parts, length)
+    reads = operation.get('op') in ('check', 'test')
+
+    doc = {_FOLD_KEY: value if reads else copy.deepcopy(value)}
+    try:
+        patch.__class__([rebased], pointer_cls=patch.pointer_cls).apply(doc, in_place=True)
+    except Exception:
+        # left to fail when applied
+        return _MISSING
+    return doc[_FOLD_KEY]
+
+
+def _rebase(parts, length):
+    return JsonPointer.from_parts([_FOLD_KEY] + list(parts[length:])).path
+
+
+def _is_wildcard(instance):
+    return getattr(instance, '_wildcard', False)
+
+
+def _is_array_index(parts):
+    return bool(parts) and (parts[-1] == '-' or parts[-1].isdigit())
+
+
+def _is_valid(instance):
+    try:
+        instance.prepare()
+    except Exception:
+        return False
+    return True
+
+
+def _is_custom(operation):
+    """Whether the operation calls a custom comparator or mutator."""
+    if operation.get('cmp') == 'custom':
+        return True
+    mut = operation.get('mut')
+    if isinstance(mut, (list, tuple)):
+        return any(step == 'custom' or (isinstance(step, (list, tuple)) and step and step[0] == 'custom')
+                   for step in mut)
+    return mut == 'custom'
+
+
+def _identical(a, b):
+    """Equality which also compares types, so 1, 1.0 and True differ."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return len(a) == len(b) and all(key in b and _identical(value, b[key]) for key, value in a.items())
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_identical(x, y) for x, y in zip(a, b))
+    return a == b
@@ -0,0 +1,131 @@
+""" Parallel application of a patch to the disjoint subtrees of a document
+
+The operations are partitioned by the top-level member of the document they
+read and write, and each partition is applied in a worker to a document
+holding only that member, so a process only receives the subtree it
+modifies. The members are then stored back in the document, those removed by
+the patch are removed, and the other members are left as they were.
+
+A patch which can't be partitioned, like one with an operation on the root,
+or moving or copying between members, or a document which is not an object,
+is applied sequentially.
+"""
+
+from __future__ import unicode_literals
+
+import copy
+import multiprocessing
+import pickle
+import sys
+
+from jsonpatchext.analysis import operation_parts, from_pointer
+from jsonpatchext.jsonpatchext import _apply_operations
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+try:
+    from concurrent import futures
+except ImportError:
+    # Python 2 without the futures backport
+    futures = None
+
+
+def partition(operations):
+    """Groups the operations by the top-level member they read and write.
+
+    :param operations: Operation objects.
+    :type operations: Sequence
+
+    :return: The indexes of the operations of each member, in the order of
+             their first operation, or None if an operation reads or writes
+             more than one member, or the root.
+    :rtype: list of tuples
+    """
+    partitions = {}
+    for index, operation in enumerate(operations):
+        parts = operation_parts(operation)
+        if not parts:
+            return None
+        key = parts[0]
+        if operation.operation.get('op') in ('move', 'copy'):
+            try:
+                from_parts = from_pointer(operation).parts
+            except Exception:
+                return None
+            if not from_parts or from_parts[0] != key:
+                return None
+        partitions.setdefault(key, []).append(index)
+    return sorted(partitions.items(), key=lambda item: item[1][0])
+
+
+def apply_parallel(operations, obj, in_place=False, copy_on_write=False, workers=None, executor=None):
+    """Applies prepared operations to the disjoint members of an object in
+    parallel, see :meth:`JsonPatchExt.apply_parallel`."""
+    partitions = partition(operations) if isinstance(obj, MutableMapping) else None
+    if partitions is None or len(partitions) < 2 or (executor is None and futures is None):
+        return _apply_operations(operations, obj, in_place, copy_on_write, False)
+
+    tasks = [(indexes, [operations[index] for index in indexes]) for _, indexes in partitions]
+
+    own_executor = executor is None
+    if own_executor:
+        executor = _default_executor(min(workers or multiprocessing.cpu_count(), len(tasks)), tasks)
+    # processes receive copies of the subtrees
+    copy_doc = futures is None or not isinstance(executor, futures.ProcessPoolExecutor)
+    docs = [{key: obj[key]} if key in obj else {} for key, _ in partitions]
+    try:
+        results = list(executor.map(_apply_partition, *zip(*[task + (doc, copy_doc)
+                                                               for task, doc in zip(tasks, docs)])))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    # the failure of the first operation in patch order, as when sequential
+    failures = [result for result in results if result[0] is not None]
+    if failures:
+        raise min(failures, key=lambda failure: failure[0])[1]
+
+    if not in_place:
+        result = copy.copy(obj)
+        if not copy_on_write:
+            modified = set(key for key, _ in partitions)
+            for key, value in obj.items():
+                if key not in modified:
+                    result[key] = copy.deepcopy(value)
+        obj = result
+    for (key, _), (_, doc) in zip(partitions, results):
+        if key in doc:
+            obj[key] = doc[key]
+        else:
+            obj.pop(key, None)
+    return obj
+
+
+def _default_executor(workers, tasks):
+    """Threads run in parallel on free-threaded builds, elsewhere processes
+    are used if the operations can be pickled."""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    if is_gil_enabled is not None and not is_gil_enabled():
+        return futures.ThreadPoolExecutor(workers)
+    try:
+        pickle.dumps(tasks, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # like custom comparators defined in functions
+        return futures.ThreadPoolExecutor(workers)
+    return futures.ProcessPoolExecutor(workers)
+
+
+def _apply_partition(indexes, operations, doc, copy_doc):
+    """Applies the operations of a partition to its document, returning
+    (None, document), or (index, exception) for the failing operation."""
+    if copy_doc:
+        doc = copy.deepcopy(doc)
+    for index, operation in zip(indexes, operations):
+        try:
+            doc = operation.apply(doc)
+        except Exception as e:
+            return index, e
+    return None, doc
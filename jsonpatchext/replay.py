@@ -0,0 +1,292 @@
+""" Replay of a log of patches, with periodic snapshots of the document
+
+The state of a document is rebuilt by applying the patches of an
+append-only log in order, the document after the n-th patch being its
+version n. :class:`Replay` applies the patches in place and writes a
+snapshot of the document every `every` patches, or once the patches
+applied since the last one total `every_bytes` of JSON text, so it resumes
+from the latest snapshot instead of replaying the whole log. The state at
+an earlier version is rebuilt from the nearest snapshot before it.
+
+The snapshots are JSON files, optionally gzip compressed, written to a
+temporary file renamed over the snapshot, so a snapshot is either missing
+or complete. The documents must be JSON serializable.
+"""
+
+from __future__ import unicode_literals
+
+import bisect
+import copy
+import gzip
+import itertools
+import json
+import os
+import re
+import tempfile
+
+from jsonpatchext.cache import parse_patch
+from jsonpatchext.jsonpatchext import JsonPatchExt
+
+text_type = type('')
+
+_SNAPSHOT_NAME = re.compile(r'^snapshot-(\d+)\.json(\.gz)?$')
+
+# Python 2 has no atomic replace, but rename is atomic on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+class SnapshotStore(object):
+    """The snapshots of a document by version, in a local directory.
+
+    :param directory: Directory of the snapshots, created if missing.
+    :type directory: str
+
+    :param compress: Whether to gzip the snapshots written.
+    :type compress: bool
+
+    :param keep: Number of snapshots kept, the oldest ones being removed,
+                 or :const:`None` to keep all of them.
+    :type keep: int
+    """
+
+    def __init__(self, directory, compress=False, keep=None):
+        if keep is not None and keep < 1:
+            raise ValueError("keep must be positive")
+        self.directory = directory
+        self.compress = compress
+        self.keep = keep
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def versions(self):
+        """Returns the versions of the snapshots, in ascending order.
+
+        :rtype: list of int
+        """
+        return sorted(self._files())
+
+    def save(self, version, doc):
+        """Writes the snapshot of a version of the document, atomically."""
+        data = json.dumps(doc, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        name = 'snapshot-{0:012d}.json{1}'.format(version, '.gz' if self.compress else '')
+        fd, temp = tempfile.mkstemp(prefix='.snapshot-', suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if self.compress:
+                    with gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as compressed:
+                        compressed.write(data)
+                else:
+                    f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            _replace(temp, os.path.join(self.directory, name))
+        except BaseException:
+            os.remove(temp)
+            raise
+        self._sync_directory()
+
+        files = self._files()
+        for other in files.pop(version):
+            if other != name:
+                # the same version, written with the other compression
+                os.remove(os.path.join(self.directory, other))
+        if self.keep is not None:
+            for old in sorted(files)[:max(0, len(files) + 1 - self.keep)]:
+                for other in files[old]:
+                    os.remove(os.path.join(self.directory, other))
+
+    def load(self, version):
+        """Reads the snapshot of a version of the document.
+
+        :raises KeyError: There is no snapshot of the version.
+        """
+        name = self._files()[version][0]
+        path = os.path.join(self.directory, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            return json.loads(f.read().decode('utf-8'))
+
+    def nearest(self, version=None):
+        """Returns the latest snapshot version not after `version`, and the
+        document, or :const:`None` when there is none.
+
+        :rtype: tuple
+        """
+        versions = self.versions()
+        if version is not None:
+            versions = versions[:bisect.bisect_right(versions, version)]
+        if not versions:
+            return None
+        return versions[-1], self.load(versions[-1])
+
+    def _sync_directory(self):
+        """Flushes the rename of a snapshot to disk, on POSIX where the
+        directory can be opened."""
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _files(self):
+        files = {}
+        for name in sorted(os.listdir(self.directory)):
+            match = _SNAPSHOT_NAME.match(name)
+            if match is not None:
+                files.setdefault(int(match.group(1)), []).append(name)
+        return files
+
+
+class Replay(object):
+    """Applies the patches of a log to a document, taking snapshots of it.
+
+    The document is resumed from the latest snapshot of the directory, or
+    starts as `initial` at version 0.
+
+    >>> import tempfile
+    >>> log = [[{'op': 'add', 'path': '/n', 'value': n}] for n in range(1, 6)]
+    >>> replay = Replay(tempfile.mkdtemp(), every=2)
+    >>> replay.catch_up(log)
+    5
+    >>> replay.doc, replay.store.versions()
+    ({'n': 5}, [2, 4])
+    >>> Replay(replay.store.directory).version
+    4
+    >>> replay.state_at(3, log)
+    {'n': 3}
+
+    :param directory: Directory of the snapshots.
+    :type directory: str
+
+    :param every: Number of patches between snapshots, or :const:`None`.
+    :type every: int
+
+    :param every_bytes: Size of the JSON text of the patches between
+                        snapshots, or :const:`None`.
+    :type every_bytes: int
+
+    :param compress: Whether to gzip the snapshots.
+    :type compress: bool
+
+    :param keep: Number of snapshots kept, see :class:`SnapshotStore`.
+    :type keep: int
+
+    :param initial: Document at version 0, copied.
+    :type initial: dict
+    """
+
+    def __init__(self, directory, every=1000, every_bytes=None, compress=False, keep=None, initial=None):
+        if every is not None and every < 1:
+            raise ValueError("every must be positive")
+        if every_bytes is not None and every_bytes < 1:
+            raise ValueError("every_bytes must be positive")
+        self.store = SnapshotStore(directory, compress, keep)
+        self.every = every
+        self.every_bytes = every_bytes
+        self._initial = {} if initial is None else initial
+        self._pending = 0
+        self._pending_bytes = 0
+
+        nearest = self.store.nearest()
+        if nearest is None:
+            self.version, self.doc = 0, copy.deepcopy(self._initial)
+        else:
+            self.version, self.doc = nearest
+
+    def apply(self, patch):
+        """Applies the patch following the current version, in place. The
+        application is atomic, a failed patch leaves the document unmodified.
+
+        :param patch: Patch, as for :func:`jsonpatchext.apply_patch`.
+        :type patch: JsonPatchExt or PreparedPatch or list or str
+
+        :return: The new version.
+        :rtype: int
+        """
+        self.doc = _patch(patch).apply(self.doc, in_place=True, atomic=True)
+        self.version += 1
+        self._pending += 1
+        if self.every_bytes is not None:
+            self._pending_bytes += _patch_size(patch)
+        if (self.every is not None and self._pending >= self.every) or \
+                (self.every_bytes is not None and self._pending_bytes >= self.every_bytes):
+            self.snapshot()
+        return self.version
+
+    def replay(self, patches):
+        """Applies the patches following the current version, in order.
+
+        :return: The new version.
+        :rtype: int
+        """
+        for patch in patches:
+            self.apply(patch)
+        return self.version
+
+    def catch_up(self, log):
+        """Applies the patches of the log after the current version.
+
+        :param log: Patches, the one at index n producing version n + 1.
+        :type log: Sequence
+
+        :return: The new version.
+        :rtype: int
+        """
+        return self.replay(_slice(log, self.version, None))
+
+    def snapshot(self):
+        """Writes the snapshot of the current version."""
+        self.store.save(self.version, self.doc)
+        self._pending = 0
+        self._pending_bytes = 0
+
+    def state_at(self, version, log):
+        """Returns a copy of the document at a version, replayed from the
+        nearest snapshot before it.
+
+        :param version: Version, at most the current one.
+        :type version: int
+
+        :param log: Patches, see :meth:`catch_up`.
+        :type log: Sequence
+        """
+        if version < 0 or version > self.version:
+            raise ValueError("Version {0!r} is not between 0 and {1!r}".format(version, self.version))
+        if version == self.version:
+            return copy.deepcopy(self.doc)
+
+        nearest = self.store.nearest(version)
+        if nearest is None:
+            start, doc = 0, copy.deepcopy(self._initial)
+        else:
+            start, doc = nearest
+        for patch in _slice(log, start, version):
+            doc = _patch(patch).apply(doc, in_place=True)
+        return doc
+
+
+def _patch(patch):
+    if isinstance(patch, (text_type, bytes)):
+        return parse_patch(patch)
+    if isinstance(patch, (list, tuple)):
+        return JsonPatchExt(patch)
+    return patch
+
+
+def _patch_size(patch):
+    if isinstance(patch, (text_type, bytes)):
+        return len(patch)
+    if isinstance(patch, JsonPatchExt):
+        patch = patch.patch
+    # the custom comparators and mutators are not serializable
+    return len(json.dumps(list(patch), default=repr))
+
+
+def _slice(log, start, stop):
+    try:
+        return log[start:stop]
+    except TypeError:
+        return itertools.islice(log, start, stop)
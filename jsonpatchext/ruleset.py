@@ -0,0 +1,253 @@
+""" Match a document against many check-only JSON-Patches at once """
+
+from __future__ import unicode_literals
+
+import bisect
+from collections import defaultdict
+
+from jsonpointer import JsonPointerException
+
+from jsonpatchext.comparators import EqualsComparator, InValueComparator, StartsWithComparator, \
+    RangeComparator, comparator_predicate
+from jsonpatchext.jsonpatchext import JsonPatchExt
+
+text_type = type('')
+
+_MISSING = object()
+
+# Key of the trie nodes holding the predicates of the prefix ending there.
+_TRIE_END = None
+
+
+class CheckRuleSet(object):
+    """A set of check-only patches (rules) indexed by path and compared value.
+
+    Each distinct path is resolved once per document, and the 'equals' and
+    'invalue' comparators are matched through a hash index, 'range' through
+    sorted intervals and 'startswith' through a prefix trie, so that
+    :meth:`matching` costs roughly the number of paths and candidate
+    predicates, not the number of rules. Other comparators, including
+    'custom', are evaluated once per distinct (path, comparator, value).
+    Checks with wildcard paths are evaluated once per distinct operation.
+
+    A rule matches when :meth:`JsonPatchExt.check` would return True for it;
+    a comparator raising any exception counts as a failed check.
+
+    >>> from jsonpatchext import JsonPatchExt
+    >>> rules = CheckRuleSet()
+    >>> rules.add('admin', [{'op': 'check', 'path': '/role', 'value': 'admin', 'cmp': 'equals'}])
+    >>> rules.add('adult', JsonPatchExt([{'op': 'check', 'path': '/age', 'value': (18, 200), 'cmp': 'range'}]))
+    >>> sorted(rules.matching({'role': 'admin', 'age': 20}))
+    ['admin', 'adult']
+    """
+
+    def __init__(self, rules=None):
+        self._paths = {}
+        self._predicates = {}
+        self._predicate_rules = []
+        self._rule_sizes = {}
+        self._always = set()
+        self._wildcards = []
+
+        if rules is not None:
+            for rule_id, patch in (rules.items() if hasattr(rules, 'items') else rules):
+                self.add(rule_id, patch)
+
+    def __len__(self):
+        return len(self._rule_sizes)
+
+    def __contains__(self, rule_id):
+        return rule_id in self._rule_sizes
+
+    def add(self, rule_id, patch):
+        """Adds a rule.
+
+        :param rule_id: Hashable identifier returned by :meth:`matching`.
+
+        :param patch: Patch containing only 'check' operations.
+        :type patch: JsonPatchExt or list
+        """
+        if rule_id in self._rule_sizes:
+            raise ValueError("Rule {0!r} already exists".format(rule_id))
+
+        operations = [operation.prepare() for operation in _check_operations(patch)]
+        predicates = set(self._add_predicate(operation) for operation in operations)
+        for predicate in predicates:
+            self._predicate_rules[predicate].append(rule_id)
+
+        self._rule_sizes[rule_id] = len(predicates)
+        if not predicates:
+            self._always.add(rule_id)
+
+    def matching(self, doc):
+        """Returns the ids of all the rules whose checks pass on the document.
+
+        :param doc: Document object.
+        :type doc: Mapping
+
+        :rtype: set
+        """
+        passed = []
+        for predicate, operation in self._wildcards:
+            try:
+                if operation.test(doc):
+                    passed.append(predicate)
+            except Exception:
+                continue
+        for index in self._paths.values():
+            try:
+                current = index.pointer.resolve(doc)
+            except (JsonPointerException, TypeError, AssertionError):
+                continue
+            index.match(current, passed)
+
+        counts = defaultdict(int)
+        for predicate in passed:
+            for rule_id in self._predicate_rules[predicate]:
+                counts[rule_id] += 1
+
+        result = set(self._always)
+        result.update(rule_id for rule_id, count in counts.items() if count == self._rule_sizes[rule_id])
+        return result
+
+    def _add_predicate(self, operation):
+        if operation._wildcard:
+            return self._add_wildcard_predicate(operation)
+
+        index = self._paths.get(operation.location)
+        if index is None:
+            index = self._paths[operation.location] = _PathIndex(operation.pointer)
+
+        key = (operation.location, operation._comparator, _freeze(operation._value))
+        if key[2] is _MISSING:
+            key = (operation.location, operation._comparator, id(operation))
+        elif key in self._predicates:
+            return self._predicates[key]
+
+        predicate = self._predicates[key] = len(self._predicate_rules)
+        self._predicate_rules.append([])
+        index.add(predicate, operation._comparator, operation._value)
+        return predicate
+
+    def _add_wildcard_predicate(self, operation):
+        key = (operation.location, operation._get_quantifier(), operation._comparator, _freeze(operation._value))
+        if key[3] is _MISSING:
+            key = (operation.location, None, operation._comparator, id(operation))
+        elif key in self._predicates:
+            return self._predicates[key]
+
+        predicate = self._predicates[key] = len(self._predicate_rules)
+        self._predicate_rules.append([])
+        self._wildcards.append((predicate, operation))
+        return predicate
+
+
+class _PathIndex(object):
+    """Discrimination indexes for the predicates of a single path."""
+
+    def __init__(self, pointer):
+        self.pointer = pointer
+        self.values = defaultdict(list)
+        self.range_starts = []
+        self.ranges = []
+        self.prefixes = {}
+        self.range_predicates = []
+        self.prefix_predicates = []
+        self.generic = []
+
+    def add(self, predicate, comparator, value):
+        if comparator is EqualsComparator and _hashable(value):
+            self.values[value].append(predicate)
+        elif comparator is InValueComparator and isinstance(value, (list, tuple, set, frozenset)) \
+                and all(_hashable(item) for item in value):
+            for item in set(value):
+                self.values[item].append(predicate)
+        elif comparator is RangeComparator and isinstance(value, (list, tuple)) and len(value) == 2 \
+                and _is_number(value[0]) and _is_number(value[1]):
+            position = bisect.bisect_right(self.range_starts, value[0])
+            self.range_starts.insert(position, value[0])
+            self.ranges.insert(position, (value[1], predicate))
+            self.range_predicates.append((predicate, comparator_predicate(comparator), value))
+        elif comparator is StartsWithComparator and isinstance(value, text_type):
+            node = self.prefixes
+            for char in value:
+                node = node.setdefault(char, {})
+            node.setdefault(_TRIE_END, []).append(predicate)
+            self.prefix_predicates.append((predicate, comparator_predicate(comparator), value))
+        else:
+            self.generic.append((predicate, comparator_predicate(comparator), value))
+
+    def match(self, current, passed):
+        if _hashable(current):
+            passed.extend(self.values.get(current, ()))
+
+        if self.ranges:
+            if _is_number(current) and current == current:
+                for stop, predicate in self.ranges[:bisect.bisect_right(self.range_starts, current)]:
+                    if current <= stop:
+                        passed.append(predicate)
+            else:
+                _evaluate(self.range_predicates, current, passed)
+
+        if self.prefix_predicates:
+            if isinstance(current, text_type):
+                node = self.prefixes
+                passed.extend(node.get(_TRIE_END, ()))
+                for char in current:
+                    node = node.get(char)
+                    if node is None:
+                        break
+                    passed.extend(node.get(_TRIE_END, ()))
+            else:
+                _evaluate(self.prefix_predicates, current, passed)
+
+        _evaluate(self.generic, current, passed)
+
+
+def _evaluate(predicates, current, passed):
+    for predicate, test, value in predicates:
+        try:
+            if not test(current, value):
+                continue
+        except Exception:
+            continue
+        passed.append(predicate)
+
+
+def _check_operations(patch):
+    if not isinstance(patch, JsonPatchExt):
+        patch = JsonPatchExt(patch)
+    return patch._check_ops
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) or type(value).__name__ == 'long'
+
+
+def _freeze(value):
+    """Returns a hashable key for the compared value, or _MISSING."""
+    if isinstance(value, (list, tuple)):
+        items = tuple(_freeze(item) for item in value)
+        if _MISSING in items:
+            return _MISSING
+        return type(value), items
+    if isinstance(value, dict):
+        try:
+            items = tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+        except TypeError:
+            return _MISSING
+        if any(item is _MISSING for _, item in items):
+            return _MISSING
+        return dict, items
+    if not _hashable(value):
+        return _MISSING
+    # 1 and True compare equal but are different compared values
+    return type(value), value
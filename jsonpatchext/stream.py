@@ -0,0 +1,363 @@
+""" Streaming application of patches to JSON documents too big for memory
+
+The document is read incrementally from a binary file object, or a
+:class:`mmap.mmap`, and written to a binary file object. Only the values the
+operations apply to are decoded: the containers along the paths of the
+operations are streamed, and every other value is copied byte for byte,
+whitespace included, so memory is proportional to the modified values.
+
+An operation is applied to the value at its path, or for the wildcard
+operations to the value at the path up to the first wildcard, except when
+it adds or removes an array element, as the whole array is then decoded.
+The operations on different values apply to disjoint regions of the
+document, so they are applied when their value is read, and the
+operations on the same value are applied in patch order.
+
+The output is incomplete when an exception is raised, it should be written
+to a temporary file replacing the document on success. The document must
+be encoded in UTF-8, and 'move' and 'copy' operations are not supported.
+"""
+
+from __future__ import unicode_literals
+
+import collections
+import json
+import re
+
+from jsonpatch import InvalidJsonPatch
+
+from jsonpatchext.analysis import operation_parts
+from jsonpatchext.jsonpatchext import _prepare_operation
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# The operations applied to the value at their path.
+_VALUE_OPERATIONS = frozenset(['check', 'test', 'replace', 'mutate', 'merge'])
+# The operations adding or removing the member at their path.
+_MEMBER_OPERATIONS = frozenset(['add', 'remove'])
+
+_WHITESPACE = re.compile(br'[ \t\n\r]*')
+_STRING_CHARS = re.compile(br'[^"\\]*')
+_CONTAINER_CHARS = re.compile(br'[^"\[\]{}]*')
+_SCALAR_CHARS = re.compile(br'[^,\]}\s]*')
+
+
+class JsonStreamError(ValueError):
+    """The streamed document is not valid JSON."""
+    pass
+
+
+_Entry = collections.namedtuple('_Entry', 'operation parts pointer_parts')
+
+
+def apply_stream(operations, input, output, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Applies prepared operations to a streamed document, see :meth:`JsonPatchExt.apply_stream`."""
+    entries = []
+    for operation in operations:
+        name = operation.operation.get('op')
+        if name not in _VALUE_OPERATIONS and name not in _MEMBER_OPERATIONS:
+            raise InvalidJsonPatch("Operation {0!r} can't be applied to a stream".format(name))
+        entries.append(_Entry(operation, tuple(operation_parts(operation)), tuple(operation.pointer.parts)))
+
+    reader = _Reader(input, chunk_size)
+    write = output.write
+    reader.copy_whitespace(write)
+    if not reader.peek():
+        raise JsonStreamError('Empty document')
+    value = _stream_value(reader, write, entries, 0)
+    if value is not _STREAMED:
+        for entry in entries:
+            value = entry.operation.apply(value)
+        write(_dumps(value))
+    reader.copy_whitespace(write)
+    if reader.peek():
+        raise JsonStreamError('Extra data after the document at offset {0}'.format(reader.offset))
+
+
+class _Marker(object):
+    pass
+
+
+# A value written while streamed.
+_STREAMED = _Marker()
+# The end of a container.
+_END = _Marker()
+
+
+def _stream_value(reader, write, entries, depth):
+    """Streams the value at `depth` of the paths of the operations, or reads
+    and returns it when they must be applied to all of it."""
+    if _must_read(reader, entries, depth):
+        return reader.read_value()
+    _stream_container(reader, write, entries, depth)
+    return _STREAMED
+
+
+def _must_read(reader, entries, depth):
+    first = reader.peek()
+    if first == b'{':
+        return any(len(entry.parts) == depth for entry in entries)
+    if first == b'[':
+        return any(len(entry.parts) == depth or entry.parts[depth] == '-' or
+                   (len(entry.parts) == depth + 1 and entry.operation.operation.get('op') in _MEMBER_OPERATIONS)
+                   for entry in entries)
+    # not a container, the operations fail as on a decoded document
+    return True
+
+
+def _stream_container(reader, write, entries, depth):
+    is_object = reader.peek() == b'{'
+    by_key = collections.OrderedDict()
+    for entry in entries:
+        by_key.setdefault(entry.parts[depth], []).append(entry)
+
+    reader.advance()
+    write(b'{' if is_object else b'[')
+    separator = b''
+    index = 0
+    while True:
+        lead, key = reader.read_member_start(is_object)
+        if key is _END:
+            write(lead)
+            break
+        if not is_object:
+            key = '{0}'.format(index)
+            index += 1
+        member_entries = by_key.pop(key, None)
+        if member_entries:
+            emitted = _stream_member(reader, write, member_entries, depth, key, is_object, separator + lead)
+        else:
+            write(separator + lead)
+            reader.copy_value(write)
+            emitted = True
+        reader.copy_whitespace(write if emitted else None)
+        if emitted:
+            separator = b','
+        if not by_key:
+            # nothing else to modify in the container
+            if not separator and reader.peek() == b',':
+                # the first member was removed
+                reader.advance()
+            reader.copy_container_rest(write)
+            return
+        if reader.read_separator(b'}' if is_object else b']'):
+            break
+
+    # the paths not in the document, the operations add them or fail
+    for key, member_entries in by_key.items():
+        wrapper = _apply(member_entries, {} if is_object else [], depth, key)
+        if key in wrapper:
+            write(separator + _dumps(key) + b': ' + _dumps(wrapper[key]))
+            separator = b','
+    write(b'}' if is_object else b']')
+
+
+def _stream_member(reader, write, entries, depth, key, is_object, prefix):
+    """Streams or applies the operations to a member of the container at
+    `depth`, returning whether it was written."""
+    if not _must_read(reader, entries, depth + 1):
+        write(prefix)
+        _stream_container(reader, write, entries, depth + 1)
+        return True
+
+    value = reader.read_value()
+    if is_object:
+        wrapper = _apply(entries, {key: value}, depth, key)
+        if key not in wrapper:
+            return False
+        value = wrapper[key]
+    else:
+        value = _apply(entries, [value], depth, '0')[0]
+    write(prefix + _dumps(value))
+    return True
+
+
+def _apply(entries, wrapper, depth, key):
+    """Applies the operations to the member at `depth` of their paths, in a
+    container holding only it at `key`."""
+    for entry in entries:
+        operation = entry.operation
+        pointer_cls = type(operation.pointer)
+        path = pointer_cls.from_parts((key,) + entry.pointer_parts[depth + 1:]).path
+        rebased = operation.__class__(dict(operation.operation, path=path), pointer_cls=pointer_cls)
+        wrapper = _prepare_operation(rebased).apply(wrapper)
+    return wrapper
+
+
+def _dumps(value):
+    return json.dumps(value).encode('ascii')
+
+
+class _Reader(object):
+    """Reads JSON tokens from a binary file object, holding at most a chunk
+    and the token being read in memory.
+
+    The bytes consumed are passed to the `sink` of the reading methods, or
+    dropped when it is None.
+    """
+
+    def __init__(self, input, chunk_size):
+        self._input = input
+        self._chunk_size = chunk_size
+        self._buffer = b''
+        self._pos = 0
+        self._start = 0
+        self._sink = None
+        self._consumed = 0
+
+    @property
+    def offset(self):
+        return self._consumed + self._pos
+
+    def peek(self):
+        """Returns the next byte, or b'' at the end."""
+        if self._pos >= len(self._buffer) and not self._more():
+            return b''
+        return self._buffer[self._pos:self._pos + 1]
+
+    def advance(self):
+        self._pos += 1
+
+    def copy_whitespace(self, sink):
+        self._begin(sink)
+        self._match(_WHITESPACE)
+        self._end()
+
+    def copy_value(self, sink):
+        self._begin(sink)
+        self._skip_value()
+        self._end()
+
+    def read_value(self):
+        chunks = []
+        self._begin(chunks.append)
+        self._skip_value()
+        self._end()
+        try:
+            return json.loads(b''.join(chunks).decode('utf-8'))
+        except ValueError as e:
+            raise JsonStreamError('Invalid value before offset {0}: {1}'.format(self.offset, e))
+
+    def copy_container_rest(self, sink):
+        """Copies the rest of the container being read, with its end."""
+        self._begin(sink)
+        self._skip_container()
+        self._end()
+
+    def read_member_start(self, is_object):
+        """Reads the whitespace, and for an object the name and colon, before
+        a member. Returns the bytes read and the name, or the whitespace and
+        _END at the end of an empty container."""
+        chunks = []
+        self._begin(chunks.append)
+        self._match(_WHITESPACE)
+        end = self.peek()
+        if end == (b'}' if is_object else b']'):
+            self._end()
+            self._pos += 1
+            return b''.join(chunks), _END
+        key = None
+        if is_object:
+            if end != b'"':
+                self._fail('Expected a member name')
+            key_start = sum(len(chunk) for chunk in chunks) + self._pos - self._start
+            self._skip_string()
+            self._match(_WHITESPACE)
+            if self.peek() != b':':
+                self._fail("Expected ':'")
+            self._pos += 1
+            self._match(_WHITESPACE)
+        self._end()
+        lead = b''.join(chunks)
+        if is_object:
+            key = json.JSONDecoder().raw_decode(lead[key_start:].decode('utf-8'))[0]
+        return lead, key
+
+    def read_separator(self, end):
+        """Reads ',' or `end`, returning whether it was the end."""
+        separator = self.peek()
+        if separator == end:
+            self._pos += 1
+            return True
+        if separator != b',':
+            self._fail("Expected ',' or {0!r}".format(end.decode('ascii')))
+        self._pos += 1
+        return False
+
+    def _fail(self, message):
+        raise JsonStreamError('{0} at offset {1}'.format(message, self.offset))
+
+    def _begin(self, sink):
+        self._sink = sink
+        self._start = self._pos
+
+    def _end(self):
+        if self._sink is not None and self._pos > self._start:
+            self._sink(self._buffer[self._start:self._pos])
+        self._sink = None
+        self._start = self._pos
+
+    def _more(self):
+        """Reads the next chunk, passing the bytes consumed to the sink."""
+        if self._sink is not None and self._pos > self._start:
+            self._sink(self._buffer[self._start:self._pos])
+        data = self._input.read(self._chunk_size)
+        self._consumed += self._pos
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = self._start = 0
+        return bool(data)
+
+    def _match(self, pattern):
+        """Consumes the bytes matching a pattern, across chunks."""
+        while True:
+            self._pos = pattern.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._more():
+                return
+
+    def _skip_string(self):
+        self._pos += 1
+        while True:
+            self._match(_STRING_CHARS)
+            char = self.peek()
+            if char == b'"':
+                self._pos += 1
+                return
+            if not char:
+                self._fail('Unterminated string')
+            # an escape, with the escaped character
+            self._pos += 1
+            if not self.peek():
+                self._fail('Unterminated string')
+            self._pos += 1
+
+    def _skip_container(self):
+        """Skips the rest of a container, up to its end."""
+        depth = 1
+        while True:
+            self._match(_CONTAINER_CHARS)
+            char = self.peek()
+            if char == b'"':
+                self._skip_string()
+            elif char in (b'{', b'['):
+                depth += 1
+                self._pos += 1
+            elif char in (b'}', b']'):
+                depth -= 1
+                self._pos += 1
+                if not depth:
+                    return
+            else:
+                self._fail('Unterminated container')
+
+    def _skip_value(self):
+        first = self.peek()
+        if first == b'"':
+            self._skip_string()
+        elif first in (b'{', b'['):
+            self._pos += 1
+            self._skip_container()
+        else:
+            offset = self.offset
+            self._match(_SCALAR_CHARS)
+            if self.offset == offset:
+                self._fail('Expected a value')
@@ -0,0 +1,48 @@
+""" Random documents and operations shared by the randomized tests """
+
+from __future__ import unicode_literals
+
+
+KEYS = ['a', 'b', 'c', '0', '1']
+STRINGS = ['foo', 'bar', 'Foo', 'BAR', 'baz']
+
+
+def random_value(rnd, depth):
+    kind = rnd.randint(0, 4 if depth > 0 else 2)
+    if kind == 0:
+        return rnd.choice(STRINGS)
+    if kind == 1:
+        return rnd.randint(0, 5)
+    if kind == 2:
+        return None
+    if kind == 3:
+        return [random_value(rnd, depth - 1) for _ in range(rnd.randint(0, 3))]
+    return dict((rnd.choice(KEYS), random_value(rnd, depth - 1)) for _ in range(rnd.randint(0, 3)))
+
+
+def random_path(rnd):
+    return '/' + '/'.join(rnd.choice(KEYS) for _ in range(rnd.randint(1, 3)))
+
+
+def random_operation(rnd):
+    path = random_path(rnd)
+    kind = rnd.randint(0, 5)
+    if kind == 0:
+        cmp = rnd.choice(['equals', 'notequals', 'startswith', 'endswith', 'range', 'length', 'in'])
+        value = {
+            'range': (1, 3),
+            'length': 2,
+            'startswith': 'f',
+            'endswith': 'r',
+        }.get(cmp, rnd.choice(STRINGS + [1, 2]))
+        return {'op': 'check', 'path': path, 'value': value, 'cmp': cmp}
+    if kind == 1:
+        mut = rnd.choice(['uppercase', 'lowercase', 'init', 'slice'])
+        return {'op': 'mutate', 'path': path, 'mut': mut, 'value': [0, 1] if mut == 'slice' else 'init'}
+    if kind == 2:
+        return {'op': 'merge', 'path': path, 'value': random_value(rnd, 1)}
+    if kind == 3:
+        return {'op': 'add', 'path': path, 'value': random_value(rnd, 1)}
+    if kind == 4:
+        return {'op': 'remove', 'path': path}
+    return {'op': 'replace', 'path': path, 'value': random_value(rnd, 1)}
@@ -0,0 +1,237 @@
+import asyncio
+import unittest
+import warnings
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.aio import gather
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class Lookup(object):
+    """An asynchronous service, recording the calls in progress."""
+
+    def __init__(self, values):
+        self.values = values
+        self.running = 0
+        self.max_running = 0
+
+    async def get(self, key):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+            return self.values.get(key)
+        finally:
+            self.running -= 1
+
+
+class ApplyAsyncTestCase(unittest.TestCase):
+
+    def test_awaitable_custom(self):
+        lookup = Lookup({'bar': 'BAR', 'baz': 'BAZ'})
+
+        async def known(current, compare):
+            if await lookup.get(current) is None:
+                raise jsonpatch.JsonPatchTestFailed('{0} is unknown'.format(current))
+
+        async def translate(current, value):
+            return await lookup.get(current)
+
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/a', 'value': None, 'cmp': 'custom', 'comparator': known},
+            {'op': 'check', 'path': '/b', 'value': None, 'cmp': 'custom', 'comparator': known},
+            {'op': 'mutate', 'path': '/a', 'mut': 'custom', 'mutator': translate},
+            {'op': 'mutate', 'path': '/b', 'mut': ['uppercase', ('custom', translate)]},
+            {'op': 'add', 'path': '/c', 'value': 1},
+        ])
+        obj = {'a': 'bar', 'b': 'baz'}
+        self.assertEqual(run(patch.apply_async(obj)), {'a': 'BAR', 'b': None, 'c': 1})
+        self.assertEqual(obj, {'a': 'bar', 'b': 'baz'})
+        # the checks, then the mutations, run concurrently
+        self.assertEqual(lookup.max_running, 2)
+
+        self.assertEqual(run(patch.compile().apply_async(obj)), {'a': 'BAR', 'b': None, 'c': 1})
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, run, patch.apply_async({'a': 'bar', 'b': 'qux'}))
+
+    def test_dependent_operations(self):
+        order = []
+
+        def mutator(name):
+            async def mutate(current, value):
+                order.append(name)
+                await asyncio.sleep(0.01 if name == 'first' else 0)
+                return current + [name]
+            return mutate
+
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'mutate', 'path': '/a', 'mut': 'custom', 'mutator': mutator('first')},
+            {'op': 'mutate', 'path': '/a', 'mut': 'custom', 'mutator': mutator('second')},
+        ])
+        self.assertEqual(run(patch.apply_async({'a': []})), {'a': ['first', 'second']})
+
+    def test_first_failure(self):
+        async def fail(current, compare):
+            await asyncio.sleep(compare)
+            raise jsonpatch.JsonPatchTestFailed(str(compare))
+
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/a', 'value': 0.02, 'cmp': 'custom', 'comparator': fail},
+            {'op': 'check', 'path': '/a', 'value': 0, 'cmp': 'custom', 'comparator': fail},
+        ])
+        with self.assertRaises(jsonpatch.JsonPatchTestFailed) as context:
+            run(patch.apply_async({'a': 1}))
+        self.assertEqual(str(context.exception), '0.02')
+
+    def test_synchronous(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'add', 'path': '/a', 'value': 1},
+            {'op': 'mutate', 'path': '/b', 'mut': 'custom', 'mutator': lambda current, value: 2},
+        ])
+        obj = {}
+        self.assertEqual(run(patch.apply_async(obj, in_place=True)), {'a': 1, 'b': 2})
+        self.assertEqual(obj, {'a': 1, 'b': 2})
+
+    def test_wildcard(self):
+        async def positive(current, compare):
+            await asyncio.sleep(0)
+            if current <= 0:
+                raise jsonpatch.JsonPatchTestFailed('not positive')
+
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/items/*', 'wildcard': True, 'value': None, 'cmp': 'custom',
+             'comparator': positive, 'quantifier': 'any'},
+        ])
+        self.assertEqual(run(patch.apply_async({'items': [0, 1]})), {'items': [0, 1]})
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, run, patch.apply_async({'items': [0, -1]}))
+        self.assertTrue(run(patch.check_async({'items': [0, 1]})))
+
+
+class SynchronousTestCase(unittest.TestCase):
+
+    def test_awaitable_rejected(self):
+        async def passes(current, compare):
+            pass
+
+        async def double(current, value):
+            return current * 2
+
+        check = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/a', 'value': None, 'cmp': 'custom', 'comparator': passes}])
+        mutate = jsonpatchext.JsonPatchExt([
+            {'op': 'mutate', 'path': '/a', 'mut': 'custom', 'mutator': double}])
+        chain = jsonpatchext.JsonPatchExt([
+            {'op': 'mutate', 'path': '/a', 'mut': ['uppercase', ('custom', double)]}])
+        wildcard = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/*', 'wildcard': True, 'value': None, 'cmp': 'custom', 'comparator': passes}])
+
+        for patch in (check, mutate, chain, wildcard):
+            for compiled in (patch, patch.compile(), patch.compile(engine='codegen')):
+                with warnings.catch_warnings():
+                    # a coroutine never awaited would only warn
+                    warnings.simplefilter('error', RuntimeWarning)
+                    self.assertRaises(jsonpatch.InvalidJsonPatch, compiled.apply, {'a': 'b'})
+                    if patch is not mutate and patch is not chain:
+                        self.assertRaises(jsonpatch.InvalidJsonPatch, compiled.check, {'a': 'b'})
+        self.assertEqual(run(mutate.apply_async({'a': 'b'})), {'a': 'bb'})
+
+    def test_awaitable_registered(self):
+        async def passes(current, compare):
+            pass
+
+        async def double(current, value):
+            return current * 2
+
+        self.addCleanup(setattr, jsonpatchext.CheckOperation, 'comparators', jsonpatchext.CheckOperation.comparators)
+        self.addCleanup(setattr, jsonpatchext.MutateOperation, 'mutators', jsonpatchext.MutateOperation.mutators)
+        jsonpatchext.register_comparator('async_passes', passes)
+        jsonpatchext.register_mutator('async_double', double)
+
+        for operation in ({'op': 'check', 'path': '/a', 'value': None, 'cmp': 'async_passes'},
+                          {'op': 'mutate', 'path': '/a', 'mut': 'async_double'}):
+            patch = jsonpatchext.JsonPatchExt([operation])
+            for compiled in (patch, patch.compile(), patch.compile(engine='codegen')):
+                with warnings.catch_warnings():
+                    warnings.simplefilter('error', RuntimeWarning)
+                    self.assertRaises(jsonpatch.InvalidJsonPatch, compiled.apply, {'a': 'b'})
+
+
+class CheckAsyncTestCase(unittest.TestCase):
+
+    def test_check(self):
+        lookup = Lookup({'bar': True})
+
+        async def known(current, compare):
+            if not await lookup.get(current):
+                raise jsonpatch.JsonPatchTestFailed('{0} is unknown'.format(current))
+
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/a', 'value': None, 'cmp': 'custom', 'comparator': known},
+            {'op': 'check', 'path': '/b', 'value': None, 'cmp': 'custom', 'comparator': known},
+            {'op': 'check', 'path': '/c', 'value': 1, 'cmp': 'equals'},
+        ])
+        self.assertTrue(run(patch.check_async({'a': 'bar', 'b': 'bar', 'c': 1})))
+        self.assertEqual(lookup.max_running, 2)
+        self.assertFalse(run(patch.check_async({'a': 'bar', 'b': 'qux', 'c': 1})))
+        self.assertFalse(run(patch.compile().check_async({'a': 'bar', 'c': 1})))
+
+        # the synchronous checks fail first
+        lookup.max_running = 0
+        self.assertFalse(run(patch.check_async({'a': 'bar', 'b': 'bar', 'c': 2})))
+        self.assertEqual(lookup.max_running, 0)
+
+        self.assertRaises(jsonpatch.InvalidJsonPatch, jsonpatchext.JsonPatchExt([
+            {'op': 'add', 'path': '/a', 'value': 1}]).compile().check_async, {})
+
+
+class GatherTestCase(unittest.TestCase):
+
+    def test_bounded(self):
+        lookup = Lookup({})
+
+        async def apply(doc):
+            await lookup.get(doc)
+            return doc * 2
+
+        self.assertEqual(run(gather(apply, range(10), concurrency=3)), [x * 2 for x in range(10)])
+        self.assertEqual(lookup.max_running, 3)
+
+    def test_backpressure(self):
+        produced = []
+
+        async def items():
+            for item in range(6):
+                produced.append(item)
+                yield item
+
+        async def apply(item):
+            # no more items than the workers were taken
+            self.assertLessEqual(len(produced), item + 2)
+            await asyncio.sleep(0)
+            return item
+
+        self.assertEqual(run(gather(apply, items(), concurrency=2)), list(range(6)))
+
+    def test_exceptions(self):
+        async def apply(item):
+            if item == 1:
+                raise ValueError(item)
+            await asyncio.sleep(0.01)
+            return item
+
+        results = run(gather(apply, range(3), return_exceptions=True))
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual([results[0], results[2]], [0, 2])
+        self.assertRaises(ValueError, run, gather(apply, range(3)))
+
+    def test_patches(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'add', 'path': '/foo', 'value': 1}]).compile()
+        self.assertEqual(run(gather(patch.apply_async, [{}, {'bar': 2}])), [{'foo': 1}, {'bar': 2, 'foo': 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+from __future__ import unicode_literals
+
+import random
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext import batch
+
+
+def MyComparatorStartsWith(current, compare):
+    if not current.startswith(compare):
+        raise jsonpatch.JsonPatchTestFailed('{0} does not start with {1}'.format(current, compare))
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def test_check_many(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/age', 'value': (18, 65), 'cmp': 'range'},
+            {'op': 'check', 'path': '/name', 'value': 'b', 'cmp': 'custom', 'comparator': MyComparatorStartsWith},
+        ])
+        docs = [{'age': 20, 'name': 'bar'}, {'age': 70, 'name': 'bar'}, {'age': 20, 'name': 'foo'}, {'name': 'bar'}]
+        self.assertEqual([bool(x) for x in patch.check_many(docs)], [True, False, False, False])
+        self.assertEqual([bool(x) for x in patch.compile().check_many(docs)], [True, False, False, False])
+
+    def test_evaluate_many(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/tags', 'value': 2, 'cmp': 'length'},
+            {'op': 'check', 'path': '/kind', 'value': ['a', 'b'], 'cmp': 'invalue'},
+        ])
+        mask, masks = patch.evaluate_many([{'tags': [1, 2], 'kind': 'a'}, {'tags': [], 'kind': 'b'}])
+        self.assertEqual([bool(x) for x in mask], [True, False])
+        self.assertEqual([[bool(x) for x in m] for m in masks], [[True, False], [True, True]])
+
+    def test_only_checks(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'add', 'path': '/a', 'value': 1}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.check_many, [{}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.compile().check_many, [{}])
+
+    def test_same_as_check(self):
+        rnd = random.Random(42)
+        values = [0, 1, 2, 2.5, float('nan'), True, 'a', 'ab', 'b', '', None, [1, 2], {'a': 1}, 2 ** 60]
+        operations = [
+            {'op': 'check', 'path': '/v', 'value': 1, 'cmp': 'equals'},
+            {'op': 'check', 'path': '/v', 'value': 'a', 'cmp': 'notequals'},
+            {'op': 'check', 'path': '/v', 'value': (0, 2), 'cmp': 'range'},
+            {'op': 'check', 'path': '/v', 'value': 'a', 'cmp': 'in'},
+            {'op': 'check', 'path': '/v', 'value': [1, 2.5, 'ab'], 'cmp': 'invalue'},
+            {'op': 'check', 'path': '/v', 'value': 2, 'cmp': 'length'},
+            {'op': 'check', 'path': '/v', 'value': (int, float), 'cmp': 'isa'},
+            {'op': 'check', 'path': '/v', 'value': 'a.', 'cmp': 'regex'},
+        ]
+
+        def check(patch, doc):
+            try:
+                return patch.check(doc)
+            except Exception as e:
+                return type(e)
+
+        for operation in operations:
+            patch = jsonpatchext.JsonPatchExt([operation])
+            for _ in range(50):
+                # homogeneous and mixed columns
+                pool = rnd.choice([values, values[:5], values[6:10]])
+                docs = [{'v': rnd.choice(pool)} if rnd.random() > 0.1 else {} for _ in range(20)]
+                expected = [check(patch, doc) for doc in docs]
+                if any(not isinstance(result, bool) for result in expected):
+                    continue
+                self.assertEqual([bool(x) for x in patch.check_many(docs)], expected, operation)
+
+    def test_without_numpy(self):
+        numpy, batch.numpy = batch.numpy, None
+        try:
+            patch = jsonpatchext.JsonPatchExt([{'op': 'check', 'path': '/v', 'value': 1, 'cmp': 'equals'}])
+            self.assertEqual(patch.check_many([{'v': 1}, {'v': 2}]), [True, False])
+        finally:
+            batch.numpy = numpy
+
+
+if __name__ == '__main__':
+    unittest.main()
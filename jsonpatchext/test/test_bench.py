@@ -0,0 +1,50 @@
+from __future__ import unicode_literals
+
+import json
+import random
+import unittest
+
+import jsonpatchext
+from jsonpatchext import bench
+
+
+class BenchTestCase(unittest.TestCase):
+
+    def test_run(self):
+        options = bench.parse_args(['--records', '5', '--depth', '2', '--width', '2', '--operations', '3',
+                                    '--repeat', '1', '--number', '1'])
+        results = bench.run(options)
+        json.dumps(results)
+
+        names = set((result['group'], result['name']) for result in results['results'])
+        for cmp in bench.COMPARATORS:
+            self.assertIn(('check', cmp), names)
+        for mut in bench.MUTATORS:
+            self.assertIn(('mutate', mut), names)
+        for op in bench.CORE_OPERATIONS:
+            self.assertIn(('core', op), names)
+        self.assertIn(('merge', 'merge'), names)
+        self.assertIn(('diff', 'make_patch'), names)
+        self.assertIn(('diff', 'shared'), names)
+
+    def test_filter(self):
+        options = bench.parse_args(['--records', '3', '--operations', '2', '--repeat', '1', '--number', '1',
+                                    '--filter', 'core/add/', '--filter', '/codegen'])
+        labels = set('{group}/{name}/{engine}'.format(**result) for result in bench.run(options)['results'])
+        self.assertIn('core/add/jsonpatch', labels)
+        self.assertIn('mutate/uppercase/codegen', labels)
+        self.assertNotIn('mutate/uppercase/prepared', labels)
+
+    def test_patches_apply(self):
+        rnd = random.Random(1)
+        doc = bench.generate_document(rnd, 6, 2, 2)
+        for cmp in bench.COMPARATORS:
+            self.assertTrue(jsonpatchext.JsonPatchExt(bench.generate_patch('check', cmp, doc, 6)).check(doc), cmp)
+        for mut in bench.MUTATORS:
+            jsonpatchext.JsonPatchExt(bench.generate_patch('mutate', mut, doc, 6)).apply(doc)
+        for op in bench.CORE_OPERATIONS:
+            jsonpatchext.JsonPatchExt(bench.generate_patch('core', op, doc, 6)).apply(doc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+from __future__ import unicode_literals
+
+import re
+import threading
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.cache import LRUCache, compile_pattern, pattern_cache, parse_patch, patch_cache
+from jsonpatchext.codegen import compile_patch
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.get('b', 'default'), 'default')
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, LRUCache, 0)
+
+    def test_stats(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('b')
+        cache.put('b', 2)
+        cache.put('c', 3)
+        self.assertEqual(cache.stats(), (1, 1, 1, 2, 0))
+
+    def test_maxbytes(self):
+        cache = LRUCache(10, maxbytes=10, sizeof=lambda key, value: len(value))
+        cache.put('a', 'xxxx')
+        cache.put('b', 'xxxx')
+        cache.put('a', 'xxxxx')
+        self.assertEqual(cache.stats().bytes, 9)
+        cache.put('c', 'xxxx')
+        self.assertEqual(list(cache._data), ['a', 'c'])
+        self.assertEqual(cache.stats().bytes, 9)
+        self.assertEqual(cache.stats().evictions, 1)
+        # larger than the cache
+        cache.put('d', 'x' * 11)
+        self.assertNotIn('d', cache)
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual(cache.stats().bytes, 0)
+        self.assertRaises(ValueError, LRUCache, 10, maxbytes=10)
+
+    def test_threads(self):
+        cache = LRUCache(50)
+
+        def worker(offset):
+            for i in range(2000):
+                cache.put((offset + i) % 100, i)
+                cache.get(i % 100)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache), 50)
+
+
+class CompilePatternTestCase(unittest.TestCase):
+
+    def test_compile(self):
+        compiled = compile_pattern('^fo+$')
+        self.assertIs(compile_pattern('^fo+$'), compiled)
+        self.assertIn((type(''), '^fo+$'), pattern_cache)
+        self.assertIs(compile_pattern(compiled), compiled)
+
+        other = re.compile('bar')
+        self.assertIs(compile_pattern(other), other)
+
+
+class ParsePatchTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        text = '[{"op": "mutate", "path": "/a", "mut": "uppercase"}]'
+        prepared = parse_patch(text)
+        self.assertIsInstance(prepared, jsonpatchext.PreparedPatch)
+        self.assertIs(parse_patch(text), prepared)
+        self.assertIsNot(parse_patch(text.encode('utf-8')), prepared)
+        self.assertEqual(prepared.apply({'a': 'b'}), {'a': 'B'})
+
+    def test_apply_patch(self):
+        text = '[{"op": "add", "path": "/b", "value": [1]}]'
+        hits = patch_cache.stats().hits
+        self.assertEqual(jsonpatchext.apply_patch({}, text), {'b': [1]})
+        self.assertEqual(jsonpatchext.apply_patch({}, text), {'b': [1]})
+        self.assertEqual(patch_cache.stats().hits, hits + 1)
+
+    def test_repeated(self):
+        # the values of the cached patch are not modified by later operations
+        text = ('[{"op": "merge", "path": "/a", "value": {"n": {"x": 1}}},'
+                ' {"op": "mutate", "path": "/b", "mut": "init", "value": {}},'
+                ' {"op": "merge", "path": "/a/n", "value": {"y": 2}},'
+                ' {"op": "add", "path": "/b/c", "value": 3}]')
+        expected = {'a': {'n': {'x': 1, 'y': 2}}, 'b': {'c': 3}}
+        for _ in range(3):
+            self.assertEqual(jsonpatchext.apply_patch({'a': {}}, text), expected)
+            self.assertEqual(parse_patch(text).apply({'a': {}}, in_place=True), expected)
+            self.assertEqual(compile_patch(parse_patch(text)).apply({'a': {}}), expected)
+
+    def test_invalid(self):
+        text = '[{"op": "unknown", "path": "/a"}]'
+        self.assertRaises(jsonpatch.InvalidJsonPatch, parse_patch, text)
+        self.assertNotIn((type(text), text), patch_cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+from __future__ import unicode_literals
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from jsonpatchext.cli import parse_args, run, ordered_map, chunked
+
+
+class CLITestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def run_cli(self, args, stdin=''):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = run(parse_args(args), io.StringIO(stdin), stdout, stderr)
+        errors = [json.loads(line) for line in stderr.getvalue().splitlines()]
+        return status, [json.loads(line) for line in stdout.getvalue().splitlines()], errors
+
+    def test_apply(self):
+        patch = self.write('patch.json', '[{"op": "add", "path": "/c", "value": 3}, '
+                                         '{"op": "mutate", "path": "/a", "mut": "uppercase"}]')
+        records = self.write('records.jsonl', '{"a": "x"}\n\n{"a": 1}\nnot json\n{"a": "é"}\n')
+        status, output, errors = self.run_cli(['apply', '-p', patch, records])
+        self.assertEqual(status, 1)
+        self.assertEqual(output, [{'a': 'X', 'c': 3}, {'a': 'É', 'c': 3}])
+        self.assertEqual([(error['input'], error['line']) for error in errors], [(records, 3), (records, 4)])
+        self.assertTrue(errors[0]['error'].startswith('InvalidJsonPatch: '))
+
+    def test_record_patches(self):
+        stdin = ''.join(json.dumps({'doc': {'a': index}, 'patch': [
+            {'op': 'check', 'path': '/a', 'value': 1, 'cmp': 'equals'}]}) + '\n' for index in range(3))
+        self.assertEqual(self.run_cli(['check'], stdin), (0, [False, True, False], []))
+        status, output, errors = self.run_cli(['apply'], stdin + '{"doc": {}}\n')
+        self.assertEqual((status, output, len(errors)), (1, [{'a': 1}], 3))
+
+    def test_check(self):
+        patch = self.write('patch.json', '[{"op": "check", "path": "/a", "value": [0, 10], "cmp": "range"}]')
+        self.assertEqual(self.run_cli(['check', '--patch', patch, '-'], '{"a": 1}\n{"a": 20}\n'),
+                         (0, [True, False], []))
+
+    def test_invalid_patch(self):
+        patch = self.write('patch.json', '[{"op": "add", "path": "/a", "value": 1}]')
+        stderr = io.StringIO()
+        self.assertEqual(run(parse_args(['check', '-p', patch]), io.StringIO(''), io.StringIO(), stderr), 2)
+        self.assertIn("Unknown operation 'add'", stderr.getvalue())
+        self.assertEqual(run(parse_args(['apply', '-p', patch + '.missing']), io.StringIO(''), io.StringIO(),
+                             io.StringIO()), 2)
+
+    def test_diff(self):
+        self.assertEqual(self.run_cli(['diff'], '[{"a": 1}, {"a": 2}]\n{"a": 1}\n'),
+                         (1, [[{'op': 'replace', 'path': '/a', 'value': 2}]], [{
+                             'input': '-', 'line': 2, 'error': 'ValueError: diff records must be [src, dst] arrays'}]))
+
+    def test_workers(self):
+        patch = self.write('patch.json', '[{"op": "add", "path": "/b", "value": 1}]')
+        stdin = ''.join('{"a": %d}\n' % index for index in range(50)) + '[]\n'
+        status, output, errors = self.run_cli(['apply', '-p', patch, '-w', '2', '--chunk-size', '3'], stdin)
+        self.assertEqual(status, 1)
+        self.assertEqual(output, [{'a': index, 'b': 1} for index in range(50)])
+        self.assertEqual([error['line'] for error in errors], [51])
+
+
+class _SyncResult(object):
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _SyncPool(object):
+
+    def apply_async(self, func, args):
+        return _SyncResult(func(*args))
+
+
+class OrderedMapTestCase(unittest.TestCase):
+
+    def test_window(self):
+        pool = _SyncPool()
+        consumed = []
+
+        def items():
+            for item in range(10):
+                consumed.append(item)
+                yield item
+
+        results = ordered_map(pool, lambda x: x * 2, items(), 3)
+        self.assertEqual(next(results), 0)
+        self.assertEqual(len(consumed), 3)
+        self.assertEqual(list(results), [x * 2 for x in range(1, 10)])
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+
+if __name__ == '__main__':
+    unittest.main()
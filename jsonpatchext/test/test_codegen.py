@@ -0,0 +1,81 @@
+from __future__ import unicode_literals
+
+import random
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.codegen import compile_patch
+from jsonpatchext.test.helpers import random_value, random_operation
+
+
+def outcome(func, *args):
+    try:
+        return 'ok', func(*args)
+    except (jsonpatch.JsonPatchException, jsonpatch.JsonPointerException, TypeError, AttributeError) as e:
+        return 'error', type(e)
+
+
+class CodegenTestCase(unittest.TestCase):
+
+    def test_apply(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo/bar', 'value': 'baz', 'cmp': 'equals'},
+            {'op': 'merge', 'path': '/foo', 'value': {'corge': 'grault'}},
+            {'op': 'mutate', 'path': '/foo/corge', 'mut': 'uppercase'},
+            {'op': 'check', 'path': '/list/1', 'value': (1, 3), 'cmp': 'range'},
+        ]).compile(engine='codegen')
+        obj = {'foo': {'bar': 'baz'}, 'list': [0, 2]}
+        self.assertEqual(patch.apply(obj), {'foo': {'bar': 'baz', 'corge': 'GRAULT'}, 'list': [0, 2]})
+        self.assertEqual(obj, {'foo': {'bar': 'baz'}, 'list': [0, 2]})
+
+    def test_exceptions(self):
+        def apply(patch_obj, obj):
+            return compile_patch(jsonpatchext.JsonPatchExt(patch_obj)).apply(obj)
+
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, apply,
+                          [{'op': 'check', 'path': '/foo', 'value': 'x', 'cmp': 'equals'}], {'foo': 'y'})
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, apply,
+                          [{'op': 'check', 'path': '/foo/bar', 'value': 'x', 'cmp': 'equals'}], {'foo': []})
+        self.assertRaises(jsonpatch.JsonPatchConflict, apply,
+                          [{'op': 'mutate', 'path': '/foo/3', 'mut': 'uppercase'}], {'foo': []})
+        self.assertRaises(jsonpatch.InvalidJsonPatch, apply,
+                          [{'op': 'mutate', 'path': '/foo', 'mut': 'uppercase'}], {'foo': 1})
+        self.assertRaises(jsonpatch.InvalidJsonPatch, apply,
+                          [{'op': 'merge', 'path': '/foo', 'value': [1]}], {'foo': {}})
+
+    def test_hoisted_order(self):
+        operations = [{'op': 'add', 'path': '/x{0}'.format(index), 'value': index} for index in range(9)]
+        operations[1] = {'op': 'check', 'path': '/n', 'value': 'a', 'cmp': 'startswith'}
+        operations[8] = {'op': 'check', 'path': '/a', 'value': 1, 'cmp': 'equals'}
+        patch = jsonpatchext.JsonPatchExt(operations)
+        obj = {'n': 5, 'a': 2}
+        self.assertRaises(AttributeError, patch.apply, obj)
+        self.assertRaises(AttributeError, patch.compile(engine='codegen').apply, obj)
+
+    def test_check(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': 'b', 'cmp': 'startswith'},
+            {'op': 'check', 'path': '/bar', 'value': int, 'cmp': 'isa'},
+        ]).compile(engine='codegen')
+        self.assertTrue(patch.check({'foo': 'baz', 'bar': 1}))
+        self.assertFalse(patch.check({'foo': 'qux', 'bar': 1}))
+        self.assertFalse(patch.check({'foo': 'baz', 'bar': 'x'}))
+        self.assertFalse(patch.check({'foo': 'baz'}))
+
+    def test_differential(self):
+        rnd = random.Random(6902)
+        for _ in range(2000):
+            obj = random_value(rnd, 3)
+            patch = jsonpatchext.JsonPatchExt([random_operation(rnd) for _ in range(rnd.randint(1, 4))])
+            generated = patch.compile(engine='codegen')
+            self.assertEqual(outcome(patch.apply, obj), outcome(generated.apply, obj), generated.source)
+
+            check_patch = jsonpatchext.JsonPatchExt([op for op in patch.patch if op['op'] == 'check'])
+            generated = check_patch.compile(engine='codegen')
+            self.assertEqual(outcome(check_patch.check, obj), outcome(generated.check, obj), generated.source)
+
+
+if __name__ == '__main__':
+    unittest.main()
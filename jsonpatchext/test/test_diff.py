@@ -0,0 +1,168 @@
+from __future__ import unicode_literals
+
+import copy
+import json
+import random
+import unittest
+
+import jsonpatchext
+from jsonpatchext.diff import diff, StructuralHasher
+
+
+def strict(value):
+    """A representation telling 1, 1.0 and True apart."""
+    return json.dumps(value, sort_keys=True)
+
+
+class DiffTestCase(unittest.TestCase):
+
+    def assertDiff(self, src, dst, expected, **kwargs):
+        operations = diff(src, dst, **kwargs)
+        self.assertEqual(operations, expected)
+        self.assertEqual(strict(jsonpatchext.apply_patch(src, operations)), strict(dst))
+
+    def test_equal(self):
+        doc = {'a': [1, {'b': 2}]}
+        self.assertDiff(doc, copy.deepcopy(doc), [])
+        self.assertDiff(doc, doc, [])
+
+    def test_types(self):
+        self.assertDiff({'a': 1}, {'a': True}, [{'op': 'replace', 'path': '/a', 'value': True}])
+        self.assertDiff({'a': 1}, {'a': 1.0}, [{'op': 'replace', 'path': '/a', 'value': 1.0}])
+        self.assertDiff({'a': [1]}, {'a': {'0': 1}}, [{'op': 'replace', 'path': '/a', 'value': {'0': 1}}])
+        self.assertDiff([1], {}, [{'op': 'replace', 'path': '', 'value': {}}])
+
+    def test_object(self):
+        self.assertDiff({'a': 1, 'b': {'c': 1, 'd': 2}, 'e': 3}, {'b': {'c': 2, 'd': 2}, 'e': 3, 'f/~': 4}, [
+            {'op': 'remove', 'path': '/a'},
+            {'op': 'replace', 'path': '/b/c', 'value': 2},
+            {'op': 'add', 'path': '/f~1~0', 'value': 4},
+        ])
+
+    def test_renamed_member(self):
+        self.assertDiff({'a': {'big': [1, 2, 3]}, 'b': 1}, {'c': {'big': [1, 2, 3]}, 'b': 1}, [
+            {'op': 'move', 'from': '/a', 'path': '/c'},
+        ])
+
+    def test_array(self):
+        self.assertDiff([1, 2, 3, 4], [1, 3, 4, 5], [
+            {'op': 'remove', 'path': '/1'},
+            {'op': 'add', 'path': '/3', 'value': 5},
+        ])
+        self.assertDiff([{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}], [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'c'}], [
+            {'op': 'replace', 'path': '/1/name', 'value': 'c'},
+        ])
+
+    def test_array_moves(self):
+        self.assertDiff(['a', 'b', 'c', 'd'], ['b', 'c', 'd', 'a'], [
+            {'op': 'move', 'from': '/0', 'path': '/3'},
+        ])
+        self.assertDiff(['a', 'b', 'c', 'd'], ['d', 'a', 'b', 'c'], [
+            {'op': 'move', 'from': '/3', 'path': '/0'},
+        ])
+        self.assertDiff([{'x': 1}, {'y': 2}], [{'y': 2}, {'x': 1}], [
+            {'op': 'move', 'from': '/1', 'path': '/0'},
+        ])
+        self.assertDiff(['a', 'b', 'c'], ['c', 'b', 'a'], [
+            {'op': 'move', 'from': '/2', 'path': '/0'},
+            {'op': 'move', 'from': '/2', 'path': '/1'},
+        ])
+        self.assertDiff(['a', 'b'], ['b', 'a'], [
+            {'op': 'remove', 'path': '/1'},
+            {'op': 'add', 'path': '/0', 'value': 'b'},
+        ], moves=False)
+
+    def test_merge(self):
+        src = {'a': {'b': 1, 'list': [1]}, 'c': 1}
+        dst = {'a': {'b': 1, 'list': [1, 2], 'd': {'e': 1}}, 'c': 1, 'f': 2}
+        self.assertDiff(src, dst, [{'op': 'merge', 'path': '', 'value': {'a': {'list': [2], 'd': {'e': 1}}, 'f': 2}}],
+                        merge=True)
+        # a single change stays an add
+        self.assertDiff(src, {'a': {'b': 1, 'list': [1]}, 'c': 1, 'f': 2}, [{'op': 'add', 'path': '/f', 'value': 2}],
+                        merge=True)
+        # not only additions
+        self.assertDiff(src, {'a': {'b': 2, 'list': [1], 'd': 1, 'e': 2}, 'c': 1}, [
+            {'op': 'replace', 'path': '/a/b', 'value': 2},
+            {'op': 'add', 'path': '/a/d', 'value': 1},
+            {'op': 'add', 'path': '/a/e', 'value': 2},
+        ], merge=True)
+
+    def test_shared_subtrees(self):
+        src = {'big': [{'n': n} for n in range(1000)], 'small': {'a': 1}}
+        dst = jsonpatchext.apply_patch(src, [{'op': 'replace', 'path': '/small/a', 'value': 2}], copy_on_write=True)
+        self.assertIs(dst['big'], src['big'])
+        self.assertEqual(diff(src, dst), [{'op': 'replace', 'path': '/small/a', 'value': 2}])
+
+    def test_make_patch(self):
+        patch = jsonpatchext.make_patch({'a': [1, 2]}, {'a': [1, 2, 3], 'b': {}}, merge=True)
+        self.assertIsInstance(patch, jsonpatchext.JsonPatchExt)
+        self.assertEqual(patch.patch, [{'op': 'merge', 'path': '', 'value': {'a': [3], 'b': {}}}])
+
+
+class StructuralHasherTestCase(unittest.TestCase):
+
+    def test_hash(self):
+        hasher = StructuralHasher()
+        self.assertEqual(hasher({'a': [1, {'b': None}], 'c': 'x'}), hasher({'c': 'x', 'a': [1, {'b': None}]}))
+        self.assertNotEqual(hasher([1, 2]), hasher([2, 1]))
+        self.assertEqual(len(set([hasher(1), hasher(1.0), hasher(True)])), 3)
+        self.assertNotEqual(hasher({'a': [1]}), hasher({'a': [True]}))
+
+    def test_deep(self):
+        def nested():
+            value = []
+            for _ in range(5000):
+                value = [value]
+            return value
+        self.assertEqual(StructuralHasher()(nested()), StructuralHasher()(nested()))
+
+
+def random_value(rnd, depth=0):
+    kind = rnd.random()
+    if depth > 3 or kind < 0.4:
+        return rnd.choice([0, 1, 2, 1.0, True, False, None, 'a', 'b', '', '~/'])
+    if kind < 0.7:
+        return [random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 5))]
+    return dict((rnd.choice(['a', 'b', 'c', 'd', '/', '~']), random_value(rnd, depth + 1))
+                for _ in range(rnd.randint(0, 4)))
+
+
+def random_edit(rnd, value, depth=0):
+    """Returns a value close to `value`, or a random one."""
+    if rnd.random() < 0.15:
+        return random_value(rnd, depth)
+    if isinstance(value, list):
+        value = [random_edit(rnd, item, depth + 1) if rnd.random() < 0.3 else item for item in value]
+        for _ in range(rnd.randint(0, 2)):
+            action = rnd.random()
+            if action < 0.3 and value:
+                del value[rnd.randrange(len(value))]
+            elif action < 0.6:
+                value.insert(rnd.randint(0, len(value)), random_value(rnd, depth + 1))
+            elif value:
+                value.insert(rnd.randint(0, len(value) - 1), value.pop(rnd.randrange(len(value))))
+        return value
+    if isinstance(value, dict):
+        value = dict((key, random_edit(rnd, item, depth + 1) if rnd.random() < 0.3 else item)
+                     for key, item in value.items() if rnd.random() < 0.9)
+        if rnd.random() < 0.3:
+            value[rnd.choice(['a', 'e', 'f'])] = random_value(rnd, depth + 1)
+        return value
+    return value
+
+
+class DiffRoundTripTestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        rnd = random.Random(20)
+        for _ in range(2000):
+            src = random_value(rnd)
+            dst = random_edit(rnd, src)
+            for kwargs in ({}, {'merge': True}, {'moves': False}):
+                operations = diff(src, dst, **kwargs)
+                result = jsonpatchext.apply_patch(src, operations)
+                self.assertEqual(strict(result), strict(dst), (src, dst, operations, kwargs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.instrumentation import PatchObserver, MetricsObserver, LatencyHistogram
+
+
+class RecordingObserver(PatchObserver):
+
+    def __init__(self):
+        self.operations = []
+        self.patches = []
+
+    def on_operation(self, event):
+        self.operations.append(event)
+
+    def on_patch(self, event):
+        self.patches.append(event)
+
+
+class ObserverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.patch = jsonpatchext.JsonPatchExt([
+            {'op': 'add', 'path': '/foo', 'value': 'bar'},
+            {'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'equals'},
+            {'op': 'mutate', 'path': '/foo', 'mut': 'uppercase'},
+            {'op': 'merge', 'path': '/baz', 'value': {'qux': 1}},
+        ])
+
+    def test_apply(self):
+        for patch in (self.patch, self.patch.compile()):
+            for kwargs in ({}, {'copy_on_write': True}, {'in_place': True, 'atomic': True}):
+                observer = RecordingObserver()
+                result = patch.apply({'baz': {}}, observer=observer, **kwargs)
+                self.assertEqual(result, {'foo': 'BAR', 'baz': {'qux': 1}})
+                self.assertEqual([(event.index, event.op, event.path, event.passed) for event in observer.operations],
+                                 [(0, 'add', '/foo', True), (1, 'check', '/foo', True),
+                                  (2, 'mutate', '/foo', True), (3, 'merge', '/baz', True)])
+                for event in observer.operations:
+                    self.assertGreaterEqual(event.wall, 0)
+                    self.assertGreaterEqual(event.resolve, 0)
+                    self.assertGreaterEqual(event.operation_time, 0)
+                self.assertEqual([(event.kind, event.passed) for event in observer.patches], [('apply', True)])
+
+    def test_apply_failure(self):
+        observer = RecordingObserver()
+        self.assertRaises(jsonpatch.JsonPatchConflict, self.patch.apply, {}, observer=observer)
+        self.assertEqual([(event.op, event.passed) for event in observer.operations],
+                         [('add', True), ('check', True), ('mutate', True), ('merge', False)])
+        self.assertEqual([(event.kind, event.passed) for event in observer.patches], [('apply', False)])
+
+    def test_check(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'equals'},
+            {'op': 'check', 'path': '/baz', 'value': 1, 'cmp': 'equals'},
+        ])
+        observer = RecordingObserver()
+        self.assertFalse(patch.check({'foo': 'bar', 'baz': 2}, observer=observer))
+        self.assertEqual([(event.index, event.passed) for event in observer.operations], [(0, True), (1, False)])
+        self.assertEqual([(event.kind, event.passed) for event in observer.patches], [('check', False)])
+
+        observer = RecordingObserver()
+        self.assertTrue(patch.compile().check({'foo': 'bar', 'baz': 1}, observer=observer))
+        self.assertEqual(len(observer.operations), 2)
+
+
+class MetricsObserverTestCase(unittest.TestCase):
+
+    def test_metrics(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'equals'},
+            {'op': 'mutate', 'path': '/foo', 'mut': 'uppercase'},
+        ])
+        metrics = MetricsObserver()
+        for _ in range(10):
+            patch.apply({'foo': 'bar'}, observer=metrics)
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.apply, {'foo': 'baz'}, observer=metrics)
+
+        self.assertEqual(metrics.operations[('check',)].wall.count, 11)
+        self.assertEqual(metrics.operations[('check',)].failed, 1)
+        self.assertEqual(metrics.operations[('mutate',)].wall.count, 10)
+        self.assertEqual(metrics.patches['apply'].failed, 1)
+
+        summary = metrics.summary().splitlines()
+        self.assertEqual(summary[0].split(), ['operation', 'count', 'failed', 'p50', 'p90', 'p99', 'max',
+                                              'resolve', 'p50'])
+        self.assertEqual(summary[1].split()[:3], ['check', '11', '1'])
+        self.assertEqual(summary[3].split()[:3], ['[apply]', '11', '1'])
+
+        exposition = metrics.prometheus()
+        self.assertIn('# TYPE jsonpatchext_operation_seconds histogram', exposition)
+        self.assertIn('jsonpatchext_operation_seconds_bucket{op="check",le="+Inf"} 11', exposition)
+        self.assertIn('jsonpatchext_operation_seconds_count{op="mutate"} 10', exposition)
+        self.assertIn('jsonpatchext_operation_failures_total{op="check"} 1', exposition)
+        self.assertIn('jsonpatchext_patch_failures_total{kind="apply"} 1', exposition)
+
+        metrics.reset()
+        self.assertEqual(metrics.operations, {})
+
+    def test_by_index(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'equals'},
+            {'op': 'check', 'path': '/foo', 'value': 'b', 'cmp': 'startswith'},
+        ])
+        metrics = MetricsObserver(by_index=True)
+        patch.check({'foo': 'bar'}, observer=metrics)
+        self.assertEqual(sorted(metrics.operations), [('check', 0), ('check', 1)])
+        self.assertIn('op="check",index="1"', metrics.prometheus())
+
+
+class LatencyHistogramTestCase(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram(sub_buckets=16)
+        for value in range(1, 1001):
+            histogram.record(value * 1e-6)
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.max, 1e-3)
+        for percent in (50, 90, 99):
+            expected = percent * 1e-5
+            self.assertLessEqual(abs(histogram.percentile(percent) - expected) / expected, 2.0 / 16)
+        self.assertEqual(histogram.percentile(100), histogram.max)
+
+    def test_count_below(self):
+        histogram = LatencyHistogram()
+        for nanoseconds in (1, 31, 32, 1023, 1024, 1025, 5000):
+            histogram.record(nanoseconds * 1e-9 + 1e-13)
+        self.assertEqual(histogram.count_below(32), 2)
+        self.assertEqual(histogram.count_below(1024), 4)
+        self.assertEqual(histogram.count_below(4096), 6)
+        self.assertEqual(histogram.count_below(2 ** 20), 7)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, LatencyHistogram, 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,17 @@
 from __future__ import unicode_literals
 
+import copy
+import random
+import re
 import sys
 import unittest
 
 import jsonpatch
 
 import jsonpatchext
-from jsonpatchext.mutators import InitItemMutator
+from jsonpatchext.cache import compile_pattern
+from jsonpatchext.mutators import InitItemMutator, UppercaseMutator
+from jsonpatchext.test.helpers import random_value, random_operation, random_path
 
 
 def MyComparatorStartsWith(current, compare):
@@ -229,6 +234,12 @@ class ApplyPatchTestCase(unittest.TestCase):
         res = jsonpatchext.apply_patch(obj, [{'op': 'mutate', 'path': '/foo/bar', 'mut': 'cast', 'value': int}])
         self.assertEqual(res, {'foo': {'bar': 15}})
 
+    def test_mutate_array_item(self):
+        obj = {'foo': ['a', 'b', None]}
+        res = jsonpatchext.apply_patch(obj, [{'op': 'mutate', 'path': '/foo/1', 'mut': 'uppercase'},
+                                             {'op': 'mutate', 'path': '/foo/2', 'mut': 'init', 'value': 'c'}])
+        self.assertEqual(res, {'foo': ['a', 'B', 'c']})
+
     def test_mutate_regex(self):
         obj = {'foo': {'bar': '01/02/03'}}
         res = jsonpatchext.apply_patch(obj, [{'op': 'mutate', 'path': '/foo/bar', 'mut': 'regex',
@@ -281,6 +292,488 @@ class ApplyPatchTestCase(unittest.TestCase):
         self.assertEqual(res2, {'foo': {'bar': {'bin': [1, 3]}}})
 
 
+class PreparedPatchTestCase(unittest.TestCase):
+
+    def test_apply(self):
+        prepared = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo/bar', 'value': 'baz', 'cmp': 'equals'},
+            {'op': 'merge', 'path': '/foo', 'value': {'corge': 'grault'}},
+            {'op': 'mutate', 'path': '/foo/corge', 'mut': 'uppercase'},
+        ]).compile()
+        obj = {'foo': {'bar': 'baz'}}
+        self.assertEqual(prepared.apply(obj), {'foo': {'bar': 'baz', 'corge': 'GRAULT'}})
+        self.assertEqual(prepared.apply(obj), {'foo': {'bar': 'baz', 'corge': 'GRAULT'}})
+        self.assertEqual(obj, {'foo': {'bar': 'baz'}})
+
+    def test_check(self):
+        prepared = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo/bar', 'value': 'b', 'cmp': 'custom', 'comparator': MyComparatorStartsWith},
+        ]).compile()
+        self.assertTrue(prepared.check({'foo': {'bar': 'baz'}}))
+        self.assertFalse(prepared.check({'foo': {'bar': 'qux'}}))
+        self.assertFalse(prepared.check({'foo': {}}))
+
+    def test_check_not_check_operation(self):
+        prepared = jsonpatchext.JsonPatchExt([{'op': 'add', 'path': '/foo', 'value': 1}]).compile()
+        self.assertRaises(jsonpatch.InvalidJsonPatch, prepared.check, {})
+
+    def test_validates_once(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'check', 'path': '/foo', 'value': 1, 'cmp': 'unknown'}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.compile)
+        patch = jsonpatchext.JsonPatchExt([{'op': 'mutate', 'path': '/foo', 'mut': 'custom'}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.compile)
+        patch = jsonpatchext.JsonPatchExt([{'op': 'merge', 'path': '/foo'}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.compile)
+
+    def test_immutable(self):
+        prepared = jsonpatchext.JsonPatchExt([]).compile()
+        self.assertRaises(AttributeError, setattr, prepared, '_ops', ())
+
+
+class CopyOnWriteTestCase(unittest.TestCase):
+
+    def test_shares_untouched(self):
+        obj = {'foo': {'bar': 'baz'}, 'big': {'list': [1, 2, 3]}}
+        res = jsonpatchext.apply_patch(obj, [{'op': 'mutate', 'path': '/foo/bar', 'mut': 'uppercase'}],
+                                       copy_on_write=True)
+        self.assertEqual(res, {'foo': {'bar': 'BAZ'}, 'big': {'list': [1, 2, 3]}})
+        self.assertEqual(obj, {'foo': {'bar': 'baz'}, 'big': {'list': [1, 2, 3]}})
+        self.assertIs(res['big'], obj['big'])
+
+    def test_merge(self):
+        obj = {'foo': {'bar': {'baz': 1}, 'qux': {'quux': 2}}}
+        res = jsonpatchext.apply_patch(obj, [{'op': 'merge', 'path': '/foo', 'value': {'bar': {'corge': 3}}}],
+                                       copy_on_write=True)
+        self.assertEqual(res, {'foo': {'bar': {'baz': 1, 'corge': 3}, 'qux': {'quux': 2}}})
+        self.assertEqual(obj, {'foo': {'bar': {'baz': 1}, 'qux': {'quux': 2}}})
+        self.assertIs(res['foo']['qux'], obj['foo']['qux'])
+
+    def test_custom_mutator(self):
+        obj = {'foo': {'bar': 'baz'}}
+        res = jsonpatchext.apply_patch(obj, [{'op': 'mutate', 'path': '/foo', 'mut': 'custom',
+                                              'mutator': MyMutatorAddKey}], copy_on_write=True)
+        self.assertEqual(res, {'foo': {'bar': 'baz', 'corge': 'grault'}})
+        self.assertEqual(obj, {'foo': {'bar': 'baz'}})
+
+    def test_move_in_list(self):
+        obj = {'foo': [{'a': 1}, {'b': 2}, {'c': 3}]}
+        res = jsonpatchext.apply_patch(obj, [
+            {'op': 'move', 'from': '/foo/0', 'path': '/foo/1/a'},
+            {'op': 'add', 'path': '/foo/1/c2', 'value': 4},
+        ], copy_on_write=True)
+        self.assertEqual(res, {'foo': [{'b': 2}, {'c': 3, 'a': {'a': 1}, 'c2': 4}]})
+        self.assertEqual(obj, {'foo': [{'a': 1}, {'b': 2}, {'c': 3}]})
+
+    def test_same_as_deepcopy(self):
+        rnd = random.Random(5)
+        for _ in range(2000):
+            obj = random_value(rnd, 3)
+            original = copy.deepcopy(obj)
+            operations = []
+            for _ in range(rnd.randint(1, 4)):
+                if rnd.random() < 0.2:
+                    operations.append({'op': rnd.choice(['move', 'copy']), 'from': random_path(rnd),
+                                       'path': random_path(rnd)})
+                elif rnd.random() < 0.1:
+                    operations.append({'op': 'mutate', 'path': random_path(rnd), 'mut': 'custom',
+                                       'mutator': MyMutatorAddKey})
+                else:
+                    operations.append(random_operation(rnd))
+            patch = jsonpatchext.JsonPatchExt(operations)
+            try:
+                expected = patch.apply(obj)
+            except Exception as e:
+                self.assertRaises(type(e), patch.apply, obj, copy_on_write=True)
+            else:
+                self.assertEqual(patch.apply(obj, copy_on_write=True), expected)
+            self.assertEqual(obj, original)
+
+
+class AtomicApplyTestCase(unittest.TestCase):
+
+    def test_rollback(self):
+        obj = {'foo': {'bar': 'baz'}, 'list': [1, 2]}
+        patch_obj = [
+            {'op': 'add', 'path': '/list/0', 'value': 0},
+            {'op': 'merge', 'path': '/foo', 'value': {'corge': 'grault'}},
+            {'op': 'mutate', 'path': '/foo/bar', 'mut': 'uppercase'},
+            {'op': 'check', 'path': '/foo/bar', 'value': 'baz', 'cmp': 'equals'},
+        ]
+        foo = obj['foo']
+        patch = jsonpatchext.JsonPatchExt(patch_obj)
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.apply, obj, in_place=True, atomic=True)
+        self.assertEqual(obj, {'foo': {'bar': 'baz'}, 'list': [1, 2]})
+        self.assertIs(obj['foo'], foo)
+
+    def test_rollback_root(self):
+        obj = {'foo': 'bar'}
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'merge', 'path': '', 'value': {'baz': 'qux'}},
+            {'op': 'remove', 'path': '/missing'},
+        ])
+        self.assertRaises(jsonpatch.JsonPatchConflict, patch.apply, obj, in_place=True, atomic=True)
+        self.assertEqual(obj, {'foo': 'bar'})
+
+    def test_inverse(self):
+        obj = {'foo': {'bar': 'baz'}, 'list': [1, 2]}
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'add', 'path': '/list/-', 'value': 3},
+            {'op': 'move', 'from': '/foo/bar', 'path': '/qux'},
+            {'op': 'mutate', 'path': '/qux', 'mut': 'uppercase'},
+        ])
+        res, inverse = patch.apply_with_inverse(obj)
+        self.assertEqual(res, {'foo': {}, 'list': [1, 2, 3], 'qux': 'BAZ'})
+        self.assertEqual(inverse.apply(res), obj)
+
+    def test_inverse_init(self):
+        obj = {'a': {'x': 1}}
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'mutate', 'path': '/a', 'mut': 'init', 'value': {}},
+            {'op': 'add', 'path': '/a/y', 'value': 2},
+        ])
+        res, inverse = patch.apply_with_inverse(copy.deepcopy(obj))
+        self.assertEqual(res, {'a': {'x': 1, 'y': 2}})
+        self.assertEqual(inverse.apply(res), obj)
+
+    def test_move_into_ancestor(self):
+        cases = [
+            ({'b': {'x': {'y': 1}}}, '/b/x', '/b', {'op': 'test', 'path': '/b/y', 'value': 2}),
+            ([[{'k': 1}]], '/0/0', '/0', {'op': 'test', 'path': '/0/k', 'value': 2}),
+            ({'b': {'x': {'y': 1}}}, '/b/x', '', {'op': 'test', 'path': '/y', 'value': 2}),
+        ]
+        for obj, from_path, path, failing in cases:
+            move = {'op': 'move', 'from': from_path, 'path': path}
+            doc = copy.deepcopy(obj)
+            patch = jsonpatchext.JsonPatchExt([move, failing])
+            self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.apply, doc, in_place=True, atomic=True)
+            self.assertEqual(doc, obj)
+
+            res, inverse = jsonpatchext.JsonPatchExt([move]).apply_with_inverse(obj)
+            self.assertEqual(inverse.apply(res), obj, inverse.patch)
+
+    def test_failed_move_duplicate_siblings(self):
+        for obj in ({'a': [1, 1]}, {'a': ['x', 'x', 'y']}, {'a': [None, None]}):
+            doc = copy.deepcopy(obj)
+            patch = jsonpatchext.JsonPatchExt([{'op': 'move', 'from': '/a/0', 'path': '/b/x'}])
+            self.assertRaises(jsonpatch.JsonPointerException, patch.apply, doc, in_place=True, atomic=True)
+            self.assertEqual(doc, obj)
+
+    def test_same_as_sequential(self):
+        rnd = random.Random(6)
+        for _ in range(2000):
+            obj = random_value(rnd, 3)
+            operations = []
+            for _ in range(rnd.randint(1, 4)):
+                if rnd.random() < 0.2:
+                    operations.append({'op': rnd.choice(['move', 'copy']), 'from': random_path(rnd),
+                                       'path': random_path(rnd)})
+                elif rnd.random() < 0.1:
+                    operations.append({'op': 'mutate', 'path': random_path(rnd), 'mut': 'custom',
+                                       'mutator': MyMutatorAddKey})
+                else:
+                    operations.append(random_operation(rnd))
+            patch = jsonpatchext.JsonPatchExt(operations)
+            doc = copy.deepcopy(obj)
+            try:
+                expected = patch.apply(obj)
+            except Exception as e:
+                self.assertRaises(type(e), patch.apply, doc, in_place=True, atomic=True)
+                self.assertEqual(doc, obj)
+            else:
+                res, inverse = patch.apply_with_inverse(doc, in_place=True)
+                self.assertEqual(res, expected)
+                self.assertEqual(inverse.apply(res), obj, (operations, inverse.patch))
+
+
+class NoDeepCopy(dict):
+
+    def __deepcopy__(self, memo):
+        raise AssertionError('document was copied')
+
+
+class CheckHoistingTestCase(unittest.TestCase):
+
+    def test_rejected_without_copy(self):
+        obj = NoDeepCopy({'foo': 'bar'})
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'add', 'path': '/baz', 'value': 1},
+            {'op': 'check', 'path': '/foo', 'value': 'qux', 'cmp': 'equals'},
+        ])
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.apply, obj)
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.compile().apply, obj)
+        self.assertEqual(obj, {'foo': 'bar'})
+
+    def test_previous_failure_first(self):
+        obj = {'foo': 'bar'}
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'remove', 'path': '/missing'},
+            {'op': 'check', 'path': '/foo', 'value': 'qux', 'cmp': 'equals'},
+        ])
+        self.assertRaises(jsonpatch.JsonPatchConflict, patch.apply, obj)
+        self.assertRaises(jsonpatch.JsonPatchConflict, patch.apply, obj, in_place=True)
+        self.assertRaises(jsonpatch.JsonPatchConflict, patch.compile().apply, obj)
+        self.assertRaises(jsonpatch.JsonPatchConflict, patch.compile(engine='codegen').apply, obj)
+        self.assertEqual(obj, {'foo': 'bar'})
+
+    def test_dependent_not_hoisted(self):
+        obj = {'foo': ['bar']}
+        res = jsonpatchext.apply_patch(obj, [
+            {'op': 'add', 'path': '/foo/0', 'value': 'baz'},
+            {'op': 'check', 'path': '/foo/1', 'value': 'bar', 'cmp': 'equals'},
+            {'op': 'add', 'path': '/qux', 'value': 'baz'},
+            {'op': 'check', 'path': '/qux', 'value': 'baz', 'cmp': 'equals'},
+        ])
+        self.assertEqual(res, {'foo': ['baz', 'bar'], 'qux': 'baz'})
+
+    def test_same_as_sequential(self):
+        rnd = random.Random(7)
+        for _ in range(2000):
+            obj = random_value(rnd, 3)
+            operations = [random_operation(rnd) for _ in range(rnd.randint(1, 5))]
+            patch = jsonpatchext.JsonPatchExt(operations)
+            try:
+                expected = patch.apply(copy.deepcopy(obj), in_place=True)
+            except Exception as e:
+                self.assertRaises(type(e), patch.apply, obj)
+            else:
+                self.assertEqual(patch.apply(obj), expected)
+
+
+class CheckPredicateTestCase(unittest.TestCase):
+
+    def test_predicates(self):
+        cases = [
+            ('equals', 'bar', 'bar', 'baz'),
+            ('notequals', 'bar', 'baz', 'bar'),
+            ('regex', '^b.r$', 'bar', 'baz'),
+            ('startswith', 'ba', 'bar', 'foo'),
+            ('endswith', 'ar', 'bar', 'baz'),
+            ('length', 3, 'bar', 'ba'),
+            ('isa', int, 1, 'bar'),
+            ('is', None, None, 0),
+            ('range', (1, 3), 2, 4),
+            ('in', 'a', 'bar', 'foo'),
+            ('invalue', ['bar'], 'bar', 'baz'),
+        ]
+        for cmp, value, passing, failing in cases:
+            operation = jsonpatchext.CheckOperation({'op': 'check', 'path': '/foo', 'value': value, 'cmp': cmp})
+            comparator = operation._get_comparator()
+            self.assertTrue(comparator.predicate(passing, value), cmp)
+            self.assertFalse(comparator.predicate(failing, value), cmp)
+            self.assertTrue(operation.test({'foo': passing}), cmp)
+            self.assertFalse(operation.test({'foo': failing}), cmp)
+            self.assertFalse(operation.prepare().test({}), cmp)
+            self.assertRaises(jsonpatch.JsonPatchTestFailed, operation.apply, {'foo': failing})
+
+    def test_custom_comparator(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': 'ba', 'cmp': 'custom', 'comparator': MyComparatorStartsWith},
+        ])
+        self.assertTrue(patch.check({'foo': 'bar'}))
+        self.assertFalse(patch.check({'foo': 'qux'}))
+        self.assertFalse(patch.compile().check({'foo': 'qux'}))
+
+    def test_check_failures(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'equals'},
+            {'op': 'check', 'path': '/baz', 'value': 1, 'cmp': 'equals'},
+            {'op': 'check', 'path': '/qux', 'value': 1, 'cmp': 'equals'},
+        ])
+        failures = patch.check_failures({'foo': 'corge', 'baz': 1})
+        self.assertEqual([failure.index for failure in failures], [0, 2])
+        self.assertEqual(failures[0].operation['path'], '/foo')
+        self.assertIn('corge', failures[0].message)
+        self.assertIn('qux', failures[1].message)
+        self.assertEqual(patch.compile().check_failures({'foo': 'bar', 'baz': 1, 'qux': 1}), [])
+
+    def test_lazy_message(self):
+        calls = []
+
+        def LoggingComparator(current, compare):
+            calls.append(current)
+            if current != compare:
+                raise jsonpatch.JsonPatchTestFailed('different')
+
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': 'bar', 'cmp': 'custom', 'comparator': LoggingComparator},
+        ])
+        failures = patch.check_failures({'foo': 'baz'})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(failures[0].message, 'different')
+        self.assertEqual(failures[0].message, 'different')
+        self.assertEqual(len(calls), 2)
+
+
+class OperandTestCase(unittest.TestCase):
+
+    def test_regex(self):
+        operation = jsonpatchext.CheckOperation({'op': 'check', 'path': '/foo', 'value': '^b.r$', 'cmp': 'regex'})
+        operation.prepare()
+        self.assertIs(operation._value, compile_pattern('^b.r$'))
+        self.assertTrue(operation.test({'foo': 'bar'}))
+        with self.assertRaises(jsonpatch.JsonPatchTestFailed) as cm:
+            operation.apply({'foo': 'qux'})
+        self.assertIn('regex ^b.r$', str(cm.exception))
+
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': re.compile('^B', re.I), 'cmp': 'regex'},
+            {'op': 'mutate', 'path': '/foo', 'mut': 'regex', 'value': ('a(r)', r'\1a')},
+        ]).compile()
+        self.assertEqual(patch.apply({'foo': 'bar'}), {'foo': 'bra'})
+
+    def test_invalid_regex(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'check', 'path': '/foo', 'value': '(', 'cmp': 'regex'}])
+        self.assertRaises(re.error, patch.compile().apply, {'foo': 'bar'})
+
+    def test_invalue(self):
+        operation = jsonpatchext.CheckOperation({'op': 'check', 'path': '/foo', 'value': ['a', 1, None],
+                                                 'cmp': 'invalue'}).prepare()
+        self.assertIsInstance(operation._value, frozenset)
+        self.assertTrue(operation.test({'foo': 'a'}))
+        self.assertTrue(operation.test({'foo': True}))
+        self.assertFalse(operation.test({'foo': 'b'}))
+        self.assertFalse(operation.test({'foo': ['a']}))
+        with self.assertRaises(jsonpatch.JsonPatchTestFailed) as cm:
+            operation.apply({'foo': 'b'})
+        self.assertIn("['a', 1, None] (<class 'list'>)", str(cm.exception))
+
+        operation = jsonpatchext.CheckOperation({'op': 'check', 'path': '/foo', 'value': [['a'], 'b'],
+                                                 'cmp': 'invalue'}).prepare()
+        self.assertEqual(operation._value, [['a'], 'b'])
+        self.assertTrue(operation.test({'foo': ['a']}))
+
+        operation = jsonpatchext.CheckOperation({'op': 'check', 'path': '/foo', 'value': {'a': 1},
+                                                 'cmp': 'invalue'}).prepare()
+        with self.assertRaises(jsonpatch.JsonPatchTestFailed) as cm:
+            operation.apply({'foo': 'b'})
+        self.assertIn("{'a': 1} (<class 'dict'>)", str(cm.exception))
+
+    def test_range_slice(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/foo', 'value': [1, 3], 'cmp': 'range'},
+            {'op': 'mutate', 'path': '/bar', 'mut': 'slice', 'value': (1, 5, 2)},
+        ]).compile()
+        self.assertEqual(patch._ops[0]._value, (1, 3))
+        self.assertEqual(patch._ops[1]._operand, slice(1, 5, 2))
+        self.assertEqual(patch.apply({'foo': 2, 'bar': 'abcdef'}), {'foo': 2, 'bar': 'bd'})
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.apply, {'foo': 4, 'bar': 'abcdef'})
+
+
+class MutatorChainTestCase(unittest.TestCase):
+
+    def test_chain(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'mutate', 'path': '/foo', 'value': 'init',
+             'mut': ['init', 'uppercase', ('regex', ('I(N)', r'\1-')), ('custom', MyMutatorRemoveLast)]},
+        ])
+        self.assertEqual(patch.apply({'foo': None}), {'foo': 'N-I'})
+        self.assertEqual(patch.compile().apply({'foo': 'bin'}), {'foo': 'BN'})
+        self.assertEqual(patch.compile(engine='codegen').apply({'foo': 'bin'}), {'foo': 'BN'})
+        self.assertEqual(patch.apply({'foo': 'bin'}, copy_on_write=True), {'foo': 'BN'})
+
+    def test_impure_chain(self):
+        obj = {'foo': {'bar': 'baz'}}
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'mutate', 'path': '/foo', 'mut': [('custom', MyMutatorAddKey), ('cast', dict)]},
+            {'op': 'check', 'path': '/missing', 'value': 1, 'cmp': 'equals'},
+        ])
+        res = jsonpatchext.JsonPatchExt(patch.patch[:1]).apply(obj, copy_on_write=True)
+        self.assertEqual(res, {'foo': {'bar': 'baz', 'corge': 'grault'}})
+        self.assertEqual(obj, {'foo': {'bar': 'baz'}})
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.apply, obj, in_place=True, atomic=True)
+        self.assertEqual(obj, {'foo': {'bar': 'baz'}})
+
+    def test_invalid(self):
+        for mut in ([], [1], [('uppercase',)], ['unknown'], [('custom', 'notcallable')], [('unknown', 1)], {}):
+            patch = jsonpatchext.JsonPatchExt([{'op': 'mutate', 'path': '/foo', 'mut': mut}])
+            self.assertRaises(jsonpatch.InvalidJsonPatch, patch.compile)
+            self.assertRaises(jsonpatch.InvalidJsonPatch, patch.apply, {'foo': 'bar'})
+
+
+def IsEvenComparator(current, compare):
+    if current % 2:
+        raise jsonpatch.JsonPatchTestFailed('{0} is odd'.format(current))
+
+
+def DoubleMutator(current, value):
+    return current * 2
+
+
+class FakeEntryPoint(object):
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def load(self):
+        return self.value
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, jsonpatchext.CheckOperation, 'comparators', jsonpatchext.CheckOperation.comparators)
+        self.addCleanup(setattr, jsonpatchext.MutateOperation, 'mutators', jsonpatchext.MutateOperation.mutators)
+
+    def test_register(self):
+        jsonpatchext.register_comparator('even', IsEvenComparator)
+        jsonpatchext.register_mutator('double', DoubleMutator)
+        patch = jsonpatchext.JsonPatchExt.from_string(
+            '[{"op": "check", "path": "/a", "value": null, "cmp": "even"},'
+            ' {"op": "mutate", "path": "/a", "mut": ["double", "double"]}]')
+        self.assertEqual(patch.apply({'a': 2}), {'a': 8})
+        self.assertEqual(patch.compile().apply({'a': 2}), {'a': 8})
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.apply, {'a': 3})
+        self.assertIs(jsonpatchext.CheckOperation.comparators['even'], IsEvenComparator)
+
+    def test_shared(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'check', 'path': '/a', 'value': 1, 'cmp': 'equals'}] * 2)
+        first, second = patch._ops
+        self.assertIs(first.comparators, second.comparators)
+        self.assertNotIn('comparators', vars(first))
+        self.assertIs(patch.check_operations, jsonpatchext.JsonPatchExt.check_operations)
+        with self.assertRaises(TypeError):
+            patch.check_operations['test'] = jsonpatch.TestOperation
+
+    def test_invalid(self):
+        jsonpatchext.register_comparator('even', IsEvenComparator)
+        # registering the same comparator again does nothing
+        jsonpatchext.register_comparator('even', IsEvenComparator)
+        self.assertRaises(ValueError, jsonpatchext.register_comparator, 'even', jsonpatchext.EqualsComparator)
+        self.assertRaises(ValueError, jsonpatchext.register_comparator, 'equals', IsEvenComparator)
+        jsonpatchext.register_comparator('even', jsonpatchext.EqualsComparator, replace=True)
+        self.assertRaises(ValueError, jsonpatchext.register_comparator, 'custom', IsEvenComparator)
+        self.assertRaises(ValueError, jsonpatchext.register_mutator, 'double', 'notcallable')
+
+    def test_replace(self):
+        jsonpatchext.register_mutator('double', DoubleMutator)
+        mutators = jsonpatchext.MutateOperation.mutators
+        text = '[{"op": "mutate", "path": "/a", "mut": "double"}]'
+        prepared = jsonpatchext.JsonPatchExt.from_string(text).compile()
+        self.assertEqual(jsonpatchext.apply_patch({'a': 2}, text), {'a': 4})
+
+        jsonpatchext.register_mutator('double', UppercaseMutator, replace=True)
+        # the previous registry is not modified
+        self.assertIs(mutators['double'], DoubleMutator)
+        self.assertIs(jsonpatchext.MutateOperation.mutators['double'], UppercaseMutator)
+        # the prepared patches keep the previous mutator, the cached ones are dropped
+        self.assertEqual(prepared.apply({'a': 2}), {'a': 4})
+        self.assertEqual(jsonpatchext.apply_patch({'a': 'b'}, text), {'a': 'B'})
+
+    def test_plugins(self):
+        entry_points = {
+            jsonpatchext.jsonpatchext.COMPARATORS_ENTRY_POINT_GROUP: [FakeEntryPoint('even', IsEvenComparator)],
+            jsonpatchext.jsonpatchext.MUTATORS_ENTRY_POINT_GROUP: [FakeEntryPoint('double', DoubleMutator)],
+        }
+        original = jsonpatchext.jsonpatchext._entry_points
+        jsonpatchext.jsonpatchext._entry_points = entry_points.get
+        try:
+            self.assertEqual(jsonpatchext.load_plugins(), (['even'], ['double']))
+        finally:
+            jsonpatchext.jsonpatchext._entry_points = original
+        self.assertIs(jsonpatchext.MutateOperation.mutators['double'], DoubleMutator)
+
+
 if __name__ == '__main__':
     modules = ['jsonpatchext']
 
@@ -288,6 +781,14 @@ if __name__ == '__main__':
     def get_suite():
         suite = unittest.TestSuite()
         suite.addTest(unittest.makeSuite(ApplyPatchTestCase))
+        suite.addTest(unittest.makeSuite(PreparedPatchTestCase))
+        suite.addTest(unittest.makeSuite(CopyOnWriteTestCase))
+        suite.addTest(unittest.makeSuite(AtomicApplyTestCase))
+        suite.addTest(unittest.makeSuite(CheckHoistingTestCase))
+        suite.addTest(unittest.makeSuite(CheckPredicateTestCase))
+        suite.addTest(unittest.makeSuite(OperandTestCase))
+        suite.addTest(unittest.makeSuite(MutatorChainTestCase))
+        suite.addTest(unittest.makeSuite(RegistryTestCase))
         return suite
 
 
@@ -0,0 +1,163 @@
+from __future__ import unicode_literals
+
+import json
+import random
+import unittest
+
+import jsonpatch
+from jsonpointer import JsonPointer
+
+import jsonpatchext
+from jsonpatchext.lazy import RawJson, loads, dumps
+
+DOC = b'''{
+  "user": {"name": "alice", "roles": ["admin", "dev"]},
+  "items": [ {"id": 1}, {"id": 2},  {"id": 3} ],
+  "blob": {"deep" :[1,2, {"x":"y"}]}
+}'''
+
+
+class LoadsTestCase(unittest.TestCase):
+
+    def test_decoded_paths(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/user/name', 'value': 'alice', 'cmp': 'equals'},
+            {'op': 'remove', 'path': '/items/1'},
+        ])
+        doc = loads(DOC, patch._ops)
+        self.assertEqual(doc['user']['name'], 'alice')
+        self.assertIsInstance(doc['user']['roles'], RawJson)
+        self.assertIsInstance(doc['items'], list)
+        self.assertTrue(all(isinstance(item, RawJson) for item in doc['items']))
+        self.assertIsInstance(doc['blob'], RawJson)
+        self.assertEqual(doc['blob'].decode(), {'deep': [1, 2, {'x': 'y'}]})
+        self.assertEqual(dumps(doc), b'{"user": {"name": "alice", "roles": ["admin", "dev"]}, '
+                                     b'"items": [{"id": 1}, {"id": 2}, {"id": 3}], "blob": {"deep" :[1,2, {"x":"y"}]}}')
+
+    def test_invalid(self):
+        for doc in (b'', b'{"a": 1', b'{"a" 1}', b'{"a": 1} 2', b'[1, "a]'):
+            self.assertRaises(ValueError, loads, doc, [])
+
+
+class RawDocumentTestCase(unittest.TestCase):
+
+    def test_check(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/user/roles', 'value': 2, 'cmp': 'length'},
+            {'op': 'check', 'path': '/items/*/id', 'wildcard': True, 'value': int, 'cmp': 'isa'},
+        ])
+        self.assertTrue(patch.check(DOC))
+        self.assertTrue(patch.compile().check(RawJson(DOC.decode('utf-8'))))
+        self.assertFalse(patch.check(b'{"user": {"roles": []}, "items": []}'))
+        failures = patch.compile().check_failures(b'{"user": {"roles": []}, "items": [{"id": "1"}]}')
+        self.assertEqual([failure.index for failure in failures], [0, 1])
+
+    def test_apply(self):
+        patch = [
+            {'op': 'replace', 'path': '/user/name', 'value': 'bob'},
+            {'op': 'add', 'path': '/items/0', 'value': {'id': 0}},
+            {'op': 'merge', 'path': '/user', 'value': {'age': 30}},
+        ]
+        result = jsonpatchext.apply_patch(DOC, patch)
+        self.assertIsInstance(result, bytes)
+        self.assertEqual(json.loads(result.decode('utf-8')),
+                         jsonpatchext.apply_patch(json.loads(DOC.decode('utf-8')), patch))
+        # the untouched values are written as they were
+        self.assertIn(b'"blob": {"deep" :[1,2, {"x":"y"}]}', result)
+
+        result = jsonpatchext.JsonPatchExt(patch).compile().apply(RawJson(DOC))
+        self.assertIsInstance(result, RawJson)
+        self.assertEqual(result.decode()['user'], {'name': 'bob', 'roles': ['admin', 'dev'], 'age': 30})
+
+    def test_moved_values(self):
+        patch = [
+            {'op': 'copy', 'from': '/blob', 'path': '/copy'},
+            {'op': 'add', 'path': '/copy/deep/-', 'value': 3},
+            {'op': 'move', 'from': '/items', 'path': '/user/items'},
+            {'op': 'check', 'path': '/user/items/2/id', 'value': 3, 'cmp': 'equals'},
+        ]
+        result = json.loads(jsonpatchext.apply_patch(DOC, patch).decode('utf-8'))
+        self.assertEqual(result, jsonpatchext.apply_patch(json.loads(DOC.decode('utf-8')), patch))
+
+    def test_failures(self):
+        self.assertRaises(jsonpatch.JsonPatchConflict, jsonpatchext.apply_patch, DOC,
+                          [{'op': 'replace', 'path': '/missing', 'value': 1}])
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, jsonpatchext.apply_patch, DOC,
+                          [{'op': 'check', 'path': '/user/name', 'value': 'bob', 'cmp': 'equals'}])
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, jsonpatchext.apply_patch, b'[1]',
+                          [{'op': 'test', 'path': '/0/a', 'value': 1}])
+
+
+def random_value(rnd, depth=0):
+    kind = rnd.random()
+    if depth > 3 or kind < 0.4:
+        return rnd.choice([0, 1, -2.5, True, None, 'a', 'b"\\', ''])
+    if kind < 0.7:
+        return [random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 4))]
+    return dict((rnd.choice(['a', 'b', 'c', '~/']), random_value(rnd, depth + 1)) for _ in range(rnd.randint(0, 4)))
+
+
+def random_path(rnd, doc):
+    parts = []
+    while rnd.random() < 0.8 and isinstance(doc, (dict, list)) and doc:
+        if isinstance(doc, dict):
+            key = rnd.choice(sorted(doc) + ['new'])
+            if key not in doc:
+                parts.append(key)
+                break
+            parts.append(key)
+            doc = doc[key]
+        else:
+            index = rnd.randrange(len(doc) + 1)
+            parts.append('{0}'.format(index))
+            if index == len(doc):
+                break
+            doc = doc[index]
+    return JsonPointer.from_parts(parts).path
+
+
+def random_patch(rnd, doc):
+    patch = []
+    for _ in range(rnd.randint(1, 4)):
+        path = random_path(rnd, doc)
+        op = rnd.choice(['add', 'remove', 'replace', 'check', 'test', 'mutate', 'merge', 'move', 'copy'])
+        if op in ('add', 'replace', 'test'):
+            patch.append({'op': op, 'path': path, 'value': random_value(rnd, 2)})
+        elif op == 'check':
+            patch.append({'op': op, 'path': path, 'value': random_value(rnd, 4), 'cmp': 'notequals'})
+        elif op == 'mutate':
+            patch.append({'op': op, 'path': path, 'mut': 'init', 'value': 1})
+        elif op == 'merge':
+            patch.append({'op': op, 'path': path, 'value': {'m': 1}})
+        elif op in ('move', 'copy'):
+            patch.append({'op': op, 'from': random_path(rnd, doc), 'path': path})
+        else:
+            patch.append({'op': op, 'path': path})
+    return patch
+
+
+class RawDocumentEquivalenceTestCase(unittest.TestCase):
+
+    def test_random(self):
+        rnd = random.Random(22)
+        applied = 0
+        for _ in range(3000):
+            doc = random_value(rnd)
+            patch = random_patch(rnd, doc)
+            raw = json.dumps(doc, indent=rnd.choice([None, 1])).encode('ascii')
+            try:
+                expected = jsonpatchext.apply_patch(doc, patch)
+            except Exception as e:
+                expected = type(e)
+            try:
+                result = json.loads(jsonpatchext.apply_patch(raw, patch).decode('utf-8'))
+            except Exception as e:
+                result = type(e)
+            self.assertEqual(json.dumps(result, sort_keys=True, default=repr),
+                             json.dumps(expected, sort_keys=True, default=repr), (doc, patch))
+            applied += not isinstance(expected, type)
+        self.assertGreater(applied, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
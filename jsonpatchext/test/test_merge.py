@@ -0,0 +1,160 @@
+from __future__ import unicode_literals
+
+import copy
+import random
+import sys
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.jsonpatchext import MergeOperationMerger
+from jsonpatchext.merge import Merger, InvalidMerge
+from jsonpatchext.test.helpers import random_value
+
+try:
+    import deepmerge
+    from deepmerge.exception import InvalidMerge as DeepMergeInvalidMerge
+except ImportError:
+    deepmerge = None
+
+
+def outcome(merger, base, nxt):
+    try:
+        return 'ok', merger.merge(base, nxt), base
+    except Exception as e:
+        return 'error', type(e).__name__, str(e), base
+
+
+class MergerTestCase(unittest.TestCase):
+
+    def test_merge(self):
+        base = {'a': {'b': [1], 'c': 'd'}, 'e': 1}
+        result = MergeOperationMerger.merge(base, {'a': {'b': [2], 'f': {'g': None}}, 'h': [3]})
+        self.assertIs(result, base)
+        self.assertEqual(result, {'a': {'b': [1, 2], 'c': 'd', 'f': {'g': None}}, 'e': 1, 'h': [3]})
+        self.assertEqual(MergeOperationMerger.merge([1], [2]), [1, 2])
+
+    def test_errors(self):
+        with self.assertRaises(InvalidMerge) as cm:
+            MergeOperationMerger.merge({'a': {'b': 1}}, {'a': {'b': 'x'}})
+        self.assertTrue(str(cm.exception).startswith("Type conflict at '/a/b': "))
+        with self.assertRaises(InvalidMerge) as cm:
+            MergeOperationMerger.merge({'a': {'b': 1}}, {'a': {'b': 2}})
+        self.assertTrue(str(cm.exception).startswith("Merge fallback at '/a/b': "))
+        with self.assertRaises(InvalidMerge) as cm:
+            MergeOperationMerger.merge({}, [])
+        self.assertTrue(str(cm.exception).startswith("Type conflict: "))
+        with self.assertRaises(InvalidMerge) as cm:
+            MergeOperationMerger.merge(1, 2)
+        self.assertTrue(str(cm.exception).startswith("Merge fallback: "))
+
+    def test_custom_fallback(self):
+        merger = Merger(fallback=lambda config, path, base, nxt: nxt)
+        self.assertEqual(merger.merge({'a': {'b': 1}, 'c': 2}, {'a': {'b': 3}}), {'a': {'b': 3}, 'c': 2})
+
+    def test_copy_value(self):
+        value = {'a': {'b': [1]}, 'c': [2]}
+        result = MergeOperationMerger.merge({'c': [1]}, value, copy_value=True)
+        self.assertEqual(result, {'a': {'b': [1]}, 'c': [1, 2]})
+        self.assertIsNot(result['a'], value['a'])
+
+        result = MergeOperationMerger.merge({'c': [1]}, value)
+        self.assertIs(result['a'], value['a'])
+
+    def test_deep(self):
+        depth = sys.getrecursionlimit() * 2
+        base, nxt = {}, {}
+        b, n = base, nxt
+        for _ in range(depth):
+            b['x'], n['x'] = {}, {}
+            b, n = b['x'], n['x']
+        n['y'] = 1
+        MergeOperationMerger.merge(base, nxt)
+        for _ in range(depth):
+            base = base['x']
+        self.assertEqual(base, {'y': 1})
+
+    def test_operation(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'merge', 'path': '/foo', 'value': {'bar': 1}}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.apply, {'foo': {'bar': 2}})
+
+    def test_list_strategies(self):
+        self.assertEqual(MergeOperationMerger.merge({'a': [1, 2]}, {'a': [2, 3, 3]}, list_strategy='unique'),
+                         {'a': [1, 2, 3]})
+        self.assertEqual(MergeOperationMerger.merge([[1], 2], [[1], [2], 2], list_strategy='unique'),
+                         [[1], 2, [2]])
+        self.assertEqual(MergeOperationMerger.merge({'a': [1, 2], 'b': 'c'}, {'a': [3]}, list_strategy='replace'),
+                         {'a': [3], 'b': 'c'})
+        self.assertEqual(MergeOperationMerger.merge([1], [2], list_strategy='append'), [1, 2])
+        self.assertRaises(ValueError, MergeOperationMerger.merge, [1], [2], list_strategy='prepend')
+
+    def test_keyed(self):
+        base = [{'id': 1, 'tags': [{'id': 'a', 'n': 1}]}, {'id': 2}, 'x', {'id': True}]
+        nxt = [{'id': 2, 'name': 'two'}, {'id': 1, 'tags': [{'id': 'a', 'm': 2}, {'id': 'b'}]}, {'id': 3},
+               {'id': 3, 'name': 'three'}, 'x', {'name': 'none'}, {'id': [1]}, {'id': 1.0, 'f': 1}]
+        result = MergeOperationMerger.merge(base, nxt, list_strategy={'by': 'id'})
+        self.assertEqual(result, [
+            {'id': 1, 'tags': [{'id': 'a', 'n': 1, 'm': 2}, {'id': 'b'}]},
+            {'id': 2, 'name': 'two'},
+            'x',
+            {'id': True},
+            {'id': 3, 'name': 'three'},
+            'x',
+            {'name': 'none'},
+            {'id': [1]},
+            {'id': 1.0, 'f': 1},
+        ])
+        self.assertEqual(len(base), 4)
+
+        self.assertEqual(MergeOperationMerger.merge({'a': [{'id': 1, 'v': 1, 'w': {'x': 1}}]},
+                                                    {'a': [{'id': 1, 'v': 'x', 'w': {'x': 2}}]},
+                                                    list_strategy={'by': 'id'}),
+                         {'a': [{'id': 1, 'v': 'x', 'w': {'x': 2}}]})
+        with self.assertRaises(InvalidMerge) as cm:
+            MergeOperationMerger.merge({'a': [{'id': 1}], 'b': 1}, {'a': [{'id': 1}], 'b': 2},
+                                       list_strategy={'by': 'id'})
+        self.assertTrue(str(cm.exception).startswith("Merge fallback at '/b': "))
+
+    def test_operation_list_strategy(self):
+        obj = {'items': [{'id': 1, 'name': 'one'}, {'id': 2, 'name': 'two'}]}
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'merge', 'path': '/items', 'value': [{'id': 2, 'name': 'TWO'}, {'id': 3, 'name': 'three'}],
+             'list': {'by': 'id'}},
+        ])
+        expected = {'items': [{'id': 1, 'name': 'one'}, {'id': 2, 'name': 'TWO'}, {'id': 3, 'name': 'three'}]}
+        original = copy.deepcopy(obj)
+        self.assertEqual(patch.apply(obj), expected)
+        self.assertEqual(obj, original)
+        self.assertEqual(patch.apply(obj, copy_on_write=True), expected)
+        self.assertEqual(patch.compile(engine='codegen').apply(obj), expected)
+        self.assertEqual(obj, original)
+
+        obj = {'items': [{'id': 2, 'name': 'two'}]}
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'merge', 'path': '/items', 'value': [{'id': 2, 'name': 'TWO'}], 'list': {'by': 'id'}},
+            {'op': 'add', 'path': '/missing/x', 'value': 1},
+        ])
+        self.assertRaises(jsonpatch.JsonPointerException, patch.apply, obj, in_place=True, atomic=True)
+        self.assertEqual(obj, {'items': [{'id': 2, 'name': 'two'}]})
+
+    def test_operation_invalid_list_strategy(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'merge', 'path': '/a', 'value': [1], 'list': 'prepend'}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.apply, {'a': []})
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.compile)
+
+    @unittest.skipIf(deepmerge is None, 'deepmerge is not installed')
+    def test_same_as_deepmerge(self):
+        from jsonpatchext.merge import merge_fallback, merge_type_conflict
+        reference = deepmerge.Merger([(list, 'append'), (dict, 'merge')], [merge_fallback], [merge_type_conflict])
+        self.assertTrue(issubclass(InvalidMerge, DeepMergeInvalidMerge))
+
+        rnd = random.Random(12)
+        for _ in range(3000):
+            base, nxt = random_value(rnd, 3), random_value(rnd, 3)
+            self.assertEqual(outcome(reference, copy.deepcopy(base), copy.deepcopy(nxt)),
+                             outcome(MergeOperationMerger, copy.deepcopy(base), copy.deepcopy(nxt)))
+
+
+if __name__ == '__main__':
+    unittest.main()
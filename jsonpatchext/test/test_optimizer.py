@@ -0,0 +1,240 @@
+from __future__ import unicode_literals
+
+import copy
+import random
+import unittest
+
+import jsonpatchext
+from jsonpatchext.optimizer import optimize
+
+
+def ReverseMutator(current, value):
+    return current[::-1]
+
+
+class OptimizeTestCase(unittest.TestCase):
+
+    def assertOptimized(self, patch, expected):
+        self.assertEqual(optimize(jsonpatchext.JsonPatchExt(patch)), expected)
+
+    def test_overwritten_values(self):
+        self.assertOptimized([
+            {'op': 'replace', 'path': '/foo', 'value': 1},
+            {'op': 'add', 'path': '/bar', 'value': 2},
+            {'op': 'replace', 'path': '/foo', 'value': 3},
+        ], [
+            {'op': 'replace', 'path': '/foo', 'value': 3},
+            {'op': 'add', 'path': '/bar', 'value': 2},
+        ])
+        self.assertOptimized([
+            {'op': 'add', 'path': '/foo', 'value': 1},
+            {'op': 'replace', 'path': '/foo', 'value': 2},
+            {'op': 'add', 'path': '/foo', 'value': 3},
+        ], [
+            {'op': 'add', 'path': '/foo', 'value': 3},
+        ])
+        self.assertOptimized([
+            {'op': 'replace', 'path': '/foo', 'value': 1},
+            {'op': 'remove', 'path': '/foo'},
+        ], [
+            {'op': 'remove', 'path': '/foo'},
+        ])
+
+    def test_kept_values(self):
+        patch = [
+            # the value is read before being replaced
+            {'op': 'replace', 'path': '/foo', 'value': 1},
+            {'op': 'check', 'path': '/foo', 'value': 1, 'cmp': 'custom', 'comparator': lambda current, compare: None},
+            {'op': 'replace', 'path': '/foo', 'value': 2},
+            # an insert doesn't overwrite
+            {'op': 'add', 'path': '/bar/0', 'value': 1},
+            {'op': 'add', 'path': '/bar/0', 'value': 2},
+            # the add fails when the value doesn't exist
+            {'op': 'add', 'path': '/baz', 'value': 1},
+            {'op': 'remove', 'path': '/baz'},
+        ]
+        self.assertOptimized(patch, patch)
+
+    def test_fold_into_value(self):
+        self.assertOptimized([
+            {'op': 'add', 'path': '/foo', 'value': {'bar': 'bar', 'list': [1]}},
+            {'op': 'check', 'path': '/other', 'value': 1, 'cmp': 'equals'},
+            {'op': 'merge', 'path': '/foo', 'value': {'baz': 'baz'}},
+            {'op': 'add', 'path': '/foo/list/-', 'value': 2},
+            {'op': 'add', 'path': '/foo/list/0', 'value': 0},
+            {'op': 'mutate', 'path': '/foo/bar', 'mut': 'uppercase'},
+            {'op': 'check', 'path': '/foo/baz', 'value': 'baz', 'cmp': 'equals'},
+            {'op': 'move', 'from': '/foo/baz', 'path': '/foo/qux'},
+        ], [
+            {'op': 'add', 'path': '/foo', 'value': {'bar': 'BAR', 'list': [0, 1, 2], 'qux': 'baz'}},
+            {'op': 'check', 'path': '/other', 'value': 1, 'cmp': 'equals'},
+        ])
+
+    def test_fold_failure(self):
+        patch = [
+            {'op': 'add', 'path': '/foo', 'value': {'bar': 'bar'}},
+            {'op': 'check', 'path': '/foo/bar', 'value': 'baz', 'cmp': 'equals'},
+        ]
+        self.assertOptimized(patch, patch)
+        patch = [
+            {'op': 'add', 'path': '/foo', 'value': {'bar': 'bar'}},
+            {'op': 'merge', 'path': '/foo', 'value': {'bar': 1}},
+        ]
+        self.assertOptimized(patch, patch)
+
+    def test_mutate_chain(self):
+        self.assertOptimized([
+            {'op': 'mutate', 'path': '/foo', 'mut': 'init', 'value': 'init'},
+            {'op': 'check', 'path': '/bar', 'value': 1, 'cmp': 'equals'},
+            {'op': 'mutate', 'path': '/foo', 'mut': ['uppercase', ('slice', (0, 2))]},
+            {'op': 'mutate', 'path': '/foo', 'mut': 'custom', 'mutator': ReverseMutator},
+        ], [
+            {'op': 'check', 'path': '/bar', 'value': 1, 'cmp': 'equals'},
+            {'op': 'mutate', 'path': '/foo', 'mut': [
+                ('init', 'init'), ('uppercase', None), ('slice', (0, 2)), ('custom', ReverseMutator)]},
+        ])
+
+        # the custom mutators are called with different values
+        patch = [
+            {'op': 'mutate', 'path': '/foo', 'mut': 'custom', 'mutator': ReverseMutator, 'value': 1},
+            {'op': 'mutate', 'path': '/foo', 'mut': 'custom', 'mutator': ReverseMutator, 'value': 2},
+        ]
+        self.assertOptimized(patch, patch)
+
+    def test_duplicate_checks(self):
+        self.assertOptimized([
+            {'op': 'check', 'path': '/foo', 'value': 1, 'cmp': 'equals'},
+            {'op': 'test', 'path': '/bar', 'value': 1},
+            {'op': 'check', 'path': '/foo', 'value': True, 'cmp': 'equals'},
+            {'op': 'check', 'path': '/foo', 'value': 1, 'cmp': 'equals'},
+            {'op': 'test', 'path': '/bar', 'value': 1},
+            {'op': 'replace', 'path': '/foo', 'value': 2},
+            {'op': 'check', 'path': '/foo', 'value': 1, 'cmp': 'equals'},
+        ], [
+            {'op': 'check', 'path': '/foo', 'value': 1, 'cmp': 'equals'},
+            {'op': 'test', 'path': '/bar', 'value': 1},
+            {'op': 'check', 'path': '/foo', 'value': True, 'cmp': 'equals'},
+            {'op': 'replace', 'path': '/foo', 'value': 2},
+            {'op': 'check', 'path': '/foo', 'value': 1, 'cmp': 'equals'},
+        ])
+
+    def test_optimize_method(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'add', 'path': '/foo', 'value': 1},
+            {'op': 'replace', 'path': '/foo', 'value': 2},
+        ]).optimize()
+        self.assertIsInstance(patch, jsonpatchext.JsonPatchExt)
+        self.assertEqual(patch.apply({}), {'foo': 2})
+
+
+KEYS = ['a', 'b', 'c']
+
+
+def random_value(rnd, depth):
+    kind = rnd.randint(0, 5 if depth > 0 else 2)
+    if kind == 0:
+        return rnd.choice(KEYS)
+    if kind == 1:
+        return rnd.randint(0, 2)
+    if kind == 2:
+        return rnd.choice([None, True, 'AbC'])
+    if kind in (3, 4):
+        return dict((key, random_value(rnd, depth - 1)) for key in rnd.sample(KEYS, rnd.randint(0, 3)))
+    return [random_value(rnd, depth - 1) for _ in range(rnd.randint(0, 3))]
+
+
+def random_path(rnd, doc):
+    """Returns the path of an existing value most of the time, or of a new one."""
+    parts, node = [], doc
+    while rnd.random() < 0.7:
+        if isinstance(node, dict) and node:
+            key = rnd.choice(sorted(node))
+        elif isinstance(node, list) and node:
+            key = rnd.randrange(len(node))
+        else:
+            break
+        parts.append(str(key))
+        node = node[key]
+    if not parts or rnd.random() < 0.2:
+        parts.append(rnd.choice(KEYS + ['0', '-']))
+    return '/' + '/'.join(parts)
+
+
+def random_operation(rnd, doc, previous):
+    if previous and rnd.random() < 0.4:
+        # operations on the same paths are the ones to optimize
+        path = rnd.choice(previous)['path']
+    else:
+        path = random_path(rnd, doc)
+    op = rnd.choice(['add', 'add', 'replace', 'remove', 'move', 'copy', 'test', 'check', 'mutate', 'mutate', 'merge'])
+    operation = {'op': op, 'path': path}
+    if op in ('add', 'replace', 'test', 'merge'):
+        operation['value'] = random_value(rnd, 2)
+    if op in ('move', 'copy'):
+        operation['from'] = random_path(rnd, doc)
+    if op == 'check':
+        operation['cmp'] = rnd.choice(['equals', 'length', 'isa'])
+        operation['value'] = {'equals': random_value(rnd, 1), 'length': rnd.randint(0, 3),
+                              'isa': rnd.choice([dict, list, int])}[operation['cmp']]
+    if op == 'merge' and rnd.random() < 0.3:
+        operation['list'] = rnd.choice(['unique', 'replace', {'by': 'a'}])
+    if op == 'mutate':
+        operation['mut'] = rnd.choice(['uppercase', 'lowercase', 'init', 'custom', ['init', 'lowercase']])
+        if operation['mut'] == 'custom':
+            operation['mutator'] = ReverseMutator
+        else:
+            operation['value'] = rnd.choice(['AbC', 'a'])
+    return operation
+
+
+def random_patch(rnd, doc, size):
+    """Generates operations which mostly apply to the document, in sequence."""
+    operations = []
+    for _ in range(size):
+        operation = random_operation(rnd, doc, operations)
+        valid, result = apply([operation], doc)
+        if valid or rnd.random() < 0.1:
+            operations.append(operation)
+        if valid:
+            doc = result
+    return operations
+
+
+def random_document(rnd):
+    doc = random_value(rnd, 3)
+    return doc if isinstance(doc, dict) else {'a': doc}
+
+
+def apply(operations, doc):
+    try:
+        return True, jsonpatchext.JsonPatchExt(copy.deepcopy(operations)).apply(copy.deepcopy(doc))
+    except Exception:
+        return False, None
+
+
+class OptimizeEquivalenceTestCase(unittest.TestCase):
+    """Compares random patches with their optimized patch, on random documents."""
+
+    def test_equivalence(self):
+        rnd = random.Random(6902)
+        for _ in range(300):
+            doc = random_document(rnd)
+            operations = random_patch(rnd, doc, rnd.randint(1, 12))
+            optimized = optimize(jsonpatchext.JsonPatchExt(copy.deepcopy(operations)))
+            self.assertLessEqual(len(optimized), len(operations))
+            # the generated document, and others where the patch may fail
+            for doc in [doc] + [random_document(rnd) for _ in range(3)]:
+                self.assertEqual(apply(operations, doc), apply(optimized, doc), (operations, optimized, doc))
+
+
+if __name__ == '__main__':
+    modules = ['jsonpatchext.optimizer']
+
+    def get_suite():
+        suite = unittest.TestSuite()
+        suite.addTest(unittest.makeSuite(OptimizeTestCase))
+        suite.addTest(unittest.makeSuite(OptimizeEquivalenceTestCase))
+        return suite
+
+    suite = get_suite()
+    unittest.TextTestRunner(verbosity=1).run(suite)
@@ -0,0 +1,118 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.parallel import partition
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+
+def doc():
+    return {
+        'tenants': {'a': {'name': 'a', 'limits': [1, 2]}, 'b': {'name': 'b'}},
+        'users': [{'name': 'x'}, {'name': 'y'}],
+        'settings': {'theme': 'dark'},
+        'untouched': {'deep': {'value': 1}},
+    }
+
+
+PATCH = [
+    {'op': 'add', 'path': '/tenants/c', 'value': {'name': 'c'}},
+    {'op': 'merge', 'path': '/settings', 'value': {'lang': 'en'}},
+    {'op': 'mutate', 'path': '/users/*/name', 'wildcard': True, 'mut': 'uppercase'},
+    {'op': 'move', 'from': '/tenants/a/limits', 'path': '/tenants/b/limits'},
+    {'op': 'add', 'path': '/created', 'value': [1]},
+    {'op': 'check', 'path': '/users/0/name', 'value': 'X', 'cmp': 'equals'},
+    {'op': 'remove', 'path': '/settings/theme'},
+]
+
+
+class PartitionTestCase(unittest.TestCase):
+
+    def partition(self, patch):
+        return partition(jsonpatchext.JsonPatchExt(patch)._ops)
+
+    def test_partition(self):
+        self.assertEqual(self.partition(PATCH), [('tenants', [0, 3]), ('settings', [1, 6]), ('users', [2, 5]),
+                                                 ('created', [4])])
+
+    def test_not_partitioned(self):
+        self.assertIsNone(self.partition([{'op': 'move', 'from': '/a/b', 'path': '/c'}]))
+        self.assertIsNone(self.partition([{'op': 'copy', 'from': '', 'path': '/c'}]))
+        self.assertIsNone(self.partition([{'op': 'test', 'path': '', 'value': {}}]))
+        self.assertIsNone(self.partition([{'op': 'check', 'path': '/*/name', 'wildcard': True, 'value': 'a',
+                                           'cmp': 'equals'}]))
+
+
+@unittest.skipIf(futures is None, 'concurrent.futures is not available')
+class ApplyParallelTestCase(unittest.TestCase):
+
+    def test_apply(self):
+        patch = jsonpatchext.JsonPatchExt(PATCH)
+        expected = patch.apply(doc())
+        obj = doc()
+        with futures.ThreadPoolExecutor(2) as executor:
+            self.assertEqual(patch.apply_parallel(obj, executor=executor), expected)
+            self.assertEqual(patch.compile().apply_parallel(obj, executor=executor), expected)
+        self.assertEqual(obj, doc())
+        # the default executor
+        self.assertEqual(patch.apply_parallel(obj, workers=2), expected)
+
+    def test_in_place(self):
+        patch = jsonpatchext.JsonPatchExt(PATCH)
+        obj = doc()
+        untouched = obj['untouched']
+        result = patch.apply_parallel(obj, in_place=True, executor=futures.ThreadPoolExecutor(2))
+        self.assertIs(result, obj)
+        self.assertEqual(obj, patch.apply(doc()))
+        self.assertIs(obj['untouched'], untouched)
+
+    def test_copy_on_write(self):
+        patch = jsonpatchext.JsonPatchExt(PATCH)
+        obj = doc()
+        executor = futures.ThreadPoolExecutor(2)
+        self.assertIs(patch.apply_parallel(obj, copy_on_write=True, executor=executor)['untouched'],
+                      obj['untouched'])
+        self.assertIsNot(patch.apply_parallel(obj, executor=executor)['untouched'], obj['untouched'])
+
+    def test_first_failure(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'add', 'path': '/a/b', 'value': 1},
+            {'op': 'check', 'path': '/c', 'value': 1, 'cmp': 'equals'},
+            {'op': 'replace', 'path': '/missing', 'value': 1},
+        ])
+        obj = {'a': {}, 'c': 2}
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, patch.apply_parallel, obj, True,
+                          executor=futures.ThreadPoolExecutor(2))
+        self.assertEqual(obj, {'a': {}, 'c': 2})
+
+    def test_process_pool(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'mutate', 'path': '/a', 'mut': ['init', 'uppercase'], 'value': 'dflt'},
+            {'op': 'add', 'path': '/b', 'value': 1},
+        ])
+        expected = {'a': 'DFLT', 'b': 1}
+        self.assertEqual(patch.apply({}), expected)
+        with futures.ProcessPoolExecutor(2) as executor:
+            self.assertEqual(patch.apply_parallel({}, executor=executor), expected)
+            self.assertEqual(patch.compile().apply_parallel({}, executor=executor), expected)
+
+    def test_sequential(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'move', 'from': '/a', 'path': '/b/a'},
+            {'op': 'add', 'path': '/c', 'value': 1},
+        ])
+        self.assertEqual(patch.apply_parallel({'a': 1, 'b': {}}), {'b': {'a': 1}, 'c': 1})
+        # not an object
+        patch = jsonpatchext.JsonPatchExt([{'op': 'add', 'path': '/0', 'value': 1}, {'op': 'remove', 'path': '/2'}])
+        self.assertEqual(patch.apply_parallel([2, 3]), [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
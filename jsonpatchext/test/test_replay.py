@@ -0,0 +1,154 @@
+from __future__ import unicode_literals
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.replay import Replay, SnapshotStore
+
+
+def make_log(count):
+    log = [[{'op': 'add', 'path': '/items', 'value': []}]]
+    for n in range(1, count):
+        log.append([{'op': 'add', 'path': '/items/-', 'value': n}, {'op': 'add', 'path': '/last', 'value': n}]
+                   if n % 2 else '[{"op": "add", "path": "/last", "value": %d}]' % n)
+    return log
+
+
+def expected_state(log, version):
+    doc = {}
+    for patch in log[:version]:
+        doc = jsonpatchext.apply_patch(doc, patch)
+    return doc
+
+
+class SnapshotStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_save_load(self):
+        store = SnapshotStore(os.path.join(self.directory, 'snapshots'))
+        self.assertIsNone(store.nearest())
+        store.save(3, {'a': ['\xe9']})
+        store.save(10, {'a': 10})
+        self.assertEqual(store.versions(), [3, 10])
+        self.assertEqual(store.load(3), {'a': ['\xe9']})
+        self.assertEqual(store.nearest(), (10, {'a': 10}))
+        self.assertEqual(store.nearest(9), (3, {'a': ['\xe9']}))
+        self.assertIsNone(store.nearest(2))
+        self.assertRaises(KeyError, store.load, 4)
+        self.assertEqual(sorted(os.listdir(store.directory)),
+                         ['snapshot-000000000003.json', 'snapshot-000000000010.json'])
+
+    def test_compress(self):
+        store = SnapshotStore(self.directory, compress=True)
+        store.save(1, {'a': 'x' * 1000})
+        path = os.path.join(self.directory, 'snapshot-000000000001.json.gz')
+        with gzip.open(path, 'rb') as f:
+            self.assertEqual(json.loads(f.read().decode('utf-8')), {'a': 'x' * 1000})
+        self.assertLess(os.path.getsize(path), 100)
+        # the same version written uncompressed replaces it
+        SnapshotStore(self.directory).save(1, {'a': 1})
+        self.assertEqual(os.listdir(self.directory), ['snapshot-000000000001.json'])
+        self.assertEqual(store.load(1), {'a': 1})
+
+    def test_keep(self):
+        store = SnapshotStore(self.directory, keep=2)
+        for version in range(1, 5):
+            store.save(version, version)
+        self.assertEqual(store.versions(), [3, 4])
+        self.assertRaises(ValueError, SnapshotStore, self.directory, keep=0)
+
+    def test_failed_save(self):
+        store = SnapshotStore(self.directory)
+        self.assertRaises(TypeError, store.save, 1, {'a': object()})
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class ReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_snapshots(self):
+        log = make_log(25)
+        replay = Replay(self.directory, every=10)
+        self.assertEqual(replay.catch_up(log), 25)
+        self.assertEqual(replay.doc, expected_state(log, 25))
+        self.assertEqual(replay.store.versions(), [10, 20])
+
+    def test_every_bytes(self):
+        log = make_log(10)
+        replay = Replay(self.directory, every=None, every_bytes=150)
+        replay.replay(log)
+        versions = replay.store.versions()
+        self.assertTrue(1 < len(versions) < 10, versions)
+        for version in versions:
+            self.assertEqual(replay.store.load(version), expected_state(log, version))
+
+    def test_resume(self):
+        log = make_log(30)
+        replay = Replay(self.directory, every=7, compress=True)
+        replay.catch_up(log[:20])
+
+        resumed = Replay(self.directory, every=7)
+        self.assertEqual(resumed.version, 14)
+        self.assertEqual(resumed.doc, expected_state(log, 14))
+        self.assertEqual(resumed.catch_up(log), 30)
+        self.assertEqual(resumed.doc, expected_state(log, 30))
+        self.assertEqual(resumed.store.versions(), [7, 14, 21, 28])
+
+    def test_state_at(self):
+        log = make_log(25)
+        replay = Replay(self.directory, every=10, initial={'start': True})
+        replay.catch_up(log)
+        for version in (0, 5, 10, 19, 25):
+            state = replay.state_at(version, iter(log))
+            self.assertEqual(state, dict(expected_state(log, version), start=True))
+        self.assertIsNot(replay.state_at(25, log), replay.doc)
+        self.assertRaises(ValueError, replay.state_at, 26, log)
+        self.assertRaises(ValueError, replay.state_at, -1, log)
+
+    def test_state_at_string_log(self):
+        # the same texts are applied again, through the cached patches
+        log = [
+            '[{"op": "merge", "path": "/a", "value": {"n": {"x": 1}}}]',
+            '[{"op": "merge", "path": "/a/n", "value": {"y": 2}},'
+            ' {"op": "mutate", "path": "/b", "mut": "init", "value": {"c": "d"}}]',
+            '[{"op": "mutate", "path": "/b/c", "mut": "uppercase"}, {"op": "remove", "path": "/a"}]',
+        ]
+        replay = Replay(self.directory, every=None, initial={'a': {}})
+        self.assertEqual(replay.catch_up(log), 3)
+        self.assertEqual(replay.doc, {'b': {'c': 'D'}})
+        self.assertEqual(replay.state_at(2, log), {'a': {'n': {'x': 1, 'y': 2}}, 'b': {'c': 'd'}})
+        self.assertEqual(replay.state_at(1, log), {'a': {'n': {'x': 1}}})
+
+    def test_failed_patch(self):
+        replay = Replay(self.directory, every=None, initial={'a': 1})
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'replace', 'path': '/a', 'value': 2},
+            {'op': 'check', 'path': '/a', 'value': 1, 'cmp': 'equals'},
+        ])
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, replay.apply, patch.compile())
+        self.assertEqual((replay.version, replay.doc), (0, {'a': 1}))
+
+    def test_failed_move(self):
+        replay = Replay(self.directory, every=1, initial={'a': [1, 1], 'c': ['x', 'x', 'y']})
+        for patch in ([{'op': 'move', 'from': '/a/0', 'path': '/b/x'}],
+                      '[{"op": "move", "from": "/c/1", "path": "/b/x"}]'):
+            self.assertRaises(jsonpatch.JsonPointerException, replay.apply, patch)
+            self.assertEqual((replay.version, replay.doc), (0, {'a': [1, 1], 'c': ['x', 'x', 'y']}))
+        self.assertEqual(replay.store.versions(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
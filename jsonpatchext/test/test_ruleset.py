@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+import random
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.ruleset import CheckRuleSet
+
+
+def MyComparatorOdd(current, compare):
+    if current % 2 != 1:
+        raise jsonpatch.JsonPatchTestFailed('{0} is not odd'.format(current))
+
+
+class CheckRuleSetTestCase(unittest.TestCase):
+
+    def test_matching(self):
+        rules = CheckRuleSet({
+            'eq': [{'op': 'check', 'path': '/name', 'value': 'foo', 'cmp': 'equals'}],
+            'in': [{'op': 'check', 'path': '/name', 'value': ['foo', 'bar'], 'cmp': 'invalue'}],
+            'range': [{'op': 'check', 'path': '/age', 'value': (10, 20), 'cmp': 'range'}],
+            'prefix': [{'op': 'check', 'path': '/name', 'value': 'fo', 'cmp': 'startswith'}],
+            'custom': [{'op': 'check', 'path': '/age', 'value': None, 'cmp': 'custom', 'comparator': MyComparatorOdd}],
+            'both': [
+                {'op': 'check', 'path': '/name', 'value': 'bar', 'cmp': 'equals'},
+                {'op': 'check', 'path': '/age', 'value': (10, 20), 'cmp': 'range'},
+            ],
+            'empty': [],
+        })
+        self.assertEqual(rules.matching({'name': 'foo', 'age': 15}), {'eq', 'in', 'range', 'prefix', 'custom', 'empty'})
+        self.assertEqual(rules.matching({'name': 'bar', 'age': 10}), {'in', 'range', 'both', 'empty'})
+        self.assertEqual(rules.matching({'name': 1}), {'empty'})
+
+    def test_only_checks(self):
+        rules = CheckRuleSet()
+        self.assertRaises(jsonpatch.InvalidJsonPatch, rules.add, 'x', [{'op': 'add', 'path': '/a', 'value': 1}])
+
+    def test_same_as_check(self):
+        rnd = random.Random(3)
+        paths = ['/a', '/b', '/c/0']
+        values = ['foo', 'food', 'bar', 1, 2, 3, 2.5, True, None]
+        patches = {}
+        for rule_id in range(300):
+            patch = []
+            for _ in range(rnd.randint(1, 3)):
+                cmp = rnd.choice(['equals', 'invalue', 'range', 'startswith', 'notequals', 'isa'])
+                value = {
+                    'invalue': rnd.sample(values, 3),
+                    'range': sorted(rnd.sample([0, 1, 2, 3, 4], 2)),
+                    'startswith': rnd.choice(['', 'f', 'fo', 'foo', 'b']),
+                    'isa': rnd.choice([int, str]),
+                }.get(cmp, rnd.choice(values))
+                patch.append({'op': 'check', 'path': rnd.choice(paths), 'value': value, 'cmp': cmp})
+            patches[rule_id] = jsonpatchext.JsonPatchExt(patch)
+        rules = CheckRuleSet(patches)
+
+        def check(patch, doc):
+            try:
+                return patch.check(doc)
+            except (TypeError, AttributeError):
+                return False
+
+        for _ in range(200):
+            doc = {'a': rnd.choice(values), 'b': rnd.choice(values), 'c': [rnd.choice(values)]}
+            expected = set(rule_id for rule_id, patch in patches.items() if check(patch, doc))
+            self.assertEqual(rules.matching(doc), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+from __future__ import unicode_literals
+
+import io
+import json
+import mmap
+import random
+import tempfile
+import unittest
+
+import jsonpatch
+from jsonpointer import JsonPointer
+
+import jsonpatchext
+from jsonpatchext.stream import JsonStreamError
+
+DOC = b'''{
+  "users": [
+    {"name": "alice", "tags": ["a", "b"], "note": "say \\"hi\\" \\\\ [x]"},
+    {"name": "bob", "tags": []}
+  ],
+  "settings" : { "theme": "dark", "sizes": [1, 2.50, -3e2] },
+  "empty": {},
+  "flag": true
+}
+'''
+
+
+def stream(patch, doc=DOC, chunk_size=7):
+    output = io.BytesIO()
+    jsonpatchext.JsonPatchExt(patch).apply_stream(io.BytesIO(doc), output, chunk_size)
+    return output.getvalue()
+
+
+class ApplyStreamTestCase(unittest.TestCase):
+
+    def assertStreamed(self, patch, doc=DOC):
+        expected = jsonpatchext.JsonPatchExt(patch).apply(json.loads(doc.decode('utf-8')))
+        for chunk_size in (1, 7, 4096):
+            self.assertEqual(json.loads(stream(patch, doc, chunk_size).decode('utf-8')), expected)
+
+    def test_unmodified(self):
+        for chunk_size in (1, 2, 5, 4096):
+            self.assertEqual(stream([], chunk_size=chunk_size), DOC)
+        self.assertEqual(stream([{'op': 'check', 'path': '/flag', 'value': True, 'cmp': 'equals'}]), DOC)
+
+    def test_untouched_bytes(self):
+        result = stream([{'op': 'replace', 'path': '/settings/theme', 'value': 'light'}])
+        self.assertEqual(result, DOC.replace(b'"dark"', b'"light"'))
+
+    def test_operations(self):
+        self.assertStreamed([
+            {'op': 'replace', 'path': '/users/0/name', 'value': 'carol'},
+            {'op': 'mutate', 'path': '/users/1/name', 'mut': 'uppercase'},
+            {'op': 'merge', 'path': '/settings', 'value': {'lang': 'en'}},
+            {'op': 'remove', 'path': '/flag'},
+            {'op': 'add', 'path': '/users/1/tags/-', 'value': 'c'},
+            {'op': 'add', 'path': '/empty/a', 'value': {'b': [1]}},
+            {'op': 'add', 'path': '/created', 'value': 1},
+            {'op': 'check', 'path': '/users/*/tags', 'wildcard': True, 'value': 2, 'cmp': 'length',
+             'quantifier': 'any'},
+            {'op': 'test', 'path': '/settings/sizes/1', 'value': 2.5},
+            {'op': 'remove', 'path': '/users/0/tags/0'},
+        ])
+
+    def test_removed_members(self):
+        self.assertStreamed([{'op': 'remove', 'path': '/users'}])
+        self.assertStreamed([{'op': 'remove', 'path': '/users'}, {'op': 'remove', 'path': '/flag'}])
+        self.assertStreamed([{'op': 'remove', 'path': '/users/0'}])
+
+    def test_root(self):
+        self.assertStreamed([{'op': 'replace', 'path': '', 'value': [1]}])
+        self.assertStreamed([{'op': 'add', 'path': '/0', 'value': 1}], b'[2, 3]')
+        self.assertEqual(stream([{'op': 'replace', 'path': '', 'value': 'abc'}], b' [1] '), b' "abc" ')
+
+    def test_failures(self):
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, stream,
+                          [{'op': 'check', 'path': '/settings/theme', 'value': 'light', 'cmp': 'equals'}])
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, stream,
+                          [{'op': 'check', 'path': '/missing', 'value': 1, 'cmp': 'equals'}])
+        self.assertRaises(jsonpatch.JsonPatchConflict, stream, [{'op': 'replace', 'path': '/missing', 'value': 1}])
+        self.assertRaises(jsonpatch.JsonPatchConflict, stream, [{'op': 'replace', 'path': '/users/5', 'value': 1}])
+        self.assertRaises(jsonpatch.JsonPointerException, stream, [{'op': 'remove', 'path': '/flag/a'}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, stream, [{'op': 'move', 'from': '/flag', 'path': '/a'}])
+
+    def test_invalid_document(self):
+        for doc in (b'', b'{"a": 1', b'{"a" 1}', b'{"a": 1} 2', b'[1, "a]', b'{"a": }'):
+            self.assertRaises(JsonStreamError, stream, [{'op': 'add', 'path': '/b', 'value': 1}], doc)
+
+    def test_mmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(DOC)
+            f.flush()
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                output = io.BytesIO()
+                patch = jsonpatchext.JsonPatchExt([{'op': 'add', 'path': '/a', 'value': 1}]).compile()
+                patch.apply_stream(mapped, output)
+            finally:
+                mapped.close()
+        self.assertEqual(json.loads(output.getvalue().decode('utf-8'))['a'], 1)
+
+
+def random_value(rnd, depth=0):
+    kind = rnd.random()
+    if depth > 3 or kind < 0.4:
+        return rnd.choice([0, 1, -2.5, True, None, 'a', 'b"\\', ''])
+    if kind < 0.7:
+        return [random_value(rnd, depth + 1) for _ in range(rnd.randint(0, 4))]
+    return dict((rnd.choice(['a', 'b', 'c', '~/']), random_value(rnd, depth + 1)) for _ in range(rnd.randint(0, 4)))
+
+
+def random_path(rnd, doc):
+    parts = []
+    while rnd.random() < 0.8:
+        if isinstance(doc, dict) and doc:
+            key = rnd.choice(sorted(doc) + ['new'])
+        elif isinstance(doc, list) and doc:
+            key = rnd.choice([str(rnd.randrange(len(doc))), str(len(doc)), '-'])
+        else:
+            break
+        parts.append(key)
+        if key not in doc if isinstance(doc, dict) else not key.isdigit() or int(key) >= len(doc):
+            break
+        doc = doc[key] if isinstance(doc, dict) else doc[int(key)]
+    return JsonPointer.from_parts(parts).path
+
+
+def random_patch(rnd, doc):
+    patch = []
+    for _ in range(rnd.randint(1, 4)):
+        path = random_path(rnd, doc)
+        op = rnd.choice(['add', 'remove', 'replace', 'check', 'test', 'mutate', 'merge'])
+        if op in ('add', 'replace', 'test'):
+            patch.append({'op': op, 'path': path, 'value': random_value(rnd, 2)})
+        elif op == 'check':
+            patch.append({'op': op, 'path': path, 'value': random_value(rnd, 4), 'cmp': 'notequals'})
+        elif op == 'mutate':
+            patch.append({'op': op, 'path': path, 'mut': 'init', 'value': 1})
+        elif op == 'merge':
+            patch.append({'op': op, 'path': path, 'value': {'m': 1}})
+        else:
+            patch.append({'op': op, 'path': path})
+    return patch
+
+
+class ApplyStreamEquivalenceTestCase(unittest.TestCase):
+
+    def test_random(self):
+        rnd = random.Random(21)
+        applied = 0
+        for _ in range(3000):
+            doc = random_value(rnd)
+            if not isinstance(doc, (dict, list)):
+                continue
+            patch = random_patch(rnd, doc)
+            raw = json.dumps(doc, indent=rnd.choice([None, 1])).encode('ascii')
+            try:
+                expected = jsonpatchext.JsonPatchExt(patch).apply(doc)
+            except Exception as e:
+                expected = type(e)
+            try:
+                result = json.loads(stream(patch, raw, rnd.choice([1, 3, 64])).decode('utf-8'))
+            except Exception as e:
+                result = type(e)
+            if isinstance(expected, type) or isinstance(result, type):
+                # the same failure, possibly reported by another operation
+                self.assertTrue(isinstance(expected, type) and isinstance(result, type), (doc, patch, result))
+            else:
+                self.assertEqual(json.dumps(result, sort_keys=True), json.dumps(expected, sort_keys=True),
+                                 (doc, patch))
+                applied += not isinstance(expected, type)
+        self.assertGreater(applied, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import jsonpatch
+
+import jsonpatchext
+from jsonpatchext.ruleset import CheckRuleSet
+from jsonpatchext.wildcard import expand, static_prefix
+
+
+def doc():
+    return {
+        'items': [
+            {'name': 'foo', 'tags': ['a'], 'meta': {'n': 1}},
+            {'name': 'bar', 'tags': ['b'], 'meta': {'n': 2}},
+            {'tags': []},
+            'scalar',
+        ],
+        'groups': {'x': {'name': 'baz'}, 'y': {'child': {'name': 'qux'}}},
+    }
+
+
+class ExpandTestCase(unittest.TestCase):
+
+    def test_wildcard(self):
+        obj = doc()
+        self.assertEqual([value for _, _, value in expand(obj, ['items', '*', 'name'])], ['foo', 'bar'])
+        self.assertEqual([key for _, key, _ in expand(obj, ['items', '*'])], [0, 1, 2, 3])
+        self.assertEqual([value for _, _, value in expand(obj, ['groups', '*', 'name'])], ['baz'])
+        self.assertEqual(expand(obj, ['missing', '*']), [])
+        self.assertEqual([value for _, _, value in expand(obj, ['items', '*', 'tags', '0'])], ['a', 'b'])
+
+    def test_recursive(self):
+        obj = doc()
+        self.assertEqual([value for _, _, value in expand(obj, ['**', 'name'])], ['foo', 'bar', 'baz', 'qux'])
+        self.assertEqual([value for _, _, value in expand(obj, ['**', '**', 'name'])], ['foo', 'bar', 'baz', 'qux'])
+        self.assertEqual([value for _, _, value in expand(obj, ['groups', '**', 'child', 'name'])], ['qux'])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, expand, obj, ['items', '**'])
+
+    def test_static_prefix(self):
+        self.assertEqual(static_prefix(['a', 'b', '*', 'c']), ['a', 'b'])
+        self.assertEqual(static_prefix(['**', 'c']), [])
+        self.assertEqual(static_prefix(['a']), ['a'])
+
+
+class WildcardOperationTestCase(unittest.TestCase):
+
+    def test_check(self):
+        all_patch = jsonpatchext.JsonPatchExt([{'op': 'check', 'path': '/items/*/name', 'wildcard': True, 'value': 'ba',
+                                                'cmp': 'startswith'}])
+        any_patch = jsonpatchext.JsonPatchExt([{'op': 'check', 'path': '/items/*/name', 'wildcard': True, 'value': 'ba',
+                                                'cmp': 'startswith', 'quantifier': 'any'}])
+        self.assertFalse(all_patch.check(doc()))
+        self.assertTrue(any_patch.check(doc()))
+        self.assertTrue(all_patch.check({'items': [{'name': 'bar'}, {'name': 'baz'}]}))
+        self.assertTrue(all_patch.check({'items': []}))
+        self.assertFalse(any_patch.check({'items': []}))
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, all_patch.apply, doc())
+        self.assertEqual(any_patch.apply(doc()), doc())
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, any_patch.apply, {'items': [{'name': 'foo'}]})
+        self.assertEqual(len(all_patch.check_failures(doc())), 1)
+
+    def test_literal_segments(self):
+        obj = {'*': {'**': 'foo'}, 'a': {'**': 'bar'}}
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/*/**', 'value': 'foo', 'cmp': 'equals'},
+            {'op': 'mutate', 'path': '/*/**', 'mut': 'uppercase'},
+            {'op': 'merge', 'path': '/*', 'value': {'b': 1}},
+        ])
+        self.assertEqual(patch.apply(obj), {'*': {'**': 'FOO', 'b': 1}, 'a': {'**': 'bar'}})
+        self.assertEqual(patch.compile(engine='codegen').apply(obj), {'*': {'**': 'FOO', 'b': 1}, 'a': {'**': 'bar'}})
+        check = jsonpatchext.JsonPatchExt(patch.patch[:1])
+        self.assertTrue(check.check(obj))
+        self.assertFalse(check.check({'a': {'**': 'foo'}}))
+
+    def test_invalid_flag(self):
+        self.assertRaises(jsonpatch.InvalidJsonPatch, jsonpatchext.JsonPatchExt,
+                          [{'op': 'check', 'path': '/*', 'wildcard': 'yes', 'value': 1, 'cmp': 'equals'}])
+
+    def test_invalid_quantifier(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'check', 'path': '/items/*', 'wildcard': True, 'value': 1,
+                                            'cmp': 'equals', 'quantifier': 'some'}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.compile)
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.check, {'items': [1]})
+
+    def test_mutate(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'mutate', 'path': '/items/*/name', 'wildcard': True,
+                                            'mut': 'uppercase'}])
+        items = [{'name': 'item{0}'.format(i)} for i in range(50)]
+        result = patch.apply({'items': items})
+        self.assertEqual(result, {'items': [{'name': 'ITEM{0}'.format(i)} for i in range(50)]})
+        self.assertEqual(items[0], {'name': 'item0'})
+
+        patch = jsonpatchext.JsonPatchExt([{'op': 'mutate', 'path': '/**/name', 'wildcard': True, 'mut': 'uppercase'}])
+        self.assertEqual(patch.apply(doc())['groups'], {'x': {'name': 'BAZ'}, 'y': {'child': {'name': 'QUX'}}})
+
+        patch = jsonpatchext.JsonPatchExt([{'op': 'mutate', 'path': '/items/*/name', 'wildcard': True,
+                                            'mut': 'lowercase'}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.apply, {'items': [{'name': 1}]})
+        patch = jsonpatchext.JsonPatchExt([{'op': 'mutate', 'path': '/items/*/-', 'wildcard': True,
+                                            'mut': 'lowercase'}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.apply, doc())
+
+    def test_merge(self):
+        patch = jsonpatchext.JsonPatchExt([{'op': 'merge', 'path': '/items/*/meta', 'wildcard': True,
+                                            'value': {'seen': True}}])
+        result = patch.apply(doc())
+        self.assertEqual([item['meta'] for item in result['items'][:2]],
+                         [{'n': 1, 'seen': True}, {'n': 2, 'seen': True}])
+
+        patch = jsonpatchext.JsonPatchExt([{'op': 'merge', 'path': '/items/*/meta', 'wildcard': True,
+                                            'value': {'n': 'x'}}])
+        self.assertRaises(jsonpatch.InvalidJsonPatch, patch.apply, doc())
+
+    def test_engines(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/items/*/tags', 'wildcard': True, 'value': list, 'cmp': 'isa'},
+            {'op': 'mutate', 'path': '/items/*/name', 'wildcard': True, 'mut': 'uppercase'},
+            {'op': 'merge', 'path': '/items/*/meta', 'wildcard': True, 'value': {'seen': True}},
+            {'op': 'merge', 'path': '/groups/*', 'wildcard': True, 'value': {'seen': True}},
+            {'op': 'check', 'path': '/**/seen', 'wildcard': True, 'value': True, 'cmp': 'equals'},
+        ])
+        expected = patch.apply(doc())
+        self.assertEqual(expected['items'][0], {'name': 'FOO', 'tags': ['a'], 'meta': {'n': 1, 'seen': True}})
+
+        obj = doc()
+        self.assertEqual(patch.apply(obj, copy_on_write=True), expected)
+        self.assertEqual(patch.compile().apply(obj), expected)
+        self.assertEqual(patch.compile(engine='codegen').apply(obj), expected)
+        self.assertEqual(obj, doc())
+
+        result, inverse = patch.apply_with_inverse(obj)
+        self.assertEqual(result, expected)
+        self.assertEqual(inverse.apply(result), doc())
+
+        failing = jsonpatchext.JsonPatchExt(patch.patch + [{'op': 'check', 'path': '/items/0/name', 'value': 'foo',
+                                                            'cmp': 'equals'}])
+        self.assertRaises(jsonpatch.JsonPatchTestFailed, failing.apply, obj, in_place=True, atomic=True)
+        self.assertEqual(obj, doc())
+
+    def test_not_hoisted(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'mutate', 'path': '/items/*/name', 'wildcard': True, 'mut': 'uppercase'},
+            {'op': 'check', 'path': '/items/0/name', 'value': 'FOO', 'cmp': 'equals'},
+            {'op': 'check', 'path': '/items/*/name', 'wildcard': True, 'value': 'FOO', 'cmp': 'equals',
+             'quantifier': 'any'},
+        ])
+        self.assertEqual(patch.compile()._plan[0], ())
+        patch.apply(doc())
+
+    def test_batch(self):
+        patch = jsonpatchext.JsonPatchExt([
+            {'op': 'check', 'path': '/items/*/name', 'wildcard': True, 'value': 'foo', 'cmp': 'equals',
+             'quantifier': 'any'},
+        ])
+        docs = [doc(), {'items': [{'name': 'bar'}]}, {}]
+        self.assertEqual([bool(passed) for passed in patch.check_many(docs)], [True, False, False])
+
+    def test_ruleset(self):
+        rules = CheckRuleSet()
+        rules.add('any-foo', [{'op': 'check', 'path': '/items/*/name', 'wildcard': True, 'value': 'foo',
+                               'cmp': 'equals', 'quantifier': 'any'}])
+        rules.add('all-foo', [{'op': 'check', 'path': '/items/*/name', 'wildcard': True, 'value': 'foo',
+                               'cmp': 'equals'}])
+        self.assertEqual(rules.matching(doc()), set(['any-foo']))
+        self.assertEqual(rules.matching({'items': [{'name': 'foo'}]}), set(['any-foo', 'all-foo']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+""" Wildcard paths for the 'check', 'mutate' and 'merge' operations
+
+In these operations with a true 'wildcard' member, a ``*`` path segment
+matches every member of an object or item of an array, and a ``**`` segment
+matches the value itself and all its descendants, at any depth. Wildcard
+paths only match existing values, in document order, and the fixed part of
+the path before the first wildcard is resolved once. Without the 'wildcard'
+member, ``*`` and ``**`` are plain member names, as in RFC 6901.
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from jsonpatch import InvalidJsonPatch
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+WILDCARD = '*'
+RECURSIVE_WILDCARD = '**'
+
+_WILDCARDS = frozenset([WILDCARD, RECURSIVE_WILDCARD])
+
+_RE_ARRAY_INDEX = re.compile('^(0|[1-9][0-9]*)$')
+
+text_type = type('')
+
+
+def has_wildcard(parts):
+    """Whether the pointer parts have a wildcard segment."""
+    return any(part in _WILDCARDS for part in parts)
+
+
+def uses_wildcards(operation, parts):
+    """Whether an operation has wildcards enabled by its 'wildcard' member,
+    and wildcard segments in its pointer parts."""
+    enabled = operation.get('wildcard', False)
+    if not isinstance(enabled, bool):
+        raise InvalidJsonPatch("'wildcard' must be a boolean")
+    return enabled and has_wildcard(parts)
+
+
+def static_prefix(parts):
+    """Returns the parts before the first wildcard segment."""
+    for index, part in enumerate(parts):
+        if part in _WILDCARDS:
+            return parts[:index]
+    return parts
+
+
+def validate(parts):
+    """Raises InvalidJsonPatch for unsupported wildcard paths."""
+    if parts and parts[-1] == RECURSIVE_WILDCARD:
+        raise InvalidJsonPatch("'path' can't end with a '**' segment")
+
+
+def expand(doc, parts):
+    """Returns the (container, key, value) of every existing value matched
+    by the pointer parts, where `key` is an index for arrays.
+
+    :param doc: Document object.
+
+    :param parts: Pointer parts, with at least one wildcard.
+    :type parts: list
+
+    :rtype: list of tuples
+    """
+    validate(parts)
+    prefix = static_prefix(parts)
+    node = doc
+    for part in prefix:
+        key = _key(node, part)
+        if key is None:
+            return []
+        node = node[key]
+
+    recursive = RECURSIVE_WILDCARD in parts
+    last = len(parts) - 1
+    matches, seen = [], set()
+    stack = [(node, len(prefix))]
+    while stack:
+        node, position = stack.pop()
+        part = parts[position]
+        if part == RECURSIVE_WILDCARD:
+            # descendants first on the stack, so the node itself is matched first
+            stack.extend((child, position) for _, child in reversed(_children(node)))
+            stack.append((node, position + 1))
+            continue
+
+        if part == WILDCARD:
+            children = _children(node)
+        else:
+            key = _key(node, part)
+            children = [] if key is None else [(key, node[key])]
+
+        if position == last:
+            for key, child in children:
+                if recursive:
+                    # the same value can be matched through different levels
+                    identity = (id(node), key)
+                    if identity in seen:
+                        continue
+                    seen.add(identity)
+                matches.append((node, key, child))
+        else:
+            stack.extend((child, position + 1) for _, child in reversed(children))
+    return matches
+
+
+def _children(node):
+    if isinstance(node, Mapping):
+        return list(node.items())
+    if _is_array(node):
+        return list(enumerate(node))
+    return []
+
+
+def _key(node, part):
+    """Returns the key of an existing member or item, or None."""
+    if isinstance(node, Mapping):
+        return part if part in node else None
+    if _is_array(node) and _RE_ARRAY_INDEX.match(part):
+        index = int(part)
+        return index if index < len(node) else None
+    return None
+
+
+def _is_array(node):
+    return isinstance(node, Sequence) and not isinstance(node, (text_type, bytes))
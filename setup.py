@@ -20,7 +20,10 @@ REQUIREMENTS = list(open('requirements.txt'))
 
 if has_setuptools:
     OPTIONS = {
-        'install_requires': REQUIREMENTS
+        'install_requires': REQUIREMENTS,
+        'extras_require': {
+            'numpy': ['numpy'],
+        },
     }
 else:
     OPTIONS = {}
@@ -76,6 +79,6 @@ setup(name=PACKAGE,
           'Documentation': "https://python-json-patch-ext.readthedocs.org/",
           'PyPI': 'https://pypi.org/pypi/jsonpatchext',
       },
-      test_suite="jsonpatchext.test.test_jsonpatchext",
+      test_suite="jsonpatchext.test",
       **OPTIONS
 )
\ No newline at end of file